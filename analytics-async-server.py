@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Async Analytics Ingest Server
+Serves the tracking pixel from an asyncio event loop and mounts the Flask read APIs alongside
+"""
+
+import os
+import sys
+import signal
+import asyncio
+import logging
+import importlib.util
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_to_bytes
+
+# Optional faster event loop
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Load the tracker (routes, ingest queue, background writer) from its script
+spec = importlib.util.spec_from_file_location(
+    "analytics_tracker", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics-tracker.py")
+)
+tracker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tracker)
+
+logger = logging.getLogger(__name__)
+
+ASYNC_SERVER_CONFIG = {
+    "host": "0.0.0.0",
+    "port": 8083,
+    "backlog": 4096,
+    "keepalive_timeout_s": 75,     # Idle keep-alive connections are closed after this
+    "max_header_bytes": 16384,     # Request head larger than this gets a 431
+    "max_body_bytes": 65536,       # Request bodies larger than this get a 413
+    "wsgi_threads": 4              # Worker threads for the Flask (non-pixel) routes
+}
+
+def build_pixel_response(keep_alive, include_body=True):
+    """Complete HTTP response bytes for the pixel, built once at import"""
+    head = ''.join(
+        ['HTTP/1.1 200 OK\r\n']
+        + [f'{name}: {value}\r\n' for name, value in tracker.PIXEL_HEADERS]
+        + [f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n']
+    ).encode('latin-1')
+    return head + tracker.PIXEL_GIF if include_body else head
+
+# (keep_alive, is_head) -> preallocated response
+PIXEL_RESPONSES = {
+    (keep_alive, is_head): build_pixel_response(keep_alive, include_body=not is_head)
+    for keep_alive in (True, False) for is_head in (True, False)
+}
+
+# Headers that decide where a request body ends
+FRAMING_HEADERS = ('content-length', 'transfer-encoding')
+
+def simple_response(status, keep_alive=False):
+    body = status.encode('latin-1')
+    return (
+        f'HTTP/1.1 {status}\r\n'
+        'Content-Type: text/plain\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+        '\r\n'
+    ).encode('latin-1') + body
+
+class AsyncPixelServer:
+    """Minimal HTTP/1.1 server: pixel hits inline, everything else via WSGI in a thread pool"""
+
+    def __init__(self, wsgi_app, config=None):
+        self.wsgi_app = wsgi_app
+        self.config = config or ASYNC_SERVER_CONFIG
+        self.executor = ThreadPoolExecutor(max_workers=self.config['wsgi_threads'], thread_name_prefix='wsgi')
+        self.server = None
+        self.idle_writers = set()   # Connections waiting for their next request
+        self.closing = False
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_connection,
+            self.config['host'],
+            self.config['port'],
+            backlog=self.config['backlog'],
+            limit=self.config['max_header_bytes']
+        )
+        logger.info(f"Async analytics server listening on {self.config['host']}:{self.config['port']}")
+
+    async def stop(self):
+        """Stop accepting, close idle keep-alive connections and let in-flight requests finish
+        
+        wait_closed() waits for every open connection on Python 3.12+, so idle
+        clients would otherwise hold shutdown open for keepalive_timeout_s.
+        """
+        self.closing = True
+        if self.server:
+            self.server.close()
+            for writer in list(self.idle_writers):
+                writer.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        remote_addr = peer[0] if peer else ''
+        try:
+            while not self.closing:
+                self.idle_writers.add(writer)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.config['keepalive_timeout_s'])
+                except asyncio.LimitOverrunError:
+                    writer.write(simple_response('431 Request Header Fields Too Large'))
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                finally:
+                    self.idle_writers.discard(writer)
+
+                try:
+                    method, target, version, headers = self.parse_head(head)
+                except ValueError:
+                    writer.write(simple_response('400 Bad Request'))
+                    break
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                keep_alive = keep_alive and not self.closing
+                path, _, query = target.partition('?')
+
+                # Every request's body is consumed, even where it is ignored, so leftover
+                # bytes are never parsed as the next request on a kept-alive connection
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    writer.write(simple_response('411 Length Required'))
+                    break
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    writer.write(simple_response('400 Bad Request'))
+                    break
+                if length > self.config['max_body_bytes']:
+                    writer.write(simple_response('413 Payload Too Large'))
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                # Hot path: no thread hop, no allocation for the response (any body is discarded)
+                if path in tracker.PIXEL_PATHS and method in ('GET', 'HEAD'):
+                    self.record_pixel_hit(query, headers, remote_addr)
+                    writer.write(PIXEL_RESPONSES[(keep_alive, method == 'HEAD')])
+                else:
+                    response = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, self.call_wsgi, method, path, query, version, headers, body, remote_addr, keep_alive
+                    )
+                    writer.write(response)
+
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Error handling connection from {remote_addr}: {e}")
+        finally:
+            self.idle_writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def parse_head(head):
+        lines = head.decode('latin-1').split('\r\n')
+        method, target, version = lines[0].split(' ', 2)
+        if not version.startswith('HTTP/1.'):
+            raise ValueError(f"Unsupported protocol {version}")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                name, value = name.strip().lower(), value.strip()
+                # Conflicting framing headers would let a proxy and this server
+                # disagree on where the body ends (request smuggling)
+                if name in FRAMING_HEADERS and headers.get(name, value) != value:
+                    raise ValueError(f"Conflicting {name} headers")
+                headers[name] = value
+        return method, target, version, headers
+
+    @staticmethod
+    def record_pixel_hit(query, headers, remote_addr):
+        site, page = tracker.parse_pixel_query(query)
+        tracker.record_visit(
+            site,
+            page,
+            headers.get('x-forwarded-for', remote_addr),
+            headers.get('user-agent', ''),
+            headers.get('referer', '')
+        )
+
+    def call_wsgi(self, method, path, query, version, headers, body, remote_addr, keep_alive):
+        """Run the Flask app for one request and serialise its response"""
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.config['host'],
+            'SERVER_PORT': str(self.config['port']),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': remote_addr,
+            'CONTENT_TYPE': headers.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(body)) if body else '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False
+        }
+        for name, value in headers.items():
+            if name not in ('content-type', 'content-length'):
+                environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        status_headers = []
+        def start_response(status, response_headers, exc_info=None):
+            status_headers[:] = [status, response_headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            payload = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+        status, response_headers = status_headers
+        content_length = len(payload)
+        if method == 'HEAD':
+            # HEAD reports the GET body's length: the app's own header when it set
+            # one (Flask does, and sends no body), else whatever body it produced
+            content_length = next((value for name, value in response_headers
+                                   if name.lower() == 'content-length'), content_length)
+            payload = b''
+        lines = [f'HTTP/1.1 {status}']
+        lines += [f'{name}: {value}' for name, value in response_headers
+                  if name.lower() not in ('content-length', 'connection')]
+        lines.append(f'Content-Length: {content_length}')
+        lines.append(f'Connection: {"keep-alive" if keep_alive else "close"}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload
+
+async def serve():
+    server = AsyncPixelServer(tracker.app)
+    await server.start()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop_event.set)
+
+    await stop_event.wait()
+    logger.info("Shutting down async analytics server")
+    await server.stop()
+
+def main():
+    """Entry point: async replacement for `analytics-tracker.py`'s app.run()"""
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    tracker.start_background_services()
+    try:
+        asyncio.run(serve())
+    finally:
+        # Flush queued visits before exit (also registered via atexit)
+        tracker.shutdown_ingest()
+
+if __name__ == '__main__':
+    main()
@@ -7,18 +7,112 @@ Serves 1x1 pixel and records visitor statistics
 import os
 import json
 import sqlite3
+import db_pool
+import schema_migrations
+import geoip_lookup
 import hashlib
 import re
+import math
+import random
+import sys
+import time
+import queue
+import signal
+import atexit
+import threading
+from collections import deque
 from datetime import datetime, timedelta
+from functools import wraps, lru_cache
 from flask import Flask, request, Response, jsonify
 import logging
-from urllib.parse import urlparse
+from urllib.parse import urlparse, parse_qsl
+
+# Columnar archive of closed visit partitions (optional)
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 app = Flask(__name__)
 
 # Database setup
 DB_PATH = '/var/log/site-analytics.db'
 
+# Batched ingest pipeline
+INGEST_CONFIG = {
+    "flush_interval_ms": 500,     # Flush at least this often
+    "flush_max_rows": 500,        # ...or as soon as this many visits are queued
+    "queue_max_size": 10000,      # Visits beyond this are dropped (see /ingest/stats)
+    "rollup_interval_s": 5,       # Merge in-memory rollup counters this often
+    "max_flush_attempts": 5       # A batch whose insert fails this often is dropped (counted in 'dropped')
+}
+
+# Per-site sampling and adaptive load shedding. Sampled hits are recorded
+# with sample_weight = 1/rate (rates are rounded to 1-in-N so weights stay integers)
+SAMPLING_CONFIG = {
+    "default_rate": 1.0,            # Fraction of human hits recorded
+    "site_rates": {},               # Per-site overrides, e.g. {"conflost": 0.5}
+    "shedding_enabled": True,
+    "evaluate_interval_s": 2,       # How often the writer re-evaluates load
+    "queue_high_fraction": 0.5,     # Shed harder when the ingest queue is this full...
+    "latency_high_ms": 250,         # ...or a flush took this long
+    "queue_low_fraction": 0.1,      # Back off one level once both are below these
+    "latency_low_ms": 50,
+    "heavy_site_share": 0.25,       # While shedding, only sites with this share of hits are sampled down
+    "max_weight": 64                # Never keep fewer than 1 in this many hits
+}
+
+# Visit partitioning and retention
+PARTITION_CONFIG = {
+    "retention_days": 90,                # Partitions entirely older than this are dropped
+    "retention_check_interval_s": 3600   # How often the ingest writer enforces retention
+}
+
+# Parquet archive of closed partitions (requires pyarrow)
+ARCHIVE_CONFIG = {
+    "enabled": True,
+    "directory": "/var/lib/site-analytics/archive",
+    "compression": "zstd",
+    "row_group_size": 65536,     # Rows per row group; min/max stats prune on these
+    "read_chunk_rows": 16384,    # Rows fetched from SQLite per streamed batch
+    "check_interval_s": 3600,    # How often the archiver looks for newly closed months
+    "deferred_retry_s": 60       # Re-check interval while the enhanced backfill is still running
+}
+
+# Background re-derivation of enhanced columns on pre-enhancement visits
+BACKFILL_CONFIG = {
+    "enabled": True,
+    "chunk_rows": 2000,            # Visit ids per transaction
+    "pause_s": 0.1,                # Sleep between chunks so the ingest writer gets the lock
+    "busy_queue_fraction": 0.1,    # Wait while the ingest queue is fuller than this (or shedding is active)
+    "busy_wait_s": 1.0,
+    "report_interval_s": 30,       # Progress/throughput log interval
+    "retry_interval_s": 300        # Delay before retrying after an error
+}
+
+# Batched sendBeacon endpoint (/collect)
+COLLECT_CONFIG = {
+    "max_body_bytes": 16384,     # Larger batches are rejected with 413
+    "max_events": 50,            # Events beyond this in one batch are ignored
+    "max_value": 86400000        # Timing/engagement values are clamped to [0, max_value]
+}
+
+# Read API response cache
+CACHE_CONFIG = {
+    "ttl_seconds": {
+        "analytics": 15,            # /analytics
+        "site_analytics": 15,       # /analytics/<site>
+        "enhanced": 60,             # /analytics/enhanced/<site>
+        "summary": 60,              # /analytics/summary
+        "uniques": 300              # /analytics/uniques/<site>
+    },
+    "max_entries": 512,
+    "invalidate_on_rollup_merge": False   # Drop cached responses whenever rollups land in SQLite
+}
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,67 +132,91 @@ def hash_ip(ip_address):
     salt = "analytics_privacy_salt_2025"
     return hashlib.sha256(f"{ip_address}{salt}".encode()).hexdigest()[:16]
 
-def detect_bot(user_agent):
-    """Enhanced bot detection"""
-    if not user_agent:
-        return True
+UA_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ua-rules.json')
+UA_CACHE_SIZE = 4096
+
+class UserAgentClassifier:
+    """Single-pass user agent classifier driven by ua-rules.json
     
-    user_agent_lower = user_agent.lower()
-    
-    # Common bot indicators
-    bot_indicators = [
-        'bot', 'crawler', 'spider', 'monitor', 'uptime', 'check', 'scan',
-        'googlebot', 'bingbot', 'slurp', 'duckduckbot', 'baiduspider',
-        'yandexbot', 'facebookexternalhit', 'twitterbot', 'linkedinbot',
-        'whatsapp', 'telegram', 'discord', 'curl', 'wget', 'python',
-        'requests', 'httpie', 'postman', 'insomnia', 'pingdom',
-        'statuscake', 'newrelic', 'datadog', 'headless', 'phantom',
-        'selenium', 'playwright', 'puppeteer'
-    ]
+    Every token from every rule table goes into one compiled alternation;
+    a single scan of the lowercased UA yields the set of tokens present,
+    and bot/browser/OS/device are then resolved from that set.
+    """
+    
+    def __init__(self, rules):
+        self.bot_tokens = frozenset(rules.get('bot_tokens', []))
+        self.browsers = self._compile_rules(rules.get('browsers', []))
+        self.operating_systems = self._compile_rules(rules.get('operating_systems', []))
+        self.devices = self._compile_rules(rules.get('devices', []))
+        self.default_browser = rules.get('default_browser', 'unknown')
+        self.default_os = rules.get('default_os', 'unknown')
+        self.default_device = rules.get('default_device', 'desktop')
+        
+        tokens = set(self.bot_tokens)
+        for table in (self.browsers, self.operating_systems, self.devices):
+            for _, any_tokens, none_tokens in table:
+                tokens |= any_tokens | none_tokens
+        
+        # Longest first so e.g. 'googlebot' wins over 'bot' at the same offset
+        alternation = '|'.join(re.escape(token) for token in sorted(tokens, key=len, reverse=True))
+        self.pattern = re.compile(alternation) if tokens else None
+    
+    @staticmethod
+    def _compile_rules(table):
+        return [
+            (rule['name'], frozenset(rule.get('any', [])), frozenset(rule.get('none', [])))
+            for rule in table
+        ]
+    
+    @staticmethod
+    def _first_match(table, found, default):
+        for name, any_tokens, none_tokens in table:
+            if any_tokens & found and not none_tokens & found:
+                return name
+        return default
     
-    return any(indicator in user_agent_lower for indicator in bot_indicators)
+    def classify(self, user_agent):
+        """Return (is_bot, browser, os, device_type) for a raw UA string"""
+        if not user_agent:
+            return True, None, None, 'unknown'
+        
+        found = set(self.pattern.findall(user_agent.lower())) if self.pattern else set()
+        
+        return (
+            bool(self.bot_tokens & found),
+            self._first_match(self.browsers, found, self.default_browser),
+            self._first_match(self.operating_systems, found, self.default_os),
+            self._first_match(self.devices, found, self.default_device)
+        )
+
+def load_ua_rules(path=UA_RULES_FILE):
+    """(Re)load the UA rule tables and reset the classification cache"""
+    global ua_classifier
+    try:
+        with open(path, 'r') as f:
+            rules = json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading UA rules from {path}: {e}")
+        rules = {}
+    ua_classifier = UserAgentClassifier(rules)
+    classify_user_agent.cache_clear()
+    return ua_classifier
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def classify_user_agent(user_agent):
+    """Cached (is_bot, browser, os, device_type) classification keyed on the raw UA"""
+    return ua_classifier.classify(user_agent)
+
+ua_classifier = None
+load_ua_rules()
+
+def detect_bot(user_agent):
+    """Enhanced bot detection"""
+    return classify_user_agent(user_agent)[0]
 
 def parse_user_agent(user_agent):
     """Simple user agent parsing for browser, OS, device type"""
-    if not user_agent:
-        return None, None, 'unknown'
-    
-    ua_lower = user_agent.lower()
-    
-    # Browser detection
-    browser = 'unknown'
-    if 'chrome' in ua_lower and 'edg' not in ua_lower:
-        browser = 'chrome'
-    elif 'firefox' in ua_lower:
-        browser = 'firefox'
-    elif 'safari' in ua_lower and 'chrome' not in ua_lower:
-        browser = 'safari'
-    elif 'edg' in ua_lower:
-        browser = 'edge'
-    elif 'opera' in ua_lower:
-        browser = 'opera'
-    
-    # OS detection
-    os = 'unknown'
-    if 'windows' in ua_lower:
-        os = 'windows'
-    elif 'mac os' in ua_lower or 'macos' in ua_lower:
-        os = 'macos'
-    elif 'linux' in ua_lower:
-        os = 'linux'
-    elif 'android' in ua_lower:
-        os = 'android'
-    elif 'ios' in ua_lower or 'iphone' in ua_lower or 'ipad' in ua_lower:
-        os = 'ios'
-    
-    # Device type detection
-    device_type = 'desktop'
-    if 'mobile' in ua_lower or 'android' in ua_lower or 'iphone' in ua_lower:
-        device_type = 'mobile'
-    elif 'tablet' in ua_lower or 'ipad' in ua_lower:
-        device_type = 'tablet'
-    
-    return browser, os, device_type
+    return classify_user_agent(user_agent)[1:]
 
 def extract_referrer_domain(referrer):
     """Extract domain from referrer URL"""
@@ -118,261 +236,1614 @@ def extract_referrer_domain(referrer):
         return None
 
 def get_country_from_ip(ip_address):
-    """Basic country detection (placeholder for now)"""
-    # This is a simplified version - in production you'd use a GeoIP service
-    # For now, we'll return None and implement later if needed
-    return None
+    """Country code from the offline GeoIP range table (None if unknown)"""
+    if not ip_address:
+        return None
+    # X-Forwarded-For may carry a proxy chain; the client is the first entry
+    return geoip_lookup.lookup_country(ip_address.split(',')[0].strip())
 
-def update_hourly_analytics(site, timestamp):
-    """Update hourly analytics aggregation"""
-    try:
-        # Round to hour
-        hour_timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
+class HyperLogLog:
+    """Mergeable HyperLogLog sketch over 64-bit hashes (hash_ip() output)
+    
+    Precision 12 gives 4096 one-byte registers (~1.6% standard error);
+    registers are stored as a raw BLOB and unioned with a register-wise max.
+    """
+    
+    PRECISION = 12
+    NUM_REGISTERS = 1 << PRECISION
+    ALPHA = 0.7213 / (1 + 1.079 / NUM_REGISTERS)
+    
+    def __init__(self, registers=None):
+        if registers is not None and len(registers) != self.NUM_REGISTERS:
+            raise ValueError(f"Expected {self.NUM_REGISTERS} registers, got {len(registers)}")
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.NUM_REGISTERS)
+    
+    def add(self, ip_hash):
+        """Add a visitor identified by its 16-hex-digit ip_hash"""
+        if not ip_hash:
+            return
+        value = int(ip_hash[:16], 16)
+        index = value >> (64 - self.PRECISION)
+        remainder = value & ((1 << (64 - self.PRECISION)) - 1)
+        rank = (64 - self.PRECISION) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def merge(self, other):
+        """Union another sketch into this one"""
+        mine = self.registers
+        for index, rank in enumerate(other.registers):
+            if rank > mine[index]:
+                mine[index] = rank
+        return self
+    
+    def estimate(self):
+        """Approximate number of distinct visitors"""
+        m = self.NUM_REGISTERS
+        harmonic = sum(2.0 ** -rank for rank in self.registers)
+        estimate = self.ALPHA * m * m / harmonic
         
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        # Small-range correction (linear counting)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
         
-        cursor.execute('''
-            INSERT INTO hourly_analytics (site, hour_timestamp, visit_count, unique_visitors)
-            VALUES (?, ?, 1, 1)
-            ON CONFLICT(site, hour_timestamp) 
-            DO UPDATE SET 
-                visit_count = visit_count + 1,
-                unique_visitors = unique_visitors + 1
-        ''', (site, hour_timestamp))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        logger.error(f"Error updating hourly analytics: {e}")
+        return int(round(estimate))
+    
+    def to_blob(self):
+        return bytes(self.registers)
+    
+    @classmethod
+    def from_blob(cls, blob):
+        return cls(blob) if blob else cls()
 
-def update_page_popularity(site, page_path):
-    """Update page popularity tracking"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO page_popularity (site, page_path, visit_count, last_visited)
-            VALUES (?, ?, 1, CURRENT_TIMESTAMP)
-            ON CONFLICT(site, page_path)
-            DO UPDATE SET 
-                visit_count = visit_count + 1,
-                last_visited = CURRENT_TIMESTAMP
-        ''', (site, page_path))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        logger.error(f"Error updating page popularity: {e}")
+def get_unique_visitors(cursor, site, since, until=None):
+    """Union hourly sketches for a site (or all sites when site is None) over [since, until)"""
+    query = 'SELECT visitor_sketch FROM hourly_analytics WHERE hour_timestamp >= ? AND visitor_sketch IS NOT NULL'
+    params = [since]
+    if until is not None:
+        query += ' AND hour_timestamp < ?'
+        params.append(until)
+    if site is not None:
+        query += ' AND site = ?'
+        params.append(site)
+    
+    sketch = HyperLogLog()
+    for (blob,) in cursor.execute(query, params):
+        sketch.merge(HyperLogLog.from_blob(blob))
+    return sketch.estimate()
 
-def update_referrer_analytics(site, referrer_domain):
-    """Update referrer domain analytics"""
-    if not referrer_domain:
-        return
-        
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO referrer_analytics (site, referrer_domain, visit_count, last_seen)
-            VALUES (?, ?, 1, CURRENT_TIMESTAMP)
-            ON CONFLICT(site, referrer_domain)
-            DO UPDATE SET 
-                visit_count = visit_count + 1,
-                last_seen = CURRENT_TIMESTAMP
-        ''', (site, referrer_domain))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        logger.error(f"Error updating referrer analytics: {e}")
+VISIT_COLUMNS = (
+    'site', 'timestamp', 'ip_address', 'user_agent', 'referer', 'page_path',
+    'country_code', 'is_bot', 'referrer_domain', 'ip_hash',
+    'browser', 'os', 'device_type', 'sample_weight'
+)
 
-def update_geographic_analytics(site, country_code):
-    """Update geographic analytics"""
-    if not country_code:
-        return
-        
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO geographic_analytics (site, country_code, visit_count, last_seen)
-            VALUES (?, ?, 1, CURRENT_TIMESTAMP)
-            ON CONFLICT(site, country_code)
-            DO UPDATE SET 
-                visit_count = visit_count + 1,
-                last_seen = CURRENT_TIMESTAMP
-        ''', (site, country_code))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        logger.error(f"Error updating geographic analytics: {e}")
+# Visits are stored in one table per month (visits_pYYYYMM) behind a
+# 'visits' view; rows from before partitioning live in visits_legacy.
+# The view is read-only: writers must go through insert_visits(), which
+# routes rows to their partition and keeps ids unique across partitions.
+VISIT_TABLE_COLUMNS = ('id',) + VISIT_COLUMNS
+LEGACY_VISITS_TABLE = 'visits_legacy'
+PARTITION_PREFIX = 'visits_p'
 
-def init_database():
-    """Initialize SQLite database for analytics"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+def partition_for_timestamp(timestamp):
+    """Partition table name for a 'YYYY-MM-DD HH:MM:SS' timestamp"""
+    return f"{PARTITION_PREFIX}{timestamp[:4]}{timestamp[5:7]}"
+
+def partition_bounds(table):
+    """[start, end) timestamps covered by a partition table"""
+    year, month = int(table[-6:-2]), int(table[-2:])
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}-01 00:00:00", f"{next_year:04d}-{next_month:02d}-01 00:00:00"
+
+def list_visit_partitions(cursor):
+    """Monthly partition tables, oldest first"""
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS visits (
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name GLOB 'visits_p[0-9][0-9][0-9][0-9][0-9][0-9]'
+        ORDER BY name
+    ''')
+    return [row[0] for row in cursor.fetchall()]
+
+def table_exists(cursor, name, kind='table'):
+    cursor.execute('SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?', (kind, name))
+    return cursor.fetchone() is not None
+
+def partition_select(cursor, table):
+    """SELECT over a visits table in canonical column order (NULL for missing columns)"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    present = {row[1] for row in cursor.fetchall()}
+    columns = ', '.join(column if column in present else f'NULL AS {column}' for column in VISIT_TABLE_COLUMNS)
+    return f'SELECT {columns} FROM {table}'
+
+def rebuild_visits_view(cursor):
+    """Recreate the 'visits' view as a UNION ALL of every partition"""
+    tables = list_visit_partitions(cursor)
+    if table_exists(cursor, LEGACY_VISITS_TABLE):
+        tables.insert(0, LEGACY_VISITS_TABLE)
+    
+    cursor.execute('DROP VIEW IF EXISTS visits')
+    if tables:
+        union = '\n            UNION ALL '.join(partition_select(cursor, table) for table in tables)
+        cursor.execute(f'CREATE VIEW visits AS {union}')
+
+def create_visit_partition(cursor, table):
+    """Create a monthly partition with the full visits schema and refresh the view"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             site VARCHAR(50) NOT NULL,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
             ip_address VARCHAR(45),
             user_agent TEXT,
             referer TEXT,
-            page_path TEXT
+            page_path TEXT,
+            country_code VARCHAR(2),
+            is_bot BOOLEAN DEFAULT FALSE,
+            referrer_domain VARCHAR(100),
+            ip_hash VARCHAR(64),
+            browser VARCHAR(50),
+            os VARCHAR(50),
+            device_type VARCHAR(20),
+            sample_weight INTEGER DEFAULT 1
         )
     ''')
+    # Covers the recent-counter seed (timestamp range grouped by site, summing weights);
+    # per-site history queries belong on the Parquet archive, not the live partitions
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_timestamp_site ON {table}(timestamp, site, sample_weight)')
+    rebuild_visits_view(cursor)
+
+def reserve_partition_ids(cursor, table):
+    """Start `table`'s next AUTOINCREMENT id above every id already issued to a visits table
+    
+    Each partition has its own sqlite_sequence row, so without this ids would
+    restart at 1 every month and collide across the visits view (and the archive).
+    """
+    cursor.execute('''
+        SELECT MAX(seq), SUM(name = ?), MAX(CASE WHEN name = ? THEN seq END)
+        FROM sqlite_sequence WHERE name GLOB 'visits_*'
+    ''', (table, table))
+    top, present, current = cursor.fetchone()
+    top = top or 0
+    if not present:
+        cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, top))
+    elif current < top:
+        cursor.execute('UPDATE sqlite_sequence SET seq = ? WHERE name = ?', (top, table))
+
+known_partitions = set()
+
+def insert_visits(cursor, visits):
+    """Insert a batch of visits into their monthly partitions"""
+    by_partition = {}
+    for visit in visits:
+        by_partition.setdefault(partition_for_timestamp(visit['timestamp']), []).append(
+            tuple(visit[column] for column in VISIT_COLUMNS)
+        )
+    
+    for table, rows in by_partition.items():
+        if table not in known_partitions:
+            if not table_exists(cursor, table):
+                create_visit_partition(cursor, table)
+            known_partitions.add(table)
+        # Rows can land in an older partition (late visits around a month boundary)
+        reserve_partition_ids(cursor, table)
+        cursor.executemany(f'''
+            INSERT INTO {table} ({', '.join(VISIT_COLUMNS)})
+            VALUES ({', '.join('?' for _ in VISIT_COLUMNS)})
+        ''', rows)
+
+def visits_source(cursor, since=None, until=None):
+    """FROM-clause source covering only the partitions that overlap [since, until)
+    
+    Returns a table name or a parenthesised UNION ALL, for use as
+    f"SELECT ... FROM {visits_source(cursor, since)} AS v WHERE v.timestamp > ?".
+    """
+    selects = []
+    
+    if table_exists(cursor, LEGACY_VISITS_TABLE):
+        cursor.execute(f'SELECT MIN(timestamp), MAX(timestamp) FROM {LEGACY_VISITS_TABLE}')
+        oldest, newest = cursor.fetchone()
+        if newest is not None and (since is None or newest >= since) and (until is None or oldest < until):
+            selects.append(partition_select(cursor, LEGACY_VISITS_TABLE))
+    
+    for table in list_visit_partitions(cursor):
+        start, end = partition_bounds(table)
+        if (since is None or end > since) and (until is None or start < until):
+            selects.append(partition_select(cursor, table))
+    
+    if not selects:
+        return 'visits'
+    if len(selects) == 1:
+        return f'({selects[0]})'
+    return '(' + ' UNION ALL '.join(selects) + ')'
+
+HOURLY_UPSERT_SQL = '''
+    INSERT INTO hourly_analytics (site, hour_timestamp, visit_count, unique_visitors, visitor_sketch)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(site, hour_timestamp)
+    DO UPDATE SET
+        visit_count = visit_count + excluded.visit_count,
+        unique_visitors = excluded.unique_visitors,
+        visitor_sketch = excluded.visitor_sketch
+'''
+
+PAGE_UPSERT_SQL = '''
+    INSERT INTO page_popularity (site, page_path, visit_count, last_visited)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(site, page_path)
+    DO UPDATE SET
+        visit_count = visit_count + excluded.visit_count,
+        last_visited = MAX(last_visited, excluded.last_visited)
+'''
+
+REFERRER_UPSERT_SQL = '''
+    INSERT INTO referrer_analytics (site, referrer_domain, visit_count, last_seen)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(site, referrer_domain)
+    DO UPDATE SET
+        visit_count = visit_count + excluded.visit_count,
+        last_seen = MAX(last_seen, excluded.last_seen)
+'''
+
+GEO_UPSERT_SQL = '''
+    INSERT INTO geographic_analytics (site, country_code, visit_count, last_seen)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(site, country_code)
+    DO UPDATE SET
+        visit_count = visit_count + excluded.visit_count,
+        last_seen = MAX(last_seen, excluded.last_seen)
+'''
+
+EVENT_UPSERT_SQL = '''
+    INSERT INTO page_events (site, hour_timestamp, page_path, event_type, event_name, event_count, value_sum, value_max)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(site, hour_timestamp, page_path, event_type, event_name)
+    DO UPDATE SET
+        event_count = event_count + excluded.event_count,
+        value_sum = value_sum + excluded.value_sum,
+        value_max = MAX(value_max, excluded.value_max)
+'''
+
+BREAKDOWN_UPSERT_SQL = '''
+    INSERT INTO daily_breakdowns (site, day, dimension, value, visit_count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(site, dimension, day, value)
+    DO UPDATE SET visit_count = visit_count + excluded.visit_count
+'''
+
+# Per-day breakdowns served by /analytics/enhanced and /analytics/summary;
+# 'hour' holds the hour of day ('00'-'23')
+BREAKDOWN_DIMENSIONS = ('browser', 'os', 'device_type', 'referrer_domain')
+
+class RollupCounters:
+    """In-memory hourly/page/referrer/geo counters keyed by (site, bucket)"""
+    
+    def __init__(self):
+        self.hourly = {}      # (site, hour_timestamp) -> visits
+        self.sketches = {}    # (site, hour_timestamp) -> HyperLogLog of ip_hash
+        self.pages = {}       # (site, page_path) -> [visits, last_visited]
+        self.referrers = {}   # (site, referrer_domain) -> [visits, last_seen]
+        self.countries = {}   # (site, country_code) -> [visits, last_seen]
+        self.events = {}      # (site, hour_timestamp, page_path, type, name) -> [count, sum, max]
+        self.breakdowns = {}  # (site, day, dimension, value) -> visits
+        self.visits = 0
+    
+    def __len__(self):
+        return (len(self.hourly) + len(self.pages) + len(self.referrers) + len(self.countries)
+                + len(self.events) + len(self.breakdowns))
+    
+    @staticmethod
+    def _bump(counter, key, count, seen):
+        entry = counter.get(key)
+        if entry is None:
+            counter[key] = [count, seen]
+        else:
+            entry[0] += count
+            if seen > entry[1]:
+                entry[1] = seen
+    
+    def add(self, visit):
+        """Count a single visit, scaled by its sample weight"""
+        site = visit['site']
+        seen = visit['timestamp']
+        weight = visit.get('sample_weight') or 1
+        
+        # Round to hour ('YYYY-MM-DD HH:MM:SS' -> 'YYYY-MM-DD HH:00:00')
+        hour_key = (site, seen[:13] + ':00:00')
+        self.hourly[hour_key] = self.hourly.get(hour_key, 0) + weight
+        sketch = self.sketches.get(hour_key)
+        if sketch is None:
+            sketch = self.sketches[hour_key] = HyperLogLog()
+        sketch.add(visit['ip_hash'])
+        
+        self._bump(self.pages, (site, visit['page_path']), weight, seen)
+        if visit['referrer_domain']:
+            self._bump(self.referrers, (site, visit['referrer_domain']), weight, seen)
+        if visit['country_code']:
+            self._bump(self.countries, (site, visit['country_code']), weight, seen)
+        
+        day = seen[:10]
+        breakdowns = self.breakdowns
+        for dimension in BREAKDOWN_DIMENSIONS:
+            value = visit[dimension]
+            if value:
+                key = (site, day, dimension, value)
+                breakdowns[key] = breakdowns.get(key, 0) + weight
+        key = (site, day, 'hour', seen[11:13])
+        breakdowns[key] = breakdowns.get(key, 0) + weight
+        self.visits += 1
     
-    # Create index for better query performance
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_site_timestamp ON visits(site, timestamp)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON visits(timestamp)')
+    def add_event(self, site, timestamp, page_path, event_type, event_name, value):
+        """Count a timing/engagement event from /collect"""
+        key = (site, timestamp[:13] + ':00:00', page_path, event_type, event_name)
+        entry = self.events.get(key)
+        if entry is None:
+            self.events[key] = [1, value, value]
+        else:
+            entry[0] += 1
+            entry[1] += value
+            if value > entry[2]:
+                entry[2] = value
     
+    def merge(self, other):
+        """Fold another set of counters into this one"""
+        for key, count in other.hourly.items():
+            self.hourly[key] = self.hourly.get(key, 0) + count
+        for key, sketch in other.sketches.items():
+            if key in self.sketches:
+                self.sketches[key].merge(sketch)
+            else:
+                self.sketches[key] = HyperLogLog(sketch.registers)
+        for mine, theirs in ((self.pages, other.pages),
+                             (self.referrers, other.referrers),
+                             (self.countries, other.countries)):
+            for key, (count, seen) in theirs.items():
+                self._bump(mine, key, count, seen)
+        for key, count in other.breakdowns.items():
+            self.breakdowns[key] = self.breakdowns.get(key, 0) + count
+        for key, (count, total, peak) in other.events.items():
+            entry = self.events.get(key)
+            if entry is None:
+                self.events[key] = [count, total, peak]
+            else:
+                entry[0] += count
+                entry[1] += total
+                entry[2] = max(entry[2], peak)
+        self.visits += other.visits
+    
+    def write(self, cursor):
+        """Merge counters into SQLite with one upsert per distinct key"""
+        hourly_rows = []
+        for (site, hour), count in self.hourly.items():
+            # Union with the persisted sketch so unique_visitors stays exact-to-HLL
+            sketch = HyperLogLog(self.sketches[(site, hour)].registers)
+            cursor.execute('''
+                SELECT visitor_sketch FROM hourly_analytics
+                WHERE site = ? AND hour_timestamp = ?
+            ''', (site, hour))
+            row = cursor.fetchone()
+            if row and row[0]:
+                sketch.merge(HyperLogLog.from_blob(row[0]))
+            hourly_rows.append((site, hour, count, sketch.estimate(), sketch.to_blob()))
+        cursor.executemany(HOURLY_UPSERT_SQL, hourly_rows)
+        cursor.executemany(PAGE_UPSERT_SQL, [
+            (site, page, count, seen) for (site, page), (count, seen) in self.pages.items()
+        ])
+        cursor.executemany(REFERRER_UPSERT_SQL, [
+            (site, domain, count, seen) for (site, domain), (count, seen) in self.referrers.items()
+        ])
+        cursor.executemany(GEO_UPSERT_SQL, [
+            (site, country, count, seen) for (site, country), (count, seen) in self.countries.items()
+        ])
+        cursor.executemany(BREAKDOWN_UPSERT_SQL, [
+            key + (count,) for key, count in self.breakdowns.items()
+        ])
+        if self.events:
+            cursor.executemany(EVENT_UPSERT_SQL, [
+                key + (count, total, peak) for key, (count, total, peak) in self.events.items()
+            ])
+
+class RollupAggregator:
+    """Accumulates rollup counters between periodic merges into SQLite"""
+    
+    def __init__(self, merge_interval_s=5):
+        self.merge_interval = merge_interval_s
+        self.pending = RollupCounters()
+        self.last_merge = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def add_batch(self, visits):
+        """Count a batch of committed visits"""
+        with self._lock:
+            for visit in visits:
+                self.pending.add(visit)
+    
+    def add_events(self, events):
+        """Count (site, timestamp, page_path, type, name, value) events; no raw rows are kept"""
+        with self._lock:
+            for event in events:
+                self.pending.add_event(*event)
+    
+    def merge_due(self):
+        """True once the merge interval has elapsed and there is something to write"""
+        has_pending = self.pending.visits > 0 or self.pending.events
+        return has_pending and time.monotonic() - self.last_merge >= self.merge_interval
+    
+    def take(self):
+        """Detach pending counters for writing"""
+        with self._lock:
+            counters, self.pending = self.pending, RollupCounters()
+            self.last_merge = time.monotonic()
+        return counters
+    
+    def restore(self, counters):
+        """Put counters back after a failed write so nothing is lost"""
+        with self._lock:
+            self.pending.merge(counters)
+    
+    def pending_hourly(self):
+        """Copy of not-yet-merged hourly counters"""
+        with self._lock:
+            return dict(self.pending.hourly)
+    
+    def pending_stats(self):
+        """Size of the not-yet-merged counters"""
+        with self._lock:
+            return {'pending_visits': self.pending.visits, 'pending_keys': len(self.pending)}
+
+class RecentVisitCounter:
+    """Per-site ring of per-minute visit counts covering the last hour"""
+    
+    def __init__(self, minutes=60):
+        self.minutes = minutes
+        self.buckets = {}   # site -> {minute 'YYYY-MM-DD HH:MM': visits}
+        self._lock = threading.Lock()
+    
+    def add(self, site, timestamp, count=1):
+        minute = timestamp[:16]
+        with self._lock:
+            site_buckets = self.buckets.setdefault(site, {})
+            site_buckets[minute] = site_buckets.get(minute, 0) + count
+    
+    def add_batch(self, visits):
+        for visit in visits:
+            self.add(visit['site'], visit['timestamp'], visit.get('sample_weight') or 1)
+    
+    def seed(self, cursor):
+        """Load the last hour of visits once at startup"""
+        since = (datetime.utcnow() - timedelta(minutes=self.minutes)).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute(f'''
+            SELECT site, substr(timestamp, 1, 16) AS minute, SUM(COALESCE(sample_weight, 1))
+            FROM {visits_source(cursor, since)} AS v
+            WHERE timestamp > ?
+            GROUP BY site, minute
+        ''', (since,))
+        for site, minute, count in cursor.fetchall():
+            self.add(site, minute, count)
+    
+    def totals(self):
+        """Visits per site within the ring window, pruning expired minutes"""
+        cutoff = (datetime.utcnow() - timedelta(minutes=self.minutes)).strftime('%Y-%m-%d %H:%M')
+        totals = {}
+        with self._lock:
+            for site, site_buckets in self.buckets.items():
+                for minute in [m for m in site_buckets if m <= cutoff]:
+                    del site_buckets[minute]
+                totals[site] = sum(site_buckets.values())
+        return totals
+
+# Reporting windows served from hourly_analytics (hour resolution); 'recent' comes from RecentVisitCounter
+ANALYTICS_WINDOWS = (
+    ('hourly', timedelta(days=1)),      # Last 24 hours
+    ('daily', timedelta(days=7)),       # Last 7 days
+    ('weekly', timedelta(days=30)),     # Last 30 days
+    ('monthly', timedelta(days=90))     # Last 90 days
+)
+
+def get_window_counts(cursor, site=None):
+    """Visit counts per site for every reporting window in O(hour buckets)
+    
+    Sums committed hourly rollups plus counters still pending in memory.
+    """
+    now = datetime.utcnow()
+    cutoffs = [(now - window).strftime('%Y-%m-%d %H:00:00') for _, window in ANALYTICS_WINDOWS]
+    
+    columns = ', '.join(
+        f'SUM(CASE WHEN hour_timestamp >= ? THEN visit_count ELSE 0 END)' for _ in ANALYTICS_WINDOWS
+    )
+    query = f'SELECT site, {columns} FROM hourly_analytics WHERE hour_timestamp >= ?'
+    params = cutoffs + [min(cutoffs)]
+    if site is not None:
+        query += ' AND site = ?'
+        params.append(site)
+    # '+site' stops the planner from scanning the (site, ...) index just to avoid
+    # a sort, so the hour_timestamp range is searched on the covering index instead
+    query += ' GROUP BY +site ORDER BY site'
+    cursor.execute(query, params)
+    
+    counts = {}
+    for row in cursor.fetchall():
+        counts[row[0]] = {name: row[i + 1] or 0 for i, (name, _) in enumerate(ANALYTICS_WINDOWS)}
+    
+    # Fold in rollups that have not been merged into SQLite yet
+    for (pending_site, hour), visits in ingest_queue.rollups.pending_hourly().items():
+        if site is not None and pending_site != site:
+            continue
+        site_counts = counts.setdefault(pending_site, {name: 0 for name, _ in ANALYTICS_WINDOWS})
+        for (name, _), cutoff in zip(ANALYTICS_WINDOWS, cutoffs):
+            if hour >= cutoff:
+                site_counts[name] += visits
+    
+    recent = ingest_queue.recent.totals()
+    for site_name, visits in recent.items():
+        if visits and (site is None or site_name == site):
+            counts.setdefault(site_name, {name: 0 for name, _ in ANALYTICS_WINDOWS})
+    for site_name, site_counts in counts.items():
+        site_counts['recent'] = recent.get(site_name, 0)
+    
+    return counts
+
+class LoadShedder:
+    """Per-site sampling with adaptive shedding driven by ingest queue depth and write latency
+    
+    sample() runs on the request path and only touches a dict and random();
+    update() runs on the writer thread after each flush. Hit counters are
+    shared between them and guarded by _lock. Each shedding level doubles
+    the sampling interval for the sites dominating traffic.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.base_weights = {site: self.rate_to_weight(rate) for site, rate in config['site_rates'].items()}
+        self.default_weight = self.rate_to_weight(config['default_rate'])
+        self.level = 0
+        self.heavy_sites = frozenset()
+        self.site_hits = {}
+        self.last_evaluation = time.monotonic()
+        self.stats = {'sampled_out': 0, 'level_changes': 0}
+        self._lock = threading.Lock()
+    
+    def rate_to_weight(self, rate):
+        """Sampling rate -> integer 1-in-N weight"""
+        return min(max(1, round(1 / rate)) if rate > 0 else self.config['max_weight'], self.config['max_weight'])
+    
+    def weight_for(self, site):
+        """Current 1-in-N sampling interval for a site"""
+        weight = self.base_weights.get(site, self.default_weight)
+        if self.level and (not self.heavy_sites or site in self.heavy_sites):
+            weight = min(weight << self.level, self.config['max_weight'])
+        return weight
+    
+    def sample(self, site):
+        """Sample weight to record this hit with, or 0 to skip it"""
+        weight = self.weight_for(site)
+        keep = weight <= 1 or random.random() * weight < 1
+        with self._lock:
+            self.site_hits[site] = self.site_hits.get(site, 0) + 1
+            if not keep:
+                self.stats['sampled_out'] += 1
+        return weight if keep else 0
+    
+    def update(self, queue_depth, queue_capacity, write_latency_ms):
+        """Raise or lower the shedding level from current ingest pressure"""
+        now = time.monotonic()
+        if not self.config['shedding_enabled'] or now - self.last_evaluation < self.config['evaluate_interval_s']:
+            return
+        self.last_evaluation = now
+        
+        fill = queue_depth / queue_capacity if queue_capacity else 0
+        previous = self.level
+        max_level = max(self.config['max_weight'].bit_length() - 1, 0)
+        if fill >= self.config['queue_high_fraction'] or write_latency_ms >= self.config['latency_high_ms']:
+            self.level = min(self.level + 1, max_level)
+        elif self.level and fill <= self.config['queue_low_fraction'] and write_latency_ms <= self.config['latency_low_ms']:
+            self.level -= 1
+        
+        # Sites that produced most of the last interval's hits bear the shedding
+        with self._lock:
+            hits, self.site_hits = self.site_hits, {}
+        total = sum(hits.values())
+        if total:
+            self.heavy_sites = frozenset(
+                site for site, count in hits.items() if count / total >= self.config['heavy_site_share']
+            )
+        
+        if self.level != previous:
+            with self._lock:
+                self.stats['level_changes'] += 1
+            logger.warning(
+                f"Ingest load shedding level {previous} -> {self.level} "
+                f"(queue {fill:.0%}, last flush {write_latency_ms:.0f}ms, heavy sites: {sorted(self.heavy_sites) or 'all'})"
+            )
+    
+    def get_stats(self):
+        with self._lock:
+            counters = dict(self.stats)
+        return {
+            'level': self.level,
+            'heavy_sites': sorted(self.heavy_sites),
+            'site_weights': {site: self.weight_for(site) for site in sorted(set(self.base_weights) | self.heavy_sites)},
+            'default_weight': self.default_weight,
+            **counters
+        }
+
+load_shedder = LoadShedder(SAMPLING_CONFIG)
+
+class VisitIngestQueue:
+    """Bounded in-process queue that batches visit writes into single transactions
+    
+    The pixel endpoint only enqueues; a background writer flushes every
+    flush_interval_ms or flush_max_rows, whichever comes first.
+    """
+    
+    def __init__(self, db_path, flush_interval_ms=500, flush_max_rows=500, max_queue_size=10000,
+                 rollup_interval_s=5, max_flush_attempts=5):
+        self.db_path = db_path
+        self.rollups = RollupAggregator(rollup_interval_s)
+        self.recent = RecentVisitCounter()
+        self.merge_listeners = []   # Called after each successful rollup merge
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_max_rows = flush_max_rows
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.max_flush_attempts = max_flush_attempts
+        self.retry = deque()   # (batch, failed attempts) for batches whose insert failed; flushed first
+        self.stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'flushed_rows': 0,
+            'flush_count': 0,
+            'flush_errors': 0,
+            'retried_batches': 0,
+            'last_flush_ms': None,
+            'last_flush_rows': 0,
+            'max_queue_depth': 0,
+            'rollup_merges': 0,
+            'rollup_keys_written': 0
+        }
+        self._stats_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the background writer (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='visit-ingest', daemon=True)
+        self._thread.start()
+        logger.info(f"Visit ingest queue started (interval {self.flush_interval * 1000:.0f}ms, "
+                    f"batch {self.flush_max_rows}, capacity {self.queue.maxsize})")
+    
+    def submit(self, visit):
+        """Enqueue a visit without blocking; returns False if the queue is full"""
+        try:
+            self.queue.put_nowait(visit)
+        except queue.Full:
+            with self._stats_lock:
+                self.stats['dropped'] += 1
+            return False
+        
+        depth = self.queue.qsize()
+        with self._stats_lock:
+            self.stats['enqueued'] += 1
+            if depth > self.stats['max_queue_depth']:
+                self.stats['max_queue_depth'] = depth
+        return True
+    
+    def _collect_batch(self):
+        """Block until a batch is full, the flush interval elapses, or shutdown"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        
+        while len(batch) < self.flush_max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+            if self._stop_event.is_set():
+                break
+        
+        return batch
+    
+    def _drain(self):
+        """Take everything currently queued without blocking"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                return batch
+    
+    def _run(self):
+        """Background writer loop"""
+        last_retention = time.monotonic()
+        while not self._stop_event.is_set():
+            if self.retry:
+                # Failed batches go before newer visits; wait an interval between attempts
+                self._stop_event.wait(self.flush_interval)
+                batch, attempts = self.retry.popleft()
+                self.flush_batch(batch, attempts=attempts)
+                continue
+            batch = self._collect_batch()
+            if batch or self.rollups.merge_due():
+                self.flush_batch(batch)
+            load_shedder.update(self.queue.qsize(), self.queue.maxsize, self.stats['last_flush_ms'] or 0)
+            
+            # Retention runs on the writer thread so drops never contend with inserts
+            if time.monotonic() - last_retention >= PARTITION_CONFIG['retention_check_interval_s']:
+                cleanup_old_visits()
+                last_retention = time.monotonic()
+        
+        # Final drain on shutdown, merging whatever rollups are still pending
+        while self.retry:
+            batch, attempts = self.retry.popleft()
+            self.flush_batch(batch, attempts=max(attempts, self.max_flush_attempts - 1))
+        remaining = self._drain()
+        while remaining:
+            self.flush_batch(remaining[:self.flush_max_rows])
+            remaining = remaining[self.flush_max_rows:]
+        self.flush_batch([], force_rollups=True)
+    
+    def flush_batch(self, batch, force_rollups=False, attempts=0, merge_rollups=True):
+        """Write a batch of visits, plus any due rollup merge, in one transaction
+        
+        Rollup counters only absorb a batch after its visits commit; when a
+        merge is due the pending counters and the batch are written together.
+        If that combined write fails the visits are retried on their own, so a
+        failing rollup write cannot take them with it. A batch whose insert
+        fails is re-queued ahead of new visits (see _run) until it has failed
+        max_flush_attempts times, then counted in 'dropped'.
+        """
+        merge = merge_rollups and (force_rollups or self.rollups.merge_due())
+        if not batch and not (merge and (self.rollups.pending.visits or self.rollups.pending.events)):
+            return True
+        
+        pending = counters = None
+        if merge:
+            pending = self.rollups.take()
+            counters = RollupCounters()
+            counters.merge(pending)
+            for visit in batch:
+                counters.add(visit)
+        
+        start_time = time.monotonic()
+        
+        try:
+            conn = db_pool.connect(self.db_path)
+            try:
+                with conn:
+                    cursor = conn.cursor()
+                    if batch:
+                        insert_visits(cursor, batch)
+                    if counters is not None:
+                        counters.write(cursor)
+            finally:
+                conn.close()
+        except Exception as e:
+            if pending is not None:
+                # The batch's visits were rolled back too, so only re-queue earlier counts
+                self.rollups.restore(pending)
+            with self._stats_lock:
+                self.stats['flush_errors'] += 1
+            if counters is not None and batch:
+                logger.error(f"Error flushing {len(batch)} visits with rollups, retrying the visits alone: {e}")
+                return self.flush_batch(batch, attempts=attempts, merge_rollups=False)
+            self._requeue_failed(batch, attempts + 1, e)
+            return False
+        
+        if counters is None:
+            self.rollups.add_batch(batch)
+        self.recent.add_batch(batch)
+        
+        elapsed_ms = (time.monotonic() - start_time) * 1000
+        with self._stats_lock:
+            if batch:
+                self.stats['flushed_rows'] += len(batch)
+                self.stats['flush_count'] += 1
+                self.stats['last_flush_ms'] = round(elapsed_ms, 2)
+                self.stats['last_flush_rows'] = len(batch)
+            if counters is not None:
+                self.stats['rollup_merges'] += 1
+                self.stats['rollup_keys_written'] += len(counters)
+        
+        if counters is not None:
+            for listener in self.merge_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    logger.error(f"Rollup merge listener failed: {e}")
+        
+        logger.debug(f"Flushed {len(batch)} visits in {elapsed_ms:.1f}ms")
+        return True
+    
+    def _requeue_failed(self, batch, attempts, error):
+        """Keep a batch whose insert failed for another attempt, or drop it for good"""
+        if not batch:
+            logger.error(f"Error merging rollup counters: {error}")
+            return
+        if attempts < self.max_flush_attempts:
+            self.retry.append((batch, attempts))
+            with self._stats_lock:
+                self.stats['retried_batches'] += 1
+            logger.error(f"Error flushing {len(batch)} visits (attempt {attempts}/{self.max_flush_attempts}), "
+                         f"will retry: {error}")
+        else:
+            with self._stats_lock:
+                self.stats['dropped'] += len(batch)
+            logger.error(f"Dropping {len(batch)} visits after {attempts} failed flushes: {error}")
+    
+    def stop(self, timeout=10):
+        """Stop the writer and flush everything still queued"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        else:
+            remaining = [batch for batch, attempts in self.retry] + [self._drain()]
+            self.retry.clear()
+            for batch in remaining:
+                if batch:
+                    self.flush_batch(batch, attempts=self.max_flush_attempts - 1)
+        logger.info("Visit ingest queue stopped")
+    
+    def get_stats(self):
+        """Snapshot of queue and flush metrics"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize()
+        stats['queue_capacity'] = self.queue.maxsize
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        stats.update(self.rollups.pending_stats())
+        return stats
+
+ingest_queue = VisitIngestQueue(
+    DB_PATH,
+    flush_interval_ms=INGEST_CONFIG['flush_interval_ms'],
+    flush_max_rows=INGEST_CONFIG['flush_max_rows'],
+    max_queue_size=INGEST_CONFIG['queue_max_size'],
+    rollup_interval_s=INGEST_CONFIG['rollup_interval_s'],
+    max_flush_attempts=INGEST_CONFIG['max_flush_attempts']
+)
+
+def shutdown_ingest(signum=None, frame=None):
+    """Flush pending visits before the process exits"""
+    ingest_queue.stop()
+    if signum is not None:
+        sys.exit(0)
+
+class ResponseCache:
+    """Keyed TTL cache for read API responses with single-flight misses
+    
+    Concurrent misses for the same key wait for the first caller's result
+    instead of all running the same GROUP BY queries.
+    """
+    
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = {}     # key -> (expires_at, body, status, mimetype)
+        self.in_flight = {}   # key -> threading.Event
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0}
+    
+    def get_or_compute(self, key, ttl, compute):
+        """Return a cached (body, status, mimetype) or compute it once"""
+        while True:
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry and entry[0] > time.monotonic():
+                    self.stats['hits'] += 1
+                    return entry[1:]
+                
+                event = self.in_flight.get(key)
+                if event is None:
+                    event = self.in_flight[key] = threading.Event()
+                    self.stats['misses'] += 1
+                    break
+                self.stats['coalesced'] += 1
+            
+            # Another request is computing this key; wait and re-check
+            event.wait(timeout=30)
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry and entry[0] > time.monotonic():
+                    return entry[1:]
+            # Leader failed or produced an uncacheable response; compute ourselves
+            return compute()
+        
+        try:
+            result = compute()
+            body, status, mimetype = result
+            if status == 200:
+                with self._lock:
+                    if len(self.entries) >= self.max_entries:
+                        self._evict_expired()
+                    if len(self.entries) < self.max_entries:
+                        self.entries[key] = (time.monotonic() + ttl, body, status, mimetype)
+            return result
+        finally:
+            with self._lock:
+                self.in_flight.pop(key, None)
+            event.set()
+    
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, entry in self.entries.items() if entry[0] <= now]:
+            del self.entries[key]
+    
+    def invalidate(self, prefix=None):
+        """Drop all entries, or those whose key starts with prefix"""
+        with self._lock:
+            if prefix is None:
+                self.entries.clear()
+            else:
+                for key in [k for k in self.entries if k.startswith(prefix)]:
+                    del self.entries[key]
+            self.stats['invalidations'] += 1
+    
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.entries)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+response_cache = ResponseCache(CACHE_CONFIG['max_entries'])
+if CACHE_CONFIG['invalidate_on_rollup_merge']:
+    ingest_queue.merge_listeners.append(response_cache.invalidate)
+
+def cached_response(endpoint):
+    """Cache a view's successful responses for the endpoint's configured TTL"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = endpoint + ':' + '/'.join(str(kwargs[name]) for name in sorted(kwargs))
+            ttl = CACHE_CONFIG['ttl_seconds'][endpoint]
+            
+            def compute():
+                response = app.make_response(view(*args, **kwargs))
+                return response.get_data(), response.status_code, response.mimetype
+            
+            body, status, mimetype = response_cache.get_or_compute(key, ttl, compute)
+            return Response(body, status=status, mimetype=mimetype)
+        return wrapper
+    return decorator
+
+def init_database():
+    """Initialize SQLite database for analytics"""
+    conn = db_pool.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    # Pre-partitioning databases: keep the old table as the legacy partition
+    if table_exists(cursor, 'visits'):
+        cursor.execute(f'ALTER TABLE visits RENAME TO {LEGACY_VISITS_TABLE}')
+        logger.info(f"Renamed visits table to {LEGACY_VISITS_TABLE}; new visits go to monthly partitions")
+    
+    # Partitions created before sampling get a sample_weight column (weight 1)
+    for table in list_visit_partitions(cursor):
+        cursor.execute(f'PRAGMA table_info({table})')
+        if 'sample_weight' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN sample_weight INTEGER DEFAULT 1')
+    
+    current = partition_for_timestamp(datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+    create_visit_partition(cursor, current)
+    known_partitions.add(current)
+    
+    conn.commit()
+    conn.close()
+    
+    # Rollup tables, breakdowns and indexes come from the versioned migrations;
+    # apply pending ones before the ingest queue starts writing to them
+    try:
+        schema_migrations.migrate('analytics', DB_PATH)
+    except Exception as e:
+        logger.error(f"Failed to migrate analytics database: {e}")
+    
+    # Columns the migrations add to the legacy table only show up once the view is rebuilt
+    conn = db_pool.connect(DB_PATH)
+    rebuild_visits_view(conn.cursor())
     conn.commit()
     conn.close()
 
-def cleanup_old_visits():
-    """Remove visits older than 3 months to keep database lean"""
+def cleanup_old_visits(retention_days=None):
+    """Enforce retention by dropping whole partitions older than the cutoff"""
+    retention_days = retention_days or PARTITION_CONFIG['retention_days']
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    dropped = []
+    
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = db_pool.connect(DB_PATH)
         cursor = conn.cursor()
         
-        cutoff_date = datetime.now() - timedelta(days=90)
-        cursor.execute('DELETE FROM visits WHERE timestamp < ?', (cutoff_date,))
+        for table in list_visit_partitions(cursor):
+            _, end = partition_bounds(table)
+            if end <= cutoff:
+                dropped.append(table)
         
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        if table_exists(cursor, LEGACY_VISITS_TABLE):
+            cursor.execute(f'SELECT MAX(timestamp) FROM {LEGACY_VISITS_TABLE}')
+            newest = cursor.fetchone()[0]
+            if newest is None or newest < cutoff:
+                dropped.append(LEGACY_VISITS_TABLE)
         
-        if deleted_count > 0:
-            logger.info(f"Cleaned up {deleted_count} old visit records")
+        # Expired partitions are archived before they are dropped, so aged-out
+        # visits remain available to long-range reports
+        if dropped and ARCHIVE_CONFIG['enabled']:
+            if pa is None:
+                logger.warning("pyarrow not installed; dropping expired visit partitions without archiving")
+            else:
+                for table in list(dropped):
+                    if archive_is_current(cursor, table):
+                        continue
+                    try:
+                        archive_partition(cursor, table)
+                    except Exception as e:
+                        logger.error(f"Keeping {table}: archive failed: {e}")
+                        dropped.remove(table)
+        
+        if dropped:
+            with conn:
+                for table in dropped:
+                    cursor.execute(f'DROP TABLE {table}')
+                    known_partitions.discard(table)
+                rebuild_visits_view(cursor)
+            logger.info(f"Dropped expired visit partitions: {', '.join(dropped)}")
+        
+        conn.close()
     except Exception as e:
         logger.error(f"Error cleaning up old visits: {e}")
+    
+    return dropped
 
-@app.route('/pixel.gif')
-@app.route('/analytics-pixel.gif')  # Support legacy endpoint from website templates
-def tracking_pixel():
-    """Serve 1x1 transparent GIF and record enhanced visit data"""
+# Visit archive: closed partitions streamed to Parquet
+ARCHIVE_DICTIONARY_COLUMNS = ('site', 'country_code', 'browser', 'os', 'device_type')
+
+def archive_schema():
+    """Arrow schema for archived visits; low-cardinality columns are dictionary-encoded"""
+    dictionary = pa.dictionary(pa.int16(), pa.string())
+    return pa.schema([
+        ('id', pa.int64()),
+        ('site', dictionary),
+        ('timestamp', pa.timestamp('s')),
+        ('ip_address', pa.string()),
+        ('user_agent', pa.string()),
+        ('referer', pa.string()),
+        ('page_path', pa.string()),
+        ('country_code', dictionary),
+        ('is_bot', pa.bool_()),
+        ('referrer_domain', pa.string()),
+        ('ip_hash', pa.string()),
+        ('browser', dictionary),
+        ('os', dictionary),
+        ('device_type', dictionary),
+        ('sample_weight', pa.int32())
+    ])
+
+def archive_path(table):
+    return os.path.join(ARCHIVE_CONFIG['directory'], f'{table}.parquet')
+
+def is_archived(table):
+    return os.path.exists(archive_path(table))
+
+def archive_is_current(cursor, table):
+    """True if `table` has an archive written after the enhanced backfill last changed it"""
+    if not is_archived(table):
+        return False
+    if not table_exists(cursor, 'schema_progress'):
+        return True
+    cursor.execute('SELECT updated_at FROM schema_progress WHERE version = ? AND task = ?',
+                   (BACKFILL_PROGRESS_VERSION, f'enhanced_columns:{table}'))
+    row = cursor.fetchone()
+    if row is None:
+        return True
+    archived_at = datetime.utcfromtimestamp(os.path.getmtime(archive_path(table))).strftime('%Y-%m-%d %H:%M:%S')
+    return archived_at >= row[0]
+
+def _archive_batch(rows, schema):
+    """Convert a chunk of SQLite rows into an Arrow record batch"""
+    columns = list(zip(*rows))
+    arrays = []
+    for index, field in enumerate(schema):
+        values = columns[index]
+        if field.name == 'timestamp':
+            array = pc.strptime(pa.array(values, pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s', error_is_null=True)
+        elif field.name == 'is_bot':
+            array = pa.array([None if value is None else bool(value) for value in values], pa.bool_())
+        elif field.name in ARCHIVE_DICTIONARY_COLUMNS:
+            array = pa.array(values, pa.string()).dictionary_encode().cast(field.type)
+        else:
+            array = pa.array(values, field.type)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def archive_partition(cursor, table):
+    """Stream one visits table into a compressed Parquet file
+    
+    Rows are read in bounded chunks so memory stays flat regardless of
+    partition size; the file only appears under its final name once complete.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; visit archiving is unavailable")
+    
+    os.makedirs(ARCHIVE_CONFIG['directory'], exist_ok=True)
+    schema = archive_schema()
+    final_path = archive_path(table)
+    temp_path = final_path + '.tmp'
+    row_count = 0
+    
+    cursor.execute(f'{partition_select(cursor, table)} ORDER BY timestamp')
+    writer = pq.ParquetWriter(temp_path, schema, compression=ARCHIVE_CONFIG['compression'])
     try:
-        # Get request details
-        site = request.args.get('site', 'unknown')
-        page = request.args.get('page', '/')
-        ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-        user_agent = request.headers.get('User-Agent', '')
-        referer = request.headers.get('Referer', '')
+        while True:
+            rows = cursor.fetchmany(ARCHIVE_CONFIG['read_chunk_rows'])
+            if not rows:
+                break
+            writer.write_table(pa.Table.from_batches([_archive_batch(rows, schema)]),
+                               row_group_size=ARCHIVE_CONFIG['row_group_size'])
+            row_count += len(rows)
+    except Exception:
+        writer.close()
+        os.remove(temp_path)
+        raise
+    writer.close()
+    
+    os.replace(temp_path, final_path)
+    logger.info(f"Archived {row_count} visits from {table} to {final_path}")
+    return row_count
+
+def archive_closed_partitions():
+    """Archive every partition whose month has ended and that has no up-to-date archive file
+    
+    Returns the tables archived, or None while the enhanced column backfill is
+    still filling rows (an archive taken now would keep their NULL columns).
+    Archives older than the backfill's last change to their table are rewritten.
+    """
+    if pa is None or not ARCHIVE_CONFIG['enabled']:
+        return []
+    if BACKFILL_CONFIG['enabled'] and enhanced_backfill.stats['state'] != 'complete':
+        logger.debug("Deferring visit archiving until the enhanced column backfill completes")
+        return None
+    
+    archived = []
+    current = partition_for_timestamp(datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+    try:
+        conn = db_pool.connect(DB_PATH)
+        cursor = conn.cursor()
+        
+        tables = [table for table in list_visit_partitions(cursor) if table < current]
+        if table_exists(cursor, LEGACY_VISITS_TABLE):
+            tables.insert(0, LEGACY_VISITS_TABLE)
+        
+        for table in tables:
+            if not archive_is_current(cursor, table):
+                archive_partition(cursor, table)
+                archived.append(table)
+        
+        conn.close()
+    except Exception as e:
+        logger.error(f"Error archiving visit partitions: {e}")
+    
+    return archived
+
+def run_archiver(stop_event):
+    """Background loop that archives months as they close"""
+    while not stop_event.is_set():
+        deferred = archive_closed_partitions() is None
+        stop_event.wait(ARCHIVE_CONFIG['deferred_retry_s' if deferred else 'check_interval_s'])
+
+def query_archive(columns=None, since=None, until=None, site=None, filter=None):
+    """Scan archived visits with projection and predicate pushdown
+    
+    Only files whose month overlaps [since, until) are opened, and the
+    timestamp/site predicates are pushed into the Parquet scan so row groups
+    are skipped using their min/max statistics. `filter` takes an extra
+    pyarrow.dataset expression. Returns a pyarrow.Table.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; visit archive queries are unavailable")
+    
+    paths = []
+    directory = ARCHIVE_CONFIG['directory']
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if not name.endswith('.parquet'):
+            continue
+        table = name[:-len('.parquet')]
+        if table.startswith(PARTITION_PREFIX):
+            start, end = partition_bounds(table)
+            if (since and end <= since) or (until and start >= until):
+                continue
+        paths.append(os.path.join(directory, name))
+    
+    schema = archive_schema()
+    if not paths:
+        return schema.empty_table().select(columns) if columns else schema.empty_table()
+    
+    expression = None
+    predicates = []
+    if since:
+        predicates.append(ds.field('timestamp') >= pa.scalar(datetime.strptime(since, '%Y-%m-%d %H:%M:%S'), pa.timestamp('s')))
+    if until:
+        predicates.append(ds.field('timestamp') < pa.scalar(datetime.strptime(until, '%Y-%m-%d %H:%M:%S'), pa.timestamp('s')))
+    if site:
+        predicates.append(ds.field('site') == site)
+    if filter is not None:
+        predicates.append(filter)
+    for predicate in predicates:
+        expression = predicate if expression is None else expression & predicate
+    
+    dataset = ds.dataset(paths, schema=schema, format='parquet')
+    return dataset.to_table(columns=columns, filter=expression)
+
+ENHANCED_COLUMNS = ('browser', 'os', 'device_type', 'referrer_domain', 'ip_hash')
+BACKFILL_PROGRESS_VERSION = 0   # schema_progress rows for data jobs outside the migration sequence
+
+class EnhancedColumnBackfill:
+    """Re-derives enhanced columns for visits written before enhance-analytics-db.py
+    
+    Walks every base visits table in bounded id ranges (schema_migrations.backfill_rows),
+    filling only NULL browser/os/device_type/referrer_domain/ip_hash values from the
+    stored user_agent/referer/ip_address. Rows inside the breakdown window also bump
+    daily_breakdowns for the dimensions they gain, in the same transaction. Progress
+    is persisted per table, so a restart resumes where the last run committed.
+    """
+    
+    SELECT_COLUMNS = ('site', 'timestamp', 'user_agent', 'referer', 'ip_address') + ENHANCED_COLUMNS + ('sample_weight',)
+    
+    def __init__(self, config):
+        self.config = config
+        self.stats = {
+            'state': 'idle',
+            'table': None,
+            'tables_done': 0,
+            'tables_total': 0,
+            'rows_updated': 0,
+            'breakdown_rows': 0,
+            'chunks': 0,
+            'ingest_waits': 0,
+            'rows_per_s': 0.0,
+            'progress': {}     # table -> "position/max_id"
+        }
+    
+    def derive(self, row):
+        """Update parameters for a row, or None if nothing new can be derived"""
+        row_id, site, timestamp, user_agent, referer, ip_address = row[:6]
+        current = row[6:11]
+        if user_agent:
+            # Straight to the classifier so a backfill never churns the live pixel's UA cache
+            _, browser, os_name, device_type = ua_classifier.classify(user_agent)
+        else:
+            browser = os_name = device_type = None
+        derived = (browser, os_name, device_type, extract_referrer_domain(referer), hash_ip(ip_address))
+        values = tuple(old if old is not None else new for old, new in zip(current, derived))
+        if values == current:
+            return None
+        return values + (row_id,)
+    
+    def count_breakdowns(self, conn, changes):
+        """Add newly derived dimensions of in-window rows to daily_breakdowns"""
+        since = breakdown_since()
+        counts = {}
+        for row, params in changes:
+            site, timestamp, weight = row[1], row[2], row[11] or 1
+            day = (timestamp or '')[:10]
+            if day < since:
+                continue
+            for dimension, old, new in zip(BREAKDOWN_DIMENSIONS, row[6:10], params[:4]):
+                if old is None and new:
+                    key = (site, day, dimension, new)
+                    counts[key] = counts.get(key, 0) + weight
+        if counts:
+            conn.executemany(BREAKDOWN_UPSERT_SQL, [key + (count,) for key, count in counts.items()])
+            self.stats['breakdown_rows'] += len(counts)
+    
+    def wait_for_ingest(self, stop_event):
+        """Block while live ingest is under pressure; the pixel writer always goes first"""
+        while not stop_event.is_set():
+            fill = ingest_queue.queue.qsize() / ingest_queue.queue.maxsize if ingest_queue.queue.maxsize else 0
+            if fill <= self.config['busy_queue_fraction'] and not load_shedder.level:
+                return
+            self.stats['ingest_waits'] += 1
+            stop_event.wait(self.config['busy_wait_s'])
+    
+    def pending_tables(self, cursor):
+        """Base visits tables that carry every enhanced column"""
+        tables = list_visit_partitions(cursor)
+        if table_exists(cursor, LEGACY_VISITS_TABLE):
+            tables.insert(0, LEGACY_VISITS_TABLE)
+        
+        ready = []
+        for table in tables:
+            cursor.execute(f'PRAGMA table_info({table})')
+            missing = set(self.SELECT_COLUMNS) - {row[1] for row in cursor.fetchall()}
+            if missing:
+                logger.warning(f"Skipping enhanced backfill of {table}: missing {', '.join(sorted(missing))} "
+                               f"(run enhance-analytics-db.py)")
+            else:
+                ready.append(table)
+        return ready
+    
+    def run(self, stop_event):
+        """Backfill every table once; returns True if all of them completed"""
+        started = time.monotonic()
+        last_report = started
+        rows_at_start = table_start = self.stats['rows_updated']
+        
+        def on_chunk(chunk):
+            nonlocal last_report
+            self.stats['chunks'] += 1
+            self.stats['rows_updated'] = table_start + chunk['rows_this_run']
+            self.stats['progress'][chunk['table']] = f"{chunk['position']}/{chunk['max_id']}"
+            elapsed = time.monotonic() - started
+            self.stats['rows_per_s'] = round((self.stats['rows_updated'] - rows_at_start) / elapsed, 1) if elapsed else 0.0
+            if time.monotonic() - last_report >= self.config['report_interval_s']:
+                last_report = time.monotonic()
+                logger.info(f"Enhanced backfill {chunk['table']}: id {chunk['position']}/{chunk['max_id']} "
+                            f"({chunk['position'] / chunk['max_id']:.0%}), {self.stats['rows_updated']} rows updated, "
+                            f"{self.stats['rows_per_s']} rows/s")
+            self.wait_for_ingest(stop_event)
+        
+        conn = db_pool.connect(DB_PATH)
+        try:
+            schema_migrations.ensure_version_tables(conn)
+            tables = self.pending_tables(conn.cursor())
+            self.stats.update(state='running', tables_total=len(tables), tables_done=0)
+            
+            for table in tables:
+                if stop_event.is_set():
+                    break
+                self.stats['table'] = table
+                table_start = self.stats['rows_updated']
+                self.wait_for_ingest(stop_event)
+                result = schema_migrations.backfill_rows(
+                    conn, BACKFILL_PROGRESS_VERSION, f'enhanced_columns:{table}', table,
+                    self.SELECT_COLUMNS, self.derive,
+                    f'UPDATE {table} SET browser = ?, os = ?, device_type = ?, referrer_domain = ?, ip_hash = ? WHERE id = ?',
+                    where=' OR '.join(f'{column} IS NULL' for column in ENHANCED_COLUMNS),
+                    chunk_rows=self.config['chunk_rows'],
+                    pause_s=self.config['pause_s'],
+                    on_chunk=on_chunk,
+                    should_stop=stop_event.is_set,
+                    after_update=self.count_breakdowns
+                )
+                self.stats['progress'][table] = f"{result['position']}/{result['max_id']}"
+                if result['complete']:
+                    self.stats['tables_done'] += 1
+        except Exception as e:
+            self.stats['state'] = 'error'
+            logger.error(f"Enhanced column backfill failed: {e}")
+            return False
+        finally:
+            conn.close()
+        
+        complete = self.stats['tables_done'] == self.stats['tables_total']
+        self.stats['state'] = 'complete' if complete else 'stopped'
+        logger.info(f"Enhanced backfill {self.stats['state']}: {self.stats['rows_updated'] - rows_at_start} rows updated "
+                    f"in {time.monotonic() - started:.1f}s ({self.stats['rows_per_s']} rows/s)")
+        return complete
+    
+    def get_stats(self):
+        return dict(self.stats, progress=dict(self.stats['progress']))
+
+enhanced_backfill = EnhancedColumnBackfill(BACKFILL_CONFIG)
+
+def run_enhanced_backfill(stop_event):
+    """Background thread: one pass over the visits tables, retried after failures"""
+    while not stop_event.is_set():
+        if enhanced_backfill.run(stop_event):
+            return
+        stop_event.wait(BACKFILL_CONFIG['retry_interval_s'])
+
+def record_visit(site, page, ip_address, user_agent, referer):
+    """Classify a pixel hit and queue it for the batched writer
+    
+    Shared by the Flask routes and the asyncio pixel server; never touches SQLite.
+    """
+    try:
+        # Sampling happens before any parsing so shed hits cost almost nothing
+        sample_weight = load_shedder.sample(site)
+        if not sample_weight:
+            return
         
         # Enhanced data processing
-        is_bot = detect_bot(user_agent)
-        ip_hash = hash_ip(ip_address)
-        browser, os, device_type = parse_user_agent(user_agent)
-        referrer_domain = extract_referrer_domain(referer)
-        country_code = get_country_from_ip(ip_address)
+        is_bot, browser, os, device_type = classify_user_agent(user_agent)
         
         # Always serve pixel, but only record human visits
         if is_bot:
             logger.debug(f"Bot detected: {user_agent[:50]}...")
-            return create_pixel_response()
+            return
         
-        # Record enhanced visit data
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO visits (
-                site, ip_address, user_agent, referer, page_path,
-                country_code, is_bot, referrer_domain, ip_hash,
-                browser, os, device_type
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (site, ip_address, user_agent, referer, page, 
-              country_code, is_bot, referrer_domain, ip_hash,
-              browser, os, device_type))
+        ip_hash = hash_ip(ip_address)
+        referrer_domain = extract_referrer_domain(referer)
+        country_code = get_country_from_ip(ip_address)
         
-        conn.commit()
-        conn.close()
+        # Hand off to the batched writer; the pixel never waits on SQLite
+        queued = ingest_queue.submit({
+            'site': site,
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'referer': referer,
+            'page_path': page,
+            'country_code': country_code,
+            'is_bot': is_bot,
+            'referrer_domain': referrer_domain,
+            'ip_hash': ip_hash,
+            'browser': browser,
+            'os': os,
+            'device_type': device_type,
+            'sample_weight': sample_weight
+        })
         
-        # Update aggregated analytics
-        current_time = datetime.now()
-        update_hourly_analytics(site, current_time)
-        update_page_popularity(site, page)
-        update_referrer_analytics(site, referrer_domain)
-        update_geographic_analytics(site, country_code)
+        if not queued:
+            logger.warning(f"Ingest queue full, dropped visit for {site}")
+            return
         
-        logger.info(f"Enhanced visit recorded: {site} from {ip_hash} ({browser}/{os}/{device_type})")
+        logger.debug(f"Enhanced visit queued: {site} from {ip_hash} ({browser}/{os}/{device_type})")
         
     except Exception as e:
         logger.error(f"Error recording enhanced visit: {e}")
+
+@app.route('/pixel.gif')
+@app.route('/analytics-pixel.gif')  # Support legacy endpoint from website templates
+def tracking_pixel():
+    """Serve 1x1 transparent GIF and record enhanced visit data
     
+    Normally answered by PixelFastPath before Flask sees the request; this
+    route remains for other methods and for callers that bypass the middleware.
+    """
+    record_visit(
+        request.args.get('site', 'unknown'),
+        request.args.get('page', '/'),
+        request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr),
+        request.headers.get('User-Agent', ''),
+        request.headers.get('Referer', '')
+    )
     return create_pixel_response()
 
+# 1x1 transparent GIF, allocated once
+PIXEL_GIF = b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00\x21\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x04\x01\x00\x3b'
+
+PIXEL_PATHS = frozenset(('/pixel.gif', '/analytics-pixel.gif'))
+
+# Immutable no-store header block: no ETag/Last-Modified, so there is never a 304
+PIXEL_HEADERS = (
+    ('Content-Type', 'image/gif'),
+    ('Content-Length', str(len(PIXEL_GIF))),
+    ('Cache-Control', 'no-cache, no-store, must-revalidate'),
+    ('Pragma', 'no-cache'),
+    ('Expires', '0'),
+    ('Access-Control-Allow-Origin', '*')
+)
+PIXEL_BODY = (PIXEL_GIF,)
+
 def create_pixel_response():
     """Create 1x1 transparent GIF response"""
-    # 1x1 transparent GIF in base64
-    pixel_data = b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00\x21\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x04\x01\x00\x3b'
+    return Response(PIXEL_GIF, status=200, headers=list(PIXEL_HEADERS))
+
+def parse_pixel_query(query_string):
+    """site/page from a raw query string (first value wins, like request.args.get)"""
+    params = {}
+    for key, value in parse_qsl(query_string, keep_blank_values=True):
+        params.setdefault(key, value)
+    return params.get('site', 'unknown'), params.get('page', '/')
+
+class PixelFastPath:
+    """WSGI middleware answering pixel GET/HEAD hits before Flask builds a request
     
-    response = Response(pixel_data, mimetype='image/gif')
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    return response
+    Skips Werkzeug request/header objects and URL routing entirely and replies
+    with the prebuilt header block and body.
+    """
+    
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+    
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD')
+        if environ.get('PATH_INFO') not in PIXEL_PATHS or method not in ('GET', 'HEAD'):
+            return self.wsgi_app(environ, start_response)
+        
+        site, page = parse_pixel_query(environ.get('QUERY_STRING', ''))
+        record_visit(
+            site,
+            page,
+            environ.get('HTTP_X_FORWARDED_FOR', environ.get('REMOTE_ADDR')),
+            environ.get('HTTP_USER_AGENT', ''),
+            environ.get('HTTP_REFERER', '')
+        )
+        start_response('200 OK', list(PIXEL_HEADERS))
+        return PIXEL_BODY if method == 'GET' else ()
 
-@app.route('/analytics/<site>')
-def get_analytics(site):
-    """Get analytics data for a specific site"""
+app.wsgi_app = PixelFastPath(app.wsgi_app)
+
+# Compact event codes used by the snippets
+COLLECT_EVENT_TYPES = {'pv': 'pageview', 'tm': 'timing', 'en': 'engagement'}
+
+@app.route('/collect', methods=['POST'])
+def collect_events():
+    """Record a batch of client events sent with navigator.sendBeacon
+    
+    Body (JSON, usually sent as text/plain to avoid a CORS preflight):
+        {"s": "<site>", "e": [{"t": "pv", "p": "/path", "r": "<document.referrer>"},
+                              {"t": "tm", "p": "/path", "n": "load", "v": 812},
+                              {"t": "en", "p": "/path", "n": "visible_ms", "v": 45000}]}
+    Page views go through the normal visit pipeline; timing and engagement
+    events are only aggregated hourly into page_events.
+    """
+    cors = {'Access-Control-Allow-Origin': '*'}
+    max_body = COLLECT_CONFIG['max_body_bytes']
+    if (request.content_length or 0) > max_body:
+        return '', 413, cors
+    # Bound the read itself: chunked bodies carry no Content-Length to check
+    body = request.stream.read(max_body + 1)
+    if len(body) > max_body:
+        return '', 413, cors
+    
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Recent visitors (last hour)
-        cursor.execute('''
-            SELECT COUNT(*) FROM visits 
-            WHERE site = ? AND timestamp > datetime('now', '-1 hour')
-        ''', (site,))
-        recent = cursor.fetchone()[0]
-        
-        # Hourly (last 24 hours)
-        cursor.execute('''
-            SELECT COUNT(*) FROM visits 
-            WHERE site = ? AND timestamp > datetime('now', '-1 day')
-        ''', (site,))
-        hourly = cursor.fetchone()[0]
+        payload = json.loads(body or b'{}')
+        site = str(payload.get('s') or 'unknown')[:50]
+        events = payload.get('e') or []
+        if not isinstance(events, list):
+            raise ValueError("'e' must be a list")
+    except (ValueError, AttributeError) as e:
+        logger.debug(f"Rejected /collect batch: {e}")
+        return '', 400, cors
+    
+    try:
+        ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+        user_agent = request.headers.get('User-Agent', '')
+        header_referer = request.headers.get('Referer', '')
         
-        # Daily (last 7 days)
-        cursor.execute('''
-            SELECT COUNT(*) FROM visits 
-            WHERE site = ? AND timestamp > datetime('now', '-7 days')
-        ''', (site,))
-        daily = cursor.fetchone()[0]
+        if classify_user_agent(user_agent)[0]:
+            return '', 204, cors
         
-        # Weekly (last 30 days)
-        cursor.execute('''
-            SELECT COUNT(*) FROM visits 
-            WHERE site = ? AND timestamp > datetime('now', '-30 days')
-        ''', (site,))
-        weekly = cursor.fetchone()[0]
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        metrics = []
+        for event in events[:COLLECT_CONFIG['max_events']]:
+            if not isinstance(event, dict):
+                continue
+            event_type = COLLECT_EVENT_TYPES.get(event.get('t'))
+            page = str(event.get('p') or '/')[:500]
+            
+            if event_type == 'pageview':
+                record_visit(site, page, ip_address, user_agent, str(event.get('r') or header_referer))
+            elif event_type is not None:
+                try:
+                    value = float(event.get('v', 0))
+                except (TypeError, ValueError):
+                    continue
+                if value != value:  # NaN
+                    continue
+                value = min(max(value, 0.0), COLLECT_CONFIG['max_value'])
+                metrics.append((site, timestamp, page, event_type, str(event.get('n') or event_type)[:50], value))
         
-        # Monthly (last 90 days)
-        cursor.execute('''
-            SELECT COUNT(*) FROM visits 
-            WHERE site = ? AND timestamp > datetime('now', '-90 days')
-        ''', (site,))
-        monthly = cursor.fetchone()[0]
+        if metrics:
+            ingest_queue.rollups.add_events(metrics)
         
+    except Exception as e:
+        logger.error(f"Error recording /collect batch for {site}: {e}")
+    
+    return '', 204, cors
+
+@app.route('/analytics/<site>')
+@cached_response('site_analytics')
+def get_analytics(site):
+    """Get analytics data for a specific site"""
+    try:
+        conn = db_pool.connect(DB_PATH)
+        cursor = conn.cursor()
+        counts = get_window_counts(cursor, site).get(site, {})
         conn.close()
         
         return jsonify({
             'site': site,
-            'recent': recent,      # Last hour
-            'hourly': hourly,      # Last 24 hours
-            'daily': daily,        # Last 7 days  
-            'weekly': weekly,      # Last 30 days
-            'monthly': monthly,    # Last 90 days
+            'recent': counts.get('recent', 0),      # Last hour
+            'hourly': counts.get('hourly', 0),      # Last 24 hours
+            'daily': counts.get('daily', 0),        # Last 7 days
+            'weekly': counts.get('weekly', 0),      # Last 30 days
+            'monthly': counts.get('monthly', 0),    # Last 90 days
             'timestamp': datetime.now().isoformat()
         })
         
@@ -381,39 +1852,13 @@ def get_analytics(site):
         return jsonify({'error': 'Unable to retrieve analytics'}), 500
 
 @app.route('/analytics')
+@cached_response('analytics')
 def get_all_analytics():
     """Get analytics summary for all sites"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = db_pool.connect(DB_PATH)
         cursor = conn.cursor()
-        
-        # Get all sites
-        cursor.execute('SELECT DISTINCT site FROM visits ORDER BY site')
-        sites = [row[0] for row in cursor.fetchall()]
-        
-        analytics = {}
-        
-        for site in sites:
-            # Get stats for each site
-            cursor.execute('''
-                SELECT 
-                    COUNT(CASE WHEN timestamp > datetime('now', '-1 hour') THEN 1 END) as recent,
-                    COUNT(CASE WHEN timestamp > datetime('now', '-1 day') THEN 1 END) as hourly,
-                    COUNT(CASE WHEN timestamp > datetime('now', '-7 days') THEN 1 END) as daily,
-                    COUNT(CASE WHEN timestamp > datetime('now', '-30 days') THEN 1 END) as weekly,
-                    COUNT(CASE WHEN timestamp > datetime('now', '-90 days') THEN 1 END) as monthly
-                FROM visits WHERE site = ?
-            ''', (site,))
-            
-            stats = cursor.fetchone()
-            analytics[site] = {
-                'recent': stats[0],
-                'hourly': stats[1], 
-                'daily': stats[2],
-                'weekly': stats[3],
-                'monthly': stats[4]
-            }
-        
+        analytics = get_window_counts(cursor)
         conn.close()
         
         return jsonify({
@@ -425,62 +1870,50 @@ def get_all_analytics():
         logger.error(f"Error getting all analytics: {e}")
         return jsonify({'error': 'Unable to retrieve analytics'}), 500
 
+BREAKDOWN_DAYS = 7   # Daily rows summed by the enhanced/summary endpoints
+
+def breakdown_since():
+    """First day (inclusive) of the breakdown window: today plus the previous six days"""
+    return (datetime.utcnow() - timedelta(days=BREAKDOWN_DAYS - 1)).strftime('%Y-%m-%d')
+
+def query_breakdown(cursor, dimension, site=None, limit=None):
+    """[(value, visits)] summed over the last BREAKDOWN_DAYS daily rows"""
+    site_clause = 'AND site = ?' if site else ''
+    params = [dimension, breakdown_since()] + ([site] if site else [])
+    cursor.execute(f'''
+        SELECT value, SUM(visit_count) as count
+        FROM daily_breakdowns
+        WHERE dimension = ? AND day >= ? {site_clause}
+        GROUP BY value
+        ORDER BY count DESC
+        {'LIMIT ' + str(int(limit)) if limit else ''}
+    ''', params)
+    return cursor.fetchall()
+
 @app.route('/analytics/enhanced/<site>')
+@cached_response('enhanced')
 def get_enhanced_analytics(site):
     """Get enhanced analytics data for a specific site"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = db_pool.connect(DB_PATH)
         cursor = conn.cursor()
         
-        # Browser breakdown
-        cursor.execute('''
-            SELECT browser, COUNT(*) as count
-            FROM visits 
-            WHERE site = ? AND browser IS NOT NULL AND timestamp > datetime('now', '-7 days')
-            GROUP BY browser
-            ORDER BY count DESC
-        ''', (site,))
-        browsers = [{'name': row[0], 'count': row[1]} for row in cursor.fetchall()]
-        
-        # OS breakdown
-        cursor.execute('''
-            SELECT os, COUNT(*) as count
-            FROM visits 
-            WHERE site = ? AND os IS NOT NULL AND timestamp > datetime('now', '-7 days')
-            GROUP BY os
-            ORDER BY count DESC
-        ''', (site,))
-        operating_systems = [{'name': row[0], 'count': row[1]} for row in cursor.fetchall()]
-        
-        # Device types
-        cursor.execute('''
-            SELECT device_type, COUNT(*) as count
-            FROM visits 
-            WHERE site = ? AND device_type IS NOT NULL AND timestamp > datetime('now', '-7 days')
-            GROUP BY device_type
-            ORDER BY count DESC
-        ''', (site,))
-        devices = [{'name': row[0], 'count': row[1]} for row in cursor.fetchall()]
-        
-        # Referrer domains
-        cursor.execute('''
-            SELECT referrer_domain, COUNT(*) as count
-            FROM visits 
-            WHERE site = ? AND referrer_domain IS NOT NULL AND timestamp > datetime('now', '-7 days')
-            GROUP BY referrer_domain
-            ORDER BY count DESC
-            LIMIT 10
-        ''', (site,))
-        referrers = [{'domain': row[0], 'count': row[1]} for row in cursor.fetchall()]
-        
-        # Hourly traffic (last 24 hours)
+        # Breakdowns come from at most 7 daily rows per value (see daily_breakdowns)
+        browsers = [{'name': row[0], 'count': row[1]} for row in query_breakdown(cursor, 'browser', site)]
+        operating_systems = [{'name': row[0], 'count': row[1]} for row in query_breakdown(cursor, 'os', site)]
+        devices = [{'name': row[0], 'count': row[1]} for row in query_breakdown(cursor, 'device_type', site)]
+        referrers = [{'domain': row[0], 'count': row[1]} for row in query_breakdown(cursor, 'referrer_domain', site, limit=10)]
+        
+        # Hourly traffic (last 24 hours): today's and yesterday's hour-of-day rows
+        cutoff = datetime.utcnow() - timedelta(days=1)
         cursor.execute('''
-            SELECT strftime('%H', timestamp) as hour, COUNT(*) as count
-            FROM visits 
-            WHERE site = ? AND timestamp > datetime('now', '-1 day')
+            SELECT value as hour, SUM(visit_count) as count
+            FROM daily_breakdowns
+            WHERE site = ? AND dimension = 'hour' AND day >= ?
+              AND day || ' ' || value > ?
             GROUP BY hour
             ORDER BY hour
-        ''', (site,))
+        ''', (site, cutoff.strftime('%Y-%m-%d'), cutoff.strftime('%Y-%m-%d %H')))
         hourly_traffic = [{'hour': row[0], 'count': row[1]} for row in cursor.fetchall()]
         
         conn.close()
@@ -500,54 +1933,27 @@ def get_enhanced_analytics(site):
         return jsonify({'error': 'Unable to retrieve enhanced analytics'}), 500
 
 @app.route('/analytics/summary')
+@cached_response('summary')
 def get_analytics_summary():
     """Get analytics summary across all sites"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = db_pool.connect(DB_PATH)
         cursor = conn.cursor()
         
-        # Total visitors by device type
-        cursor.execute('''
-            SELECT device_type, COUNT(*) as count
-            FROM visits 
-            WHERE device_type IS NOT NULL AND timestamp > datetime('now', '-7 days')
-            GROUP BY device_type
-            ORDER BY count DESC
-        ''')
-        total_devices = [{'name': row[0], 'count': row[1]} for row in cursor.fetchall()]
-        
-        # Total visitors by browser
-        cursor.execute('''
-            SELECT browser, COUNT(*) as count
-            FROM visits 
-            WHERE browser IS NOT NULL AND timestamp > datetime('now', '-7 days')
-            GROUP BY browser
-            ORDER BY count DESC
-            LIMIT 10
-        ''')
-        total_browsers = [{'name': row[0], 'count': row[1]} for row in cursor.fetchall()]
-        
-        # Daily visitor trends (last 7 days)
+        total_devices = [{'name': row[0], 'count': row[1]} for row in query_breakdown(cursor, 'device_type')]
+        total_browsers = [{'name': row[0], 'count': row[1]} for row in query_breakdown(cursor, 'browser', limit=10)]
+        top_referrers = [{'domain': row[0], 'count': row[1]} for row in query_breakdown(cursor, 'referrer_domain', limit=10)]
+        
+        # Daily visitor trends (last 7 days): every visit has exactly one hour row
         cursor.execute('''
-            SELECT DATE(timestamp) as date, COUNT(*) as count
-            FROM visits 
-            WHERE timestamp > datetime('now', '-7 days')
-            GROUP BY DATE(timestamp)
+            SELECT day as date, SUM(visit_count) as count
+            FROM daily_breakdowns
+            WHERE dimension = 'hour' AND day >= ?
+            GROUP BY day
             ORDER BY date
-        ''')
+        ''', (breakdown_since(),))
         daily_trends = [{'date': row[0], 'count': row[1]} for row in cursor.fetchall()]
         
-        # Top referrer domains
-        cursor.execute('''
-            SELECT referrer_domain, COUNT(*) as count
-            FROM visits 
-            WHERE referrer_domain IS NOT NULL AND timestamp > datetime('now', '-7 days')
-            GROUP BY referrer_domain
-            ORDER BY count DESC
-            LIMIT 10
-        ''')
-        top_referrers = [{'domain': row[0], 'count': row[1]} for row in cursor.fetchall()]
-        
         conn.close()
         
         return jsonify({
@@ -562,20 +1968,100 @@ def get_analytics_summary():
         logger.error(f"Error getting analytics summary: {e}")
         return jsonify({'error': 'Unable to retrieve analytics summary'}), 500
 
+@app.route('/analytics/uniques/<site>')
+@cached_response('uniques')
+def get_unique_analytics(site):
+    """Approximate unique visitors from unioned hourly HyperLogLog sketches"""
+    try:
+        conn = db_pool.connect(DB_PATH)
+        cursor = conn.cursor()
+        
+        now = datetime.utcnow()
+        windows = {'day': 1, 'week': 7, 'month': 30}
+        uniques = {}
+        for name, days in windows.items():
+            since = (now - timedelta(days=days)).strftime('%Y-%m-%d %H:00:00')
+            uniques[name] = get_unique_visitors(cursor, None if site == 'all' else site, since)
+        
+        conn.close()
+        
+        return jsonify({
+            'site': site,
+            'unique_visitors': uniques,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting unique visitors for {site}: {e}")
+        return jsonify({'error': 'Unable to retrieve unique visitors'}), 500
+
+@app.route('/ingest/stats')
+def get_ingest_stats():
+    """Ingest queue depth, drops and flush latency"""
+    return jsonify({
+        'ingest': ingest_queue.get_stats(),
+        'sampling': load_shedder.get_stats(),
+        'backfill': enhanced_backfill.get_stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/cache/stats')
+def get_cache_stats():
+    """Read API cache hit/miss counters"""
+    return jsonify({
+        'cache': response_cache.get_stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
+        'ingest_queue_depth': ingest_queue.queue.qsize(),
         'timestamp': datetime.now().isoformat()
     })
 
-if __name__ == '__main__':
+def start_background_services():
+    """Prepare the database and start the writer/archiver threads
+    
+    Shared by the Flask dev server entry point and analytics-async-server.py.
+    """
     # Initialize database
     init_database()
     
     # Cleanup old visits on startup
     cleanup_old_visits()
     
+    # Load the offline GeoIP table (country detection is skipped if absent)
+    geoip_lookup.load_database()
+    
+    # Warm the last-hour counters, then start the batched writer and make
+    # sure pending visits are flushed on exit
+    try:
+        conn = db_pool.connect(DB_PATH)
+        ingest_queue.recent.seed(conn.cursor())
+        conn.close()
+    except Exception as e:
+        logger.error(f"Error seeding recent visit counters: {e}")
+    ingest_queue.start()
+    
+    # Archive closed months off the request and ingest paths
+    archive_stop = threading.Event()
+    threading.Thread(target=run_archiver, args=(archive_stop,), name='visit-archiver', daemon=True).start()
+    atexit.register(archive_stop.set)
+    
+    # Fill enhanced columns on old rows in small chunks, yielding to live ingest
+    if BACKFILL_CONFIG['enabled']:
+        backfill_stop = threading.Event()
+        threading.Thread(target=run_enhanced_backfill, args=(backfill_stop,), name='enhanced-backfill', daemon=True).start()
+        atexit.register(backfill_stop.set)
+    atexit.register(db_pool.close_all)
+    atexit.register(ingest_queue.stop)
+
+if __name__ == '__main__':
+    start_background_services()
+    signal.signal(signal.SIGTERM, shutdown_ingest)
+    
     logger.info("Starting analytics tracker on port 8083")
-    app.run(host='0.0.0.0', port=8083, debug=False)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8083, debug=False)
@@ -10,6 +10,8 @@ import json
 import shutil
 import tarfile
 import sqlite3
+import db_pool
+import schema_migrations
 import logging
 import subprocess
 from datetime import datetime, timedelta
@@ -85,38 +87,7 @@ class BackupRecoverySystem:
     def init_backup_database(self):
         """Initialize backup tracking database"""
         try:
-            db_path = self.backup_root / "backup_history.db"
-            conn = sqlite3.connect(str(db_path))
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS backup_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    service_name TEXT NOT NULL,
-                    backup_type TEXT NOT NULL,
-                    backup_path TEXT NOT NULL,
-                    size_mb REAL,
-                    duration_seconds INTEGER,
-                    status TEXT,
-                    error_message TEXT
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS recovery_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    service_name TEXT NOT NULL,
-                    backup_timestamp TEXT NOT NULL,
-                    recovery_path TEXT NOT NULL,
-                    status TEXT,
-                    error_message TEXT
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            schema_migrations.migrate('backup', self.backup_root / "backup_history.db")
             logger.info("Backup database initialized")
             
         except Exception as e:
@@ -127,7 +98,7 @@ class BackupRecoverySystem:
         """Log backup operation to database"""
         try:
             db_path = self.backup_root / "backup_history.db"
-            conn = sqlite3.connect(str(db_path))
+            conn = db_pool.connect(str(db_path))
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -455,7 +426,7 @@ class BackupRecoverySystem:
             
             # Log recovery operation
             db_path = self.backup_root / "backup_history.db"
-            conn = sqlite3.connect(str(db_path))
+            conn = db_pool.connect(str(db_path))
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO recovery_history 
@@ -474,7 +445,7 @@ class BackupRecoverySystem:
             # Log failed recovery
             try:
                 db_path = self.backup_root / "backup_history.db"
-                conn = sqlite3.connect(str(db_path))
+                conn = db_pool.connect(str(db_path))
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO recovery_history 
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite Connection Pool
+Keeps persistent, WAL-mode connections per database file for all monitoring stores
+"""
+
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pragmas applied to every new connection. WAL lets readers (dashboard, CLI)
+# proceed while a writer (pixel ingest, monitors) holds the write lock.
+POOL_CONFIG = {
+    "pragmas": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",      # Safe with WAL; fsync only at checkpoints
+        "cache_size": -16000,         # 16MB page cache (negative = KiB)
+        "mmap_size": 268435456,       # 256MB memory-mapped reads
+        "temp_store": "MEMORY"
+    },
+    "busy_timeout_seconds": 30,
+    "cached_statements": 256,         # Per-connection prepared statement cache
+    "max_idle_per_database": 8
+}
+
+class ConnectionPool:
+    """Pool of idle connections for a single database file"""
+
+    def __init__(self, db_path: str, max_idle: int = None):
+        self.db_path = db_path
+        self.max_idle = max_idle or POOL_CONFIG["max_idle_per_database"]
+        self._idle = []
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+        self.trace_callback = None
+
+    def _create(self) -> sqlite3.Connection:
+        """Open a new connection with tuned pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=POOL_CONFIG["busy_timeout_seconds"],
+            cached_statements=POOL_CONFIG["cached_statements"],
+            check_same_thread=False  # Connections move between threads via the pool, never shared concurrently
+        )
+        for pragma, value in POOL_CONFIG["pragmas"].items():
+            try:
+                conn.execute(f"PRAGMA {pragma} = {value}")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not set PRAGMA {pragma} on {self.db_path}: {e}")
+        if self.trace_callback:
+            conn.set_trace_callback(self.trace_callback)
+        self.stats["created"] += 1
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out an idle connection or open a new one"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.stats["reused"] += 1
+
+        if conn is None:
+            conn = self._create()
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection; anything left uncommitted is rolled back"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    def _discard(self, conn: sqlite3.Connection):
+        self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+class PooledConnection:
+    """sqlite3.Connection stand-in whose close() returns it to the pool
+
+    Call sites keep the familiar connect/commit/close pattern; a checkout
+    that is never closed (e.g. an exception path) is released when the
+    wrapper is garbage collected.
+    """
+
+    def __init__(self, pool: ConnectionPool, conn: sqlite3.Connection):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, "_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        conn = object.__getattribute__(self, "_conn")
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool.release(conn)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Get (or create) the pool for a database file"""
+    db_path = str(db_path)
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = _pools[db_path] = ConnectionPool(db_path)
+    return pool
+
+def connect(db_path) -> PooledConnection:
+    """Drop-in replacement for sqlite3.connect() backed by the shared pool"""
+    pool = get_pool(db_path)
+    return PooledConnection(pool, pool.acquire())
+
+def close_all():
+    """Close idle connections for every database (call on shutdown)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+def set_trace_callback(db_path, callback):
+    """Trace every statement run on a database's pooled connections (None to stop)
+
+    Used by query-plan-audit.py to capture the SQL the scripts actually run.
+    """
+    pool = get_pool(db_path)
+    pool.trace_callback = callback
+    with pool._lock:
+        for conn in pool._idle:
+            conn.set_trace_callback(callback)
+
+def get_pool_stats() -> dict:
+    """Connection reuse statistics per database file"""
+    with _pools_lock:
+        return {path: dict(pool.stats, idle=len(pool._idle)) for path, pool in _pools.items()}
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Offline GeoIP Country Lookup
+Sorted, array-backed IP range table with binary search; never touches the network
+"""
+
+import os
+import sys
+import csv
+import bisect
+import socket
+import logging
+import ipaddress
+from array import array
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+GEOIP_CONFIG = {
+    # Either a range CSV (start_ip,end_ip,country_code - e.g. DB-IP "country lite")
+    # or a GeoLite2 Country blocks CSV plus its locations CSV
+    "database": "/var/lib/geoip/dbip-country-lite.csv",
+    "locations": None,   # e.g. /var/lib/geoip/GeoLite2-Country-Locations-en.csv
+    "cache_size": 65536
+}
+
+# IPv4 fits in unsigned 32-bit array slots; IPv6 ranges need Python ints
+IPV4_TYPECODE = 'I' if array('I').itemsize >= 4 else 'L'
+
+class RangeTable:
+    """Non-overlapping [start, end] integer ranges mapped to country codes"""
+
+    def __init__(self, ranges, typecode: Optional[str]):
+        ranges.sort()
+        self.starts = array(typecode) if typecode else []
+        self.ends = array(typecode) if typecode else []
+        self.codes = array('H')
+        self.country_names = []
+        code_index = {}
+
+        for start, end, code in ranges:
+            index = code_index.get(code)
+            if index is None:
+                index = code_index[code] = len(self.country_names)
+                self.country_names.append(code)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.codes.append(index)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find(self, value: int) -> Optional[str]:
+        i = bisect.bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self.country_names[self.codes[i]]
+        return None
+
+class GeoIPDatabase:
+    """Country lookup over IPv4 and IPv6 range tables"""
+
+    def __init__(self):
+        self.ipv4 = RangeTable([], IPV4_TYPECODE)
+        self.ipv6 = RangeTable([], None)
+        self.source = None
+
+    @property
+    def loaded(self) -> bool:
+        return bool(len(self.ipv4) or len(self.ipv6))
+
+    def _build(self, ranges_v4, ranges_v6, source):
+        self.ipv4 = RangeTable(ranges_v4, IPV4_TYPECODE)
+        self.ipv6 = RangeTable(ranges_v6, None)
+        self.source = source
+        lookup_country.cache_clear()
+        logger.info(f"GeoIP loaded from {source}: {len(self.ipv4)} IPv4 / {len(self.ipv6)} IPv6 ranges")
+
+    def load_range_csv(self, path: str):
+        """Load start_ip,end_ip,country_code rows (DB-IP / IP2Location style)"""
+        ranges_v4, ranges_v6 = [], []
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                try:
+                    start = ipaddress.ip_address(row[0].strip())
+                    end = ipaddress.ip_address(row[1].strip())
+                except ValueError:
+                    continue  # Header or malformed row
+                code = row[2].strip().upper()
+                if len(code) != 2 or code == 'ZZ':
+                    continue
+                target = ranges_v4 if start.version == 4 else ranges_v6
+                target.append((int(start), int(end), code))
+        self._build(ranges_v4, ranges_v6, path)
+
+    def load_geolite2_csv(self, blocks_path: str, locations_path: str):
+        """Load GeoLite2 Country blocks (network CIDR) joined to its locations file"""
+        countries = {}
+        with open(locations_path, newline='') as f:
+            for row in csv.DictReader(f):
+                if row.get('country_iso_code'):
+                    countries[row['geoname_id']] = row['country_iso_code'].upper()
+
+        ranges_v4, ranges_v6 = [], []
+        with open(blocks_path, newline='') as f:
+            for row in csv.DictReader(f):
+                geoname_id = row.get('geoname_id') or row.get('registered_country_geoname_id')
+                code = countries.get(geoname_id)
+                if not code:
+                    continue
+                network = ipaddress.ip_network(row['network'])
+                target = ranges_v4 if network.version == 4 else ranges_v6
+                target.append((int(network.network_address), int(network.broadcast_address), code))
+        self._build(ranges_v4, ranges_v6, blocks_path)
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """Country code for an IP address string, or None"""
+        # inet_pton is several times faster than ipaddress for the hot path
+        try:
+            return self.ipv4.find(int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big'))
+        except (OSError, TypeError):
+            pass
+        try:
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big')
+        except (OSError, TypeError):
+            return None
+        if value >> 32 == 0xFFFF:
+            return self.ipv4.find(value & 0xFFFFFFFF)  # IPv4-mapped ::ffff:a.b.c.d
+        return self.ipv6.find(value)
+
+geoip_db = GeoIPDatabase()
+
+def load_database(path: str = None, locations: str = None) -> bool:
+    """Load the configured GeoIP file; returns False (lookups yield None) if unavailable"""
+    path = path or GEOIP_CONFIG["database"]
+    locations = locations or GEOIP_CONFIG["locations"]
+    if not os.path.exists(path):
+        logger.warning(f"GeoIP database not found at {path}; country detection disabled")
+        return False
+    try:
+        if locations:
+            geoip_db.load_geolite2_csv(path, locations)
+        else:
+            geoip_db.load_range_csv(path)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to load GeoIP database {path}: {e}")
+        return False
+
+@lru_cache(maxsize=GEOIP_CONFIG["cache_size"])
+def lookup_country(ip: str) -> Optional[str]:
+    """Cached country lookup for hot IPs"""
+    return geoip_db.lookup(ip)
+
+def main():
+    """CLI: geoip_lookup.py <ip> [<ip> ...]"""
+    if len(sys.argv) < 2:
+        print("Usage: geoip_lookup.py <ip> [<ip> ...]")
+        return
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_database()
+    for ip in sys.argv[1:]:
+        print(f"{ip}: {lookup_country(ip) or 'unknown'}")
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ import json
 import time
 import logging
 import sqlite3
+import db_pool
 import smtplib
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
@@ -69,6 +70,7 @@ class IntelligentAlertManager:
         self.config = ALERTING_CONFIG
         self.monitoring_db = self.config["database"]
         self.alert_config_file = self.config["config_file"]
+        self.alert_config_mtime = None
         self.alert_history = self.load_alert_config()
         
     def load_alert_config(self) -> Dict:
@@ -84,6 +86,7 @@ class IntelligentAlertManager:
         
         if os.path.exists(self.alert_config_file):
             try:
+                self.alert_config_mtime = os.path.getmtime(self.alert_config_file)
                 with open(self.alert_config_file, 'r') as f:
                     config = json.load(f)
                     # Ensure all required keys exist
@@ -101,9 +104,20 @@ class IntelligentAlertManager:
         try:
             with open(self.alert_config_file, 'w') as f:
                 json.dump(self.alert_history, f, indent=2)
+            self.alert_config_mtime = os.path.getmtime(self.alert_config_file)
         except Exception as e:
             logger.error(f"Error saving alert config: {e}")
     
+    def refresh_alert_config(self):
+        """Re-read the alert config if another process (e.g. `silence`) changed it since we last loaded or saved it"""
+        try:
+            mtime = os.path.getmtime(self.alert_config_file)
+        except OSError:
+            return
+        if mtime != self.alert_config_mtime:
+            logger.info("Alert config changed on disk, reloading")
+            self.alert_history = self.load_alert_config()
+    
     def cleanup_old_data(self):
         """Clean up old alert history data"""
         now = datetime.now()
@@ -295,7 +309,7 @@ Dashboard: https://conflost.com/monitor
     def log_alert_to_database(self, service_name: str, escalation_level: str, downtime_minutes: int, alert_sent: bool):
         """Log alert to monitoring database"""
         try:
-            conn = sqlite3.connect(self.monitoring_db)
+            conn = db_pool.connect(self.monitoring_db)
             cursor = conn.cursor()
             
             # Ensure alert_history table exists
@@ -327,7 +341,7 @@ Dashboard: https://conflost.com/monitor
     def get_service_downtime(self, service_name: str) -> Optional[int]:
         """Get current downtime in minutes for a service"""
         try:
-            conn = sqlite3.connect(self.monitoring_db)
+            conn = db_pool.connect(self.monitoring_db)
             cursor = conn.cursor()
             
             # Get the most recent failure event
@@ -352,25 +366,33 @@ Dashboard: https://conflost.com/monitor
             logger.error(f"Error getting downtime for {service_name}: {e}")
             return None
     
-    def check_and_send_alerts(self):
-        """Main function to check service status and send intelligent alerts"""
+    def check_and_send_alerts(self, services=None):
+        """Main function to check service status and send intelligent alerts
+        
+        services: current health results when the caller already holds them
+        (monitor-daemon.py); read from the status file otherwise.
+        """
         logger.info("🔍 Checking services for intelligent alerting")
         
+        # Pick up silences set from the CLI while this instance was running
+        self.refresh_alert_config()
+        
         # Clean up old data first
         self.cleanup_old_data()
         
         # Read current service status
-        status_file = "/var/log/web-services-status.json"
-        if not os.path.exists(status_file):
-            logger.warning("Service status file not found")
-            return
-        
-        try:
-            with open(status_file, 'r') as f:
-                services = json.load(f)
-        except Exception as e:
-            logger.error(f"Error reading service status: {e}")
-            return
+        if services is None:
+            status_file = "/var/log/web-services-status.json"
+            if not os.path.exists(status_file):
+                logger.warning("Service status file not found")
+                return
+            
+            try:
+                with open(status_file, 'r') as f:
+                    services = json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading service status: {e}")
+                return
         
         alerts_sent = 0
         
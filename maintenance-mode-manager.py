@@ -9,6 +9,8 @@ import sys
 import json
 import logging
 import sqlite3
+import db_pool
+import schema_migrations
 import subprocess
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
@@ -49,42 +51,7 @@ class MaintenanceModeManager:
     def init_database(self):
         """Initialize maintenance scheduling database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Create maintenance schedules table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS maintenance_schedules (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    service_name TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    scheduled_start DATETIME NOT NULL,
-                    scheduled_end DATETIME NOT NULL,
-                    actual_start DATETIME,
-                    actual_end DATETIME,
-                    status TEXT DEFAULT 'scheduled',
-                    created_by TEXT DEFAULT 'system',
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    notification_sent BOOLEAN DEFAULT FALSE
-                )
-            ''')
-            
-            # Create maintenance logs table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS maintenance_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    schedule_id INTEGER,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    action TEXT NOT NULL,
-                    details TEXT,
-                    status TEXT,
-                    FOREIGN KEY (schedule_id) REFERENCES maintenance_schedules (id)
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            schema_migrations.migrate('maintenance', self.db_path)
             logger.info("Maintenance database initialized")
             
         except Exception as e:
@@ -222,7 +189,7 @@ class MaintenanceModeManager:
             if start_time <= datetime.now():
                 raise ValueError("Start time must be in the future")
             
-            conn = sqlite3.connect(self.db_path)
+            conn = db_pool.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -256,7 +223,7 @@ class MaintenanceModeManager:
     def get_active_maintenance(self) -> List[Dict]:
         """Get currently active maintenance windows"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_pool.connect(self.db_path)
             cursor = conn.cursor()
             
             now = datetime.now().isoformat()
@@ -293,7 +260,7 @@ class MaintenanceModeManager:
     def get_upcoming_maintenance(self, hours_ahead: int = 24) -> List[Dict]:
         """Get maintenance scheduled within the next N hours"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_pool.connect(self.db_path)
             cursor = conn.cursor()
             
             now = datetime.now()
@@ -328,7 +295,7 @@ class MaintenanceModeManager:
     def start_maintenance(self, schedule_id: int) -> bool:
         """Start a scheduled maintenance window"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_pool.connect(self.db_path)
             cursor = conn.cursor()
             
             # Get maintenance details
@@ -378,7 +345,7 @@ class MaintenanceModeManager:
             
             # Log the failure
             try:
-                conn = sqlite3.connect(self.db_path)
+                conn = db_pool.connect(self.db_path)
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO maintenance_logs (schedule_id, action, details, status)
@@ -394,7 +361,7 @@ class MaintenanceModeManager:
     def end_maintenance(self, schedule_id: int) -> bool:
         """End a maintenance window"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_pool.connect(self.db_path)
             cursor = conn.cursor()
             
             # Get maintenance details
@@ -444,7 +411,7 @@ class MaintenanceModeManager:
             
             # Log the failure
             try:
-                conn = sqlite3.connect(self.db_path)
+                conn = db_pool.connect(self.db_path)
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO maintenance_logs (schedule_id, action, details, status)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Service Metrics Rollups
+Tiered retention for service_metrics: raw probe rows for 48 hours, then 1-minute and
+1-hour rollups with mergeable latency sketches; reads are answered from the coarsest
+tier that covers the range
+"""
+
+import math
+import time
+import struct
+import logging
+import db_pool
+import schema_migrations
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+RETENTION_CONFIG = {
+    "raw_retention_h": 48,          # Raw rows are pruned after this (once both tiers cover them)
+    "minute_retention_days": 14,    # service_metrics_1m
+    "hour_retention_days": 400,     # service_metrics_1h
+    "settle_s": 120,                # A bucket is rolled up once it ended this long ago
+    "chunk_hours": 6,               # Raw span aggregated per write transaction
+    "delete_batch_rows": 5000,      # Raw rows deleted per transaction
+    "pause_s": 0.05,                # Sleep between transactions so the monitor can write
+    "min_buckets": 12               # A tier answers a range only if the range spans this many of its buckets
+}
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class Tier:
+    """One rollup table: fixed-width buckets keyed by their start time"""
+
+    def __init__(self, name, table, bucket_s, bucket_format, retention_key):
+        self.name = name
+        self.table = table
+        self.bucket_s = bucket_s
+        self.bucket_format = bucket_format   # strftime format that floors a timestamp to its bucket
+        self.retention_key = retention_key
+
+    def floor(self, dt):
+        return datetime.strptime(dt.strftime(self.bucket_format), TIME_FORMAT)
+
+    def retention(self, config):
+        return timedelta(days=config[self.retention_key])
+
+# Coarsest first
+TIERS = (
+    Tier('1h', 'service_metrics_1h', 3600, '%Y-%m-%d %H:00:00', 'hour_retention_days'),
+    Tier('1m', 'service_metrics_1m', 60, '%Y-%m-%d %H:%M:00', 'minute_retention_days')
+)
+
+class DDSketch:
+    """Mergeable latency quantile sketch (DDSketch: logarithmically sized buckets)
+
+    Every quantile is returned within RELATIVE_ACCURACY of the true value, and
+    sketches merge by adding bucket counts, so per-minute sketches combine into
+    percentiles over any window. Latencies span a few decades of milliseconds,
+    which keeps a sketch to a few hundred buckets at most; stored as a BLOB.
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+    MIN_VALUE = 0.001                     # Smaller values (and 0) are counted as 0 ms
+    HEADER = struct.Struct('<BIddI')      # version, zero_count, min, max, bucket count
+    BUCKET = struct.Struct('<iI')         # bucket index, count
+    VERSION = 1
+
+    def __init__(self):
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        if value is None:
+            return
+        if value < self.MIN_VALUE:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self.LOG_GAMMA)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Add another sketch's counts into this one"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1); None for an empty sketch"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                value = 2 * self.GAMMA ** index / (self.GAMMA + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_blob(self):
+        header = self.HEADER.pack(self.VERSION, self.zero_count, self.min, self.max, len(self.buckets))
+        return header + b''.join(self.BUCKET.pack(index, count) for index, count in self.buckets.items())
+
+    @classmethod
+    def from_blob(cls, blob):
+        sketch = cls()
+        if not blob:
+            return sketch
+        version, sketch.zero_count, sketch.min, sketch.max, size = cls.HEADER.unpack_from(blob)
+        if version != cls.VERSION:
+            raise ValueError(f"Unsupported sketch version {version}")
+        sketch.buckets = dict(cls.BUCKET.iter_unpack(blob[cls.HEADER.size:cls.HEADER.size + size * cls.BUCKET.size]))
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[max(math.ceil(q * len(sorted_values)) - 1, 0)]
+
+def summarize(latencies, healthy_count):
+    """(count, healthy_count, min, max, avg, p50, p95, latency_sketch) for one bucket"""
+    latencies.sort()
+    sketch = DDSketch()
+    for latency in latencies:
+        sketch.add(latency)
+    return (len(latencies), healthy_count, latencies[0], latencies[-1], sum(latencies) / len(latencies),
+            percentile(latencies, 0.50), percentile(latencies, 0.95), sketch.to_blob())
+
+def rolled_until(conn, tier):
+    """Raw rows before this time are rolled up into the tier (None if it never ran)"""
+    row = conn.execute('SELECT rolled_until FROM metrics_rollup_state WHERE tier = ?', (tier.name,)).fetchone()
+    return datetime.strptime(row[0], TIME_FORMAT) if row else None
+
+def rollup_tier(conn, tier, now, config):
+    """Aggregate completed buckets from raw rows into the tier; returns buckets written
+
+    Works forward from the tier's rolled_until in chunk_hours spans, one
+    BEGIN IMMEDIATE transaction each, so an interrupted run resumes cleanly.
+    """
+    end = tier.floor(now - timedelta(seconds=config['settle_s']))
+    start = rolled_until(conn, tier)
+    if start is None:
+        first = conn.execute('SELECT MIN(timestamp) FROM service_metrics').fetchone()[0]
+        if first is None:
+            return 0
+        start = tier.floor(datetime.strptime(first[:19], TIME_FORMAT))
+    # Buckets older than the tier keeps would be pruned straight away
+    start = max(start, tier.floor(now - tier.retention(config)))
+
+    written = 0
+    while start < end:
+        chunk_end = min(start + timedelta(hours=config['chunk_hours']), end)
+        buckets = {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(f'''
+                SELECT service, strftime('{tier.bucket_format}', timestamp), response_time_ms, is_healthy
+                FROM service_metrics
+                WHERE timestamp >= ? AND timestamp < ? AND response_time_ms IS NOT NULL
+            ''', (start.strftime(TIME_FORMAT), chunk_end.strftime(TIME_FORMAT))).fetchall()
+            for service, bucket, response_time_ms, is_healthy in rows:
+                entry = buckets.setdefault((bucket, service), [[], 0])
+                entry[0].append(response_time_ms)
+                entry[1] += bool(is_healthy)
+
+            conn.executemany(f'''
+                INSERT OR REPLACE INTO {tier.table}
+                (bucket, service, count, healthy_count, min_ms, max_ms, avg_ms, p50_ms, p95_ms, latency_sketch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(bucket, service) + summarize(latencies, healthy)
+                  for (bucket, service), (latencies, healthy) in buckets.items()])
+            conn.execute('''
+                INSERT INTO metrics_rollup_state (tier, rolled_until, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(tier) DO UPDATE SET rolled_until = excluded.rolled_until, updated_at = excluded.updated_at
+            ''', (tier.name, chunk_end.strftime(TIME_FORMAT)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        written += len(buckets)
+        start = chunk_end
+        time.sleep(config['pause_s'])
+    return written
+
+def prune(conn, now, config):
+    """Drop raw rows past raw retention that both tiers cover, and tier rows past theirs"""
+    covered = [rolled_until(conn, tier) for tier in TIERS]
+    pruned = 0
+    if None not in covered:
+        cutoff = min(covered + [now - timedelta(hours=config['raw_retention_h'])]).strftime(TIME_FORMAT)
+        while True:
+            with conn:
+                deleted = conn.execute('''
+                    DELETE FROM service_metrics WHERE id IN (
+                        SELECT id FROM service_metrics WHERE timestamp < ? LIMIT ?
+                    )
+                ''', (cutoff, config['delete_batch_rows'])).rowcount
+            pruned += deleted
+            if deleted < config['delete_batch_rows']:
+                break
+            time.sleep(config['pause_s'])
+
+    for tier in TIERS:
+        with conn:
+            conn.execute(f'DELETE FROM {tier.table} WHERE bucket < ?',
+                         ((now - tier.retention(config)).strftime(TIME_FORMAT),))
+    return pruned
+
+def compact(db_path, now=None, config=None):
+    """Roll raw service_metrics rows up into both tiers, then apply retention
+
+    Safe to run repeatedly (monitor-daemon.py schedules it); returns stats.
+    """
+    config = config or RETENTION_CONFIG
+    now = now or datetime.utcnow()
+    started = time.monotonic()
+    schema_migrations.migrate('monitoring', db_path)
+
+    conn = db_pool.connect(db_path)
+    try:
+        stats = {tier.name: rollup_tier(conn, tier, now, config) for tier in TIERS}
+        stats['raw_pruned'] = prune(conn, now, config)
+    finally:
+        conn.close()
+    stats['elapsed_s'] = round(time.monotonic() - started, 2)
+    logger.info(f"Compacted service metrics: {stats['1m']} minute and {stats['1h']} hour buckets, "
+                f"{stats['raw_pruned']} raw rows pruned in {stats['elapsed_s']}s")
+    return stats
+
+def choose_tier(conn, since, now, config=None):
+    """Coarsest tier that covers [since, now] at useful resolution, with its rolled_until; (None, None) for raw"""
+    config = config or RETENTION_CONFIG
+    window_s = (now - since).total_seconds()
+    for tier in TIERS:
+        if tier.bucket_s * config['min_buckets'] > window_s or since < now - tier.retention(config):
+            continue
+        covered_until = rolled_until(conn, tier)
+        if covered_until is not None and covered_until > since:
+            return tier, covered_until
+    return None, None
+
+def service_latency(conn, hours=1, now=None, config=None):
+    """{service: count, avg_response_time, min_ms, max_ms, last_check, tier} over the last `hours`
+
+    Completed buckets come from the chosen tier (the range start is floored to
+    its bucket); the not yet rolled-up tail is read from raw rows.
+    """
+    now = now or datetime.utcnow()
+    since = now - timedelta(hours=hours)
+    tier, covered_until = choose_tier(conn, since, now, config)
+
+    # service -> [count, total_ms, min, max, last_check]
+    totals = {}
+    def add(service, count, total_ms, min_ms, max_ms, last_check):
+        entry = totals.setdefault(service, [0, 0.0, None, None, None])
+        entry[0] += count
+        entry[1] += total_ms or 0
+        entry[2] = min_ms if entry[2] is None else min(entry[2], min_ms)
+        entry[3] = max_ms if entry[3] is None else max(entry[3], max_ms)
+        entry[4] = max(entry[4] or '', last_check)
+
+    raw_since = since
+    if tier is not None:
+        for row in conn.execute(f'''
+            SELECT service, SUM(count), SUM(avg_ms * count), MIN(min_ms), MAX(max_ms), MAX(bucket)
+            FROM {tier.table}
+            WHERE bucket >= ? AND bucket < ?
+            GROUP BY service
+        ''', (tier.floor(since).strftime(TIME_FORMAT), covered_until.strftime(TIME_FORMAT))):
+            add(*row)
+        raw_since = covered_until
+
+    # '+service' keeps the planner on the covering timestamp index
+    for row in conn.execute('''
+        SELECT service, COUNT(response_time_ms), SUM(response_time_ms), MIN(response_time_ms),
+               MAX(response_time_ms), MAX(timestamp)
+        FROM service_metrics
+        WHERE timestamp >= ?
+        GROUP BY +service
+    ''', (raw_since.strftime(TIME_FORMAT),)):
+        if row[1]:
+            add(*row)
+
+    return {
+        service: {
+            'count': count,
+            'avg_response_time': total_ms / count if count else None,
+            'min_ms': min_ms,
+            'max_ms': max_ms,
+            'last_check': last_check,
+            'tier': tier.name if tier else 'raw'
+        }
+        for service, (count, total_ms, min_ms, max_ms, last_check) in totals.items()
+    }
+
+def quantile_key(q):
+    return f"p{q * 100:g}"
+
+def service_percentiles(conn, hours=1, quantiles=(0.5, 0.9, 0.99), now=None, config=None):
+    """{service: {p50, p90, p99, count, tier}} over the last `hours`, by merging sketches
+
+    Same tier choice as service_latency(): the chosen tier's per-bucket sketches
+    are merged and the raw tail since its rolled_until is added sample by sample.
+    """
+    now = now or datetime.utcnow()
+    since = now - timedelta(hours=hours)
+    tier, covered_until = choose_tier(conn, since, now, config)
+
+    sketches = {}
+    raw_since = since
+    if tier is not None:
+        for service, blob in conn.execute(f'''
+            SELECT service, latency_sketch
+            FROM {tier.table}
+            WHERE bucket >= ? AND bucket < ? AND latency_sketch IS NOT NULL
+        ''', (tier.floor(since).strftime(TIME_FORMAT), covered_until.strftime(TIME_FORMAT))):
+            sketches.setdefault(service, DDSketch()).merge(DDSketch.from_blob(blob))
+        raw_since = covered_until
+
+    for service, response_time_ms in conn.execute('''
+        SELECT service, response_time_ms
+        FROM service_metrics
+        WHERE timestamp >= ?
+    ''', (raw_since.strftime(TIME_FORMAT),)):
+        sketches.setdefault(service, DDSketch()).add(response_time_ms)
+
+    results = {}
+    for service, sketch in sketches.items():
+        if sketch.count:
+            results[service] = {quantile_key(q): sketch.quantile(q) for q in quantiles}
+            results[service].update(count=sketch.count, tier=tier.name if tier else 'raw')
+    return results
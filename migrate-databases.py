@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Database Migration Runner
+Shows and applies versioned schema migrations for every monitoring database
+"""
+
+import sys
+import logging
+import argparse
+import db_pool
+import schema_migrations
+
+def print_status(info):
+    state = '✅' if not info['pending'] else ('⚠️ ' if info['exists'] else '➖')
+    print(f"{state} {info['database']:14} v{info['version']}/{info['latest']}  {info['path']}")
+    if not info['exists']:
+        print("     (database does not exist yet)")
+        return
+    for version, task, position, rows_done, updated_at in info['in_progress']:
+        print(f"     ⏳ v{version} {task}: at {position}, {rows_done} rows done (updated {updated_at})")
+    for version, name in info['pending']:
+        print(f"     • pending v{version}: {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned schema migrations for the monitoring databases")
+    parser.add_argument('command', choices=['status', 'migrate', 'history'], help='What to do')
+    parser.add_argument('--db', choices=list(schema_migrations.DATABASES), action='append',
+                        help='Database to act on (repeatable; default: all)')
+    parser.add_argument('--path', help='Override the database file path (requires a single --db)')
+    parser.add_argument('--target', type=int, help='Migrate up to this version only')
+    parser.add_argument('--chunk-rows', type=int, help='Rows per backfill transaction')
+    args = parser.parse_args()
+
+    databases = args.db or list(schema_migrations.DATABASES)
+    if args.path and len(databases) != 1:
+        parser.error('--path requires exactly one --db')
+    if args.chunk_rows:
+        schema_migrations.MIGRATION_CONFIG['backfill_chunk_rows'] = args.chunk_rows
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    failed = False
+    for database in databases:
+        if args.command == 'migrate':
+            try:
+                applied = schema_migrations.migrate(database, args.path, target=args.target)
+            except Exception as e:
+                # Chunked migrations keep their progress and resume on the next run
+                print(f"❌ {database}: {e}")
+                failed = True
+                continue
+            names = {m.version: m.name for m in schema_migrations.MIGRATIONS[database]}
+            for version in applied:
+                print(f"✅ {database} v{version}: {names[version]}")
+
+        info = schema_migrations.status(database, args.path)
+        if args.command == 'history':
+            print(f"📋 {database} ({info['path']})")
+            for version, name, applied_at, duration_ms in info['applied']:
+                print(f"     v{version:<3} {applied_at}  {duration_ms or 0:>7} ms  {name}")
+        else:
+            print_status(info)
+
+    db_pool.close_all()
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Monitor Daemon
+Runs the service monitor, system health collector, intelligent alerting and the
+service_metrics compactor as one long-lived process instead of separate one-shot cron invocations
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import logging
+import argparse
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+import db_pool
+import metrics_rollup
+
+# Configure logging before the collector scripts do (their basicConfig then becomes a no-op)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/var/log/monitor-daemon.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+DAEMON_CONFIG = {
+    "config_file": "/etc/monitor-daemon.json",   # Optional overrides of "collectors", re-read on SIGHUP
+    "collectors": {
+        "services": {"enabled": True, "interval_s": 60, "jitter_s": 5, "restart_failed": True},
+        "system_health": {"enabled": True, "interval_s": 60, "jitter_s": 5},
+        "alerting": {"enabled": True, "interval_s": 60, "jitter_s": 10},
+        "metrics_compaction": {"enabled": True, "interval_s": 300, "jitter_s": 30}
+    }
+}
+
+def load_script(name, filename):
+    """Import a hyphenated script as a module"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_daemon_config(path):
+    """DAEMON_CONFIG collectors merged with the per-collector overrides in `path`"""
+    collectors = {name: dict(settings) for name, settings in DAEMON_CONFIG['collectors'].items()}
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            overrides = json.load(f).get('collectors', {})
+        for name, settings in overrides.items():
+            if name not in collectors:
+                logger.warning(f"Ignoring unknown collector '{name}' in {path}")
+                continue
+            collectors[name].update(settings)
+    return collectors
+
+class CollectorSet:
+    """The three collector scripts loaded once, with the state they keep between cycles
+
+    Config lives in the scripts' module-level dicts, so a reload re-executes
+    the scripts. `state` is shared with the set it replaces, so the last
+    service results survive a reload (even one landing mid-cycle), and the
+    shared probe client, DNS and certificate caches in service_probes stay
+    warm because that module is imported normally rather than reloaded.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.running = 0        # Cycles currently executing against this set
+        self.retired = False    # Replaced by a reload; closed once its last cycle ends
+        self.web_monitor = load_script('web_services_monitor', 'web-services-monitor.py')
+        self.health_monitor = load_script('system_health_monitor', 'system-health-monitor.py').SystemHealthMonitor()
+        self.alerter = load_script('intelligent_alerting', 'intelligent-alerting.py').IntelligentAlertManager()
+
+    def run_services(self, settings):
+        # service_results is None until the first cycle; the monitor then reads the status file
+        self.state['service_results'] = self.web_monitor.monitor_services(
+            restart_failed=settings.get('restart_failed', True),
+            previous_status=self.state['service_results'],
+            send_alerts=False
+        )
+
+    def run_system_health(self, settings):
+        self.health_monitor.collect_system_health()
+
+    def run_alerting(self, settings):
+        self.alerter.check_and_send_alerts(services=self.state['service_results'])
+
+    def run_metrics_compaction(self, settings):
+        metrics_rollup.compact(self.web_monitor.MONITORING_DB)
+
+    def retire(self):
+        self.retired = True
+        if not self.running:
+            self.close()
+
+    def cycle_finished(self):
+        self.running -= 1
+        if self.retired and not self.running:
+            self.close()
+
+    def close(self):
+        executor = getattr(self.web_monitor, '_check_executor', None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+class MonitorDaemon:
+    """One asyncio loop scheduling every collector on its own interval with jitter
+
+    Collectors run in worker threads (one at a time per collector; a cycle that
+    overruns its interval starts the next one immediately). SIGHUP reloads the
+    daemon config file and the collector scripts; SIGTERM/SIGINT stop after the
+    running cycles finish.
+    """
+
+    def __init__(self, config_file=None, only=None):
+        self.config_file = config_file or DAEMON_CONFIG['config_file']
+        self.only = only
+        self.settings = load_daemon_config(self.config_file)
+        self.state = {'service_results': None}
+        self.collectors = CollectorSet(self.state)
+        self.executor = ThreadPoolExecutor(max_workers=len(DAEMON_CONFIG['collectors']), thread_name_prefix='collector')
+        self.stop_event = None
+        self.reload_pending = False
+        self.reload_task = None
+        self.stats = {name: {'runs': 0, 'failures': 0, 'last_ms': None} for name in DAEMON_CONFIG['collectors']}
+
+    def reload(self):
+        """Re-read the daemon config and re-execute the collector scripts; None (keep the old ones) on error"""
+        try:
+            return load_daemon_config(self.config_file), CollectorSet(self.state)
+        except Exception as e:
+            logger.error(f"Reload failed, keeping current configuration: {e}")
+            return None
+
+    def enabled(self):
+        return [name for name, settings in self.settings.items()
+                if settings.get('enabled', True) and (not self.only or name in self.only)]
+
+    def next_delay(self, name, elapsed):
+        settings = self.settings[name]
+        jitter = settings.get('jitter_s', 0)
+        return max(settings['interval_s'] + random.uniform(-jitter, jitter) - elapsed, 0)
+
+    async def sleep(self, seconds):
+        """Sleep unless asked to stop; True if the daemon should keep running"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        return not self.stop_event.is_set()
+
+    async def run_collector(self, name):
+        loop = asyncio.get_running_loop()
+        # Spread the first runs so collectors do not start in lockstep
+        if not await self.sleep(random.uniform(0, self.settings[name].get('jitter_s', 0))):
+            return
+        while True:
+            if name in self.enabled():
+                # Re-resolved each cycle so a reload takes effect on the next run
+                collectors = self.collectors
+                collectors.running += 1
+                start = time.monotonic()
+                try:
+                    await loop.run_in_executor(self.executor, getattr(collectors, f'run_{name}'), self.settings[name])
+                except Exception as e:
+                    self.stats[name]['failures'] += 1
+                    logger.error(f"{name} collector failed: {e}", exc_info=True)
+                finally:
+                    collectors.cycle_finished()
+                elapsed = time.monotonic() - start
+                self.stats[name]['runs'] += 1
+                self.stats[name]['last_ms'] = round(elapsed * 1000)
+            else:
+                elapsed = 0
+            if not await self.sleep(self.next_delay(name, elapsed)):
+                return
+
+    async def apply_reload(self):
+        # Load off the loop (re-executing the scripts opens databases), swap on it
+        loaded = await asyncio.get_running_loop().run_in_executor(None, self.reload)
+        if loaded:
+            previous = self.collectors
+            self.settings, self.collectors = loaded
+            # Cycles still running on the old set finish first; then its check pool is shut down
+            previous.retire()
+            logger.info(f"🔄 Reloaded configuration ({', '.join(self.enabled())})")
+        self.reload_pending = False
+
+    def request_reload(self):
+        logger.info("SIGHUP received, reloading configuration")
+        if not self.reload_pending:
+            self.reload_pending = True
+            self.reload_task = asyncio.ensure_future(self.apply_reload())
+
+    async def run(self):
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop_event.set)
+        loop.add_signal_handler(signal.SIGHUP, self.request_reload)
+
+        logger.info(f"🚀 Monitor daemon started (pid {os.getpid()}): " + ', '.join(
+            f"{name} every {self.settings[name]['interval_s']}s±{self.settings[name].get('jitter_s', 0)}s"
+            for name in self.enabled()))
+        # Every collector gets a task; disabled ones idle so a reload can enable them
+        await asyncio.gather(*(self.run_collector(name) for name in self.settings
+                               if not self.only or name in self.only))
+
+        logger.info("Monitor daemon stopping: " + ', '.join(
+            f"{name} {stats['runs']} runs/{stats['failures']} failed" for name, stats in self.stats.items()))
+        self.executor.shutdown(wait=True)
+        self.collectors.close()
+        db_pool.close_all()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the service, system health and alerting collectors as one daemon")
+    parser.add_argument('--config', help=f"Collector overrides JSON (default: {DAEMON_CONFIG['config_file']})")
+    parser.add_argument('--only', choices=list(DAEMON_CONFIG['collectors']), action='append',
+                        help='Run only this collector (repeatable)')
+    args = parser.parse_args()
+
+    asyncio.run(MonitorDaemon(args.config, args.only).run())
+
+if __name__ == '__main__':
+    main()
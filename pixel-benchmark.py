@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tracking Pixel Micro-benchmark
+Measures per-hit overhead of the original Flask route versus the prebuilt WSGI fast path
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import importlib.util
+from flask import Flask, request, Response
+from werkzeug.test import EnvironBuilder
+
+# Load the tracker without starting its writer; queued visits are discarded between rounds
+spec = importlib.util.spec_from_file_location(
+    "analytics_tracker", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics-tracker.py")
+)
+tracker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tracker)
+
+USER_AGENTS = {
+    "human": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "bot": "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
+}
+
+# The handler as it was before the fast path: a Flask route building a fresh
+# Response with per-request header assignments on every hit
+baseline_app = Flask('pixel_baseline')
+
+def baseline_create_pixel_response():
+    """Create 1x1 transparent GIF response"""
+    response = Response(tracker.PIXEL_GIF, mimetype='image/gif')
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@baseline_app.route('/pixel.gif')
+@baseline_app.route('/analytics-pixel.gif')
+def baseline_tracking_pixel():
+    tracker.record_visit(
+        request.args.get('site', 'unknown'),
+        request.args.get('page', '/'),
+        request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr),
+        request.headers.get('User-Agent', ''),
+        request.headers.get('Referer', '')
+    )
+    return baseline_create_pixel_response()
+
+def make_environ(user_agent):
+    return EnvironBuilder(
+        path='/analytics-pixel.gif',
+        query_string='site=conflost&page=/index.html&t=1700000000000',
+        headers={'User-Agent': user_agent, 'Referer': 'https://www.google.com/search?q=x'},
+        environ_base={'REMOTE_ADDR': '203.0.113.7'}
+    ).get_environ()
+
+def start_response(status, headers, exc_info=None):
+    return None
+
+def call(wsgi_app, environ):
+    result = wsgi_app(dict(environ), start_response)
+    for _ in result:
+        pass
+    if hasattr(result, 'close'):
+        result.close()
+
+def measure(label, func, iterations, rounds):
+    """Best-of-rounds microseconds per call"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - start) / iterations)
+        tracker.ingest_queue._drain()
+    print(f"  {label:38} {best * 1e6:8.2f} us/hit")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracking pixel per-hit overhead")
+    parser.add_argument('--iterations', '-n', type=int, default=5000, help='Hits per round (kept below the ingest queue size)')
+    parser.add_argument('--rounds', '-r', type=int, default=5, help='Rounds; the best round is reported')
+    args = parser.parse_args()
+    args.iterations = min(args.iterations, tracker.INGEST_CONFIG['queue_max_size'])
+
+    logging.getLogger().setLevel(logging.WARNING)
+    baseline = baseline_app.wsgi_app           # Original route and per-request Response
+    flask_app = tracker.app.wsgi_app.wsgi_app   # Current Flask route (prebuilt headers) without the fast path
+    fast_app = tracker.app.wsgi_app             # PixelFastPath middleware
+
+    print("Response construction only:")
+    measure("per-request Response (before)", baseline_create_pixel_response, args.iterations, args.rounds)
+    measure("create_pixel_response()", tracker.create_pixel_response, args.iterations, args.rounds)
+    measure("prebuilt header block (after)", lambda: (list(tracker.PIXEL_HEADERS), tracker.PIXEL_BODY), args.iterations, args.rounds)
+
+    for kind, user_agent in USER_AGENTS.items():
+        environ = make_environ(user_agent)
+        print(f"Full WSGI hit ({kind} user agent):")
+        before = measure("original Flask route (before)", lambda: call(baseline, environ), args.iterations, args.rounds)
+        measure("Flask route, prebuilt headers", lambda: call(flask_app, environ), args.iterations, args.rounds)
+        after = measure("PixelFastPath (after)", lambda: call(fast_app, environ), args.iterations, args.rounds)
+        print(f"  {'speedup':38} {before / after:8.2f}x")
+
+if __name__ == '__main__':
+    main()
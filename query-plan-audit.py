@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Query Plan Audit
+Runs the analytics tracker and dashboard read paths against scratch databases,
+captures every SELECT they execute and asserts each one is answered from an index
+"""
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import tempfile
+import statistics
+import importlib.util
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import db_pool
+import metrics_rollup
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def load_script(name, filename, **overrides):
+    """Import a hyphenated script as a module, overriding module constants before use"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for key, value in overrides.items():
+        setattr(module, key, value)
+    return module
+
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+class QueryCapture:
+    """Collects distinct SELECT statements traced on a database's pooled connections
+
+    Statements are traced with their parameters expanded; they are grouped by
+    shape (literals replaced with ?) and one concrete example is kept per shape.
+    """
+
+    def __init__(self, label, db_path):
+        self.label = label
+        self.db_path = db_path
+        self.queries = {}   # shape -> [example statement, executions]
+
+    def __call__(self, sql):
+        statement = ' '.join(sql.split())
+        head = statement[:40].upper()
+        if not (head.startswith('SELECT') or head.startswith('WITH')):
+            return
+        if 'SQLITE_MASTER' in statement.upper():
+            return  # Schema introspection (partition discovery), not a data read
+        entry = self.queries.setdefault(LITERAL_PATTERN.sub('?', statement), [statement, 0])
+        entry[1] += 1
+
+    def __enter__(self):
+        db_pool.set_trace_callback(self.db_path, self)
+        return self
+
+    def __exit__(self, *exc):
+        db_pool.set_trace_callback(self.db_path, None)
+
+def sample_visits(now, count=500):
+    """Synthetic visits spread over the last ten days"""
+    sites = ('conflost', 'temp188', 'claudexml')
+    browsers = ('Chrome', 'Firefox', 'Safari')
+    visits = []
+    for i in range(count):
+        timestamp = (now - timedelta(minutes=29 * i)).strftime('%Y-%m-%d %H:%M:%S')
+        visits.append({
+            'site': sites[i % len(sites)],
+            'timestamp': timestamp,
+            'ip_address': f'203.0.113.{i % 250}',
+            'user_agent': 'Mozilla/5.0',
+            'referer': 'https://www.google.com/',
+            'page_path': f'/page/{i % 20}',
+            'country_code': 'US',
+            'is_bot': False,
+            'referrer_domain': 'google.com',
+            'ip_hash': f'{i:016x}' * 4,
+            'browser': browsers[i % len(browsers)],
+            'os': 'Linux',
+            'device_type': 'desktop',
+            'sample_weight': 1
+        })
+    return visits
+
+def exercise_analytics(db_path):
+    """Build an analytics DB with the real schema scripts and hit every read path"""
+    # Pre-partitioning table, as created by earlier tracker versions
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE visits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site VARCHAR(50) NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ip_address VARCHAR(45),
+            user_agent TEXT,
+            referer TEXT,
+            page_path TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_site_timestamp ON visits(site, timestamp)')
+    conn.execute('CREATE INDEX idx_timestamp ON visits(timestamp)')
+    # Recent enough to survive retention, so its MIN/MAX read stays explainable
+    legacy_timestamp = (datetime.utcnow() - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute("INSERT INTO visits (site, timestamp, page_path) VALUES ('conflost', ?, '/')", (legacy_timestamp,))
+    conn.commit()
+    conn.close()
+
+    tracker = load_script('analytics_tracker', 'analytics-tracker.py', DB_PATH=db_path)
+    tracker.ingest_queue.db_path = db_path
+    tracker.ARCHIVE_CONFIG['enabled'] = False
+    tracker.init_database()
+    load_script('enhance_analytics_db', 'enhance-analytics-db.py', ANALYTICS_DB=db_path).enhance_analytics_schema()
+
+    with QueryCapture('analytics-tracker.py', db_path) as capture:
+        visits = sample_visits(datetime.utcnow())
+        for start in range(0, len(visits), 100):
+            tracker.ingest_queue.flush_batch(visits[start:start + 100], force_rollups=True)
+
+        conn = db_pool.connect(db_path)
+        tracker.RecentVisitCounter().seed(conn.cursor())
+        conn.close()
+
+        client = tracker.app.test_client()
+        for path in ('/analytics', '/analytics/conflost', '/analytics/enhanced/conflost',
+                     '/analytics/summary', '/analytics/uniques/conflost'):
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+
+        tracker.cleanup_old_visits()
+    return capture
+
+def exercise_dashboard(db_path):
+    """Build a monitoring DB with init-monitoring-db.py and run the dashboard's reads"""
+    load_script('init_monitoring_db', 'init-monitoring-db.py', DB_PATH=db_path).init_monitoring_database()
+
+    conn = db_pool.connect(db_path)
+    with conn:
+        for i in range(200):
+            conn.execute(
+                "INSERT INTO service_metrics (service, timestamp, response_time_ms, status_code, is_healthy) "
+                "VALUES (?, datetime('now', ?), ?, 200, 1)", (f'svc{i % 6}', f'-{i} minutes', 100 + i))
+            conn.execute(
+                "INSERT INTO service_events (service, event_type, timestamp) VALUES (?, 'restart', datetime('now', ?))",
+                (f'svc{i % 6}', f'-{i} hours'))
+            conn.execute(
+                "INSERT INTO ssl_certificates (service, domain, days_remaining, last_checked, is_valid) "
+                "VALUES (?, 'example.com', ?, datetime('now', ?), 1)", (f'svc{i % 6}', 90 - i % 30, f'-{i} hours'))
+    conn.close()
+    # Roll the samples up so the dashboard reads the minute tier as well as the raw tail
+    metrics_rollup.compact(db_path)
+
+    dashboard = load_script('web_status_dashboard', 'web-status-dashboard.py', MONITORING_DB=db_path)
+    with QueryCapture('web-status-dashboard.py', db_path) as capture:
+        dashboard.get_monitoring_data()
+    return capture
+
+def table_names(conn):
+    # SQLite's internal tables (sqlite_sequence) cannot be indexed and hold a row per table
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite%'")}
+
+def audit(capture, iterations, verbose):
+    """EXPLAIN each captured query; returns the number of queries that scan a table"""
+    conn = sqlite3.connect(capture.db_path)
+    tables = table_names(conn)
+    failures = 0
+
+    print(f"\n📋 {capture.label} ({len(capture.queries)} distinct read queries)")
+    for shape, (statement, executions) in capture.queries.items():
+        plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}')]
+
+        # Any 'SCAN <table>' fails, except a covering-index scan for a query with no
+        # WHERE clause (whole-table aggregates). Scans of subqueries/co-routines are fine.
+        has_where = ' WHERE ' in statement.upper()
+        scans = []
+        for detail in plan:
+            match = re.match(r'SCAN (\w+)', detail)
+            if match and match.group(1) in tables and (has_where or 'COVERING INDEX' not in detail):
+                scans.append(detail)
+        covering = any('COVERING INDEX' in detail or 'PRIMARY KEY' in detail for detail in plan)
+
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            conn.execute(statement).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        status = '❌ SCAN' if scans else ('✅ covering' if covering else '✅ index')
+        print(f"  {status:12} {statistics.median(timings):7.3f} ms  x{executions:<4} {shape[:110]}")
+        if scans or verbose:
+            for detail in plan:
+                print(f"  {'':12}            └ {detail}")
+        failures += bool(scans)
+
+    conn.close()
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Assert analytics and dashboard read queries use indexes")
+    parser.add_argument('--iterations', '-n', type=int, default=20, help='Timed executions per query')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Print the plan for every query')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as scratch:
+        captures = [
+            exercise_analytics(os.path.join(scratch, 'site-analytics.db')),
+            exercise_dashboard(os.path.join(scratch, 'service-monitoring.db'))
+        ]
+        failures = sum(audit(capture, args.iterations, args.verbose) for capture in captures)
+        db_pool.close_all()
+
+    total = sum(len(capture.queries) for capture in captures)
+    if failures:
+        print(f"\n❌ {failures}/{total} read queries scan a table without an index")
+        sys.exit(1)
+    print(f"\n✅ All {total} read queries use an index")
+
+if __name__ == '__main__':
+    main()
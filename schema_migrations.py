@@ -0,0 +1,657 @@
+#!/usr/bin/env python3
+"""
+Versioned Schema Migrations
+Applies numbered migrations to each monitoring database and records them in schema_version
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import db_pool
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Database key -> default path (scripts pass their configured path when it differs)
+DATABASES = {
+    "analytics": "/var/log/site-analytics.db",
+    "monitoring": "/var/log/service-monitoring.db",
+    "system_health": "/var/log/system-health.db",
+    "maintenance": "/var/log/maintenance-schedules.db",
+    "backup": "/var/backups/services/backup_history.db"
+}
+
+MIGRATION_CONFIG = {
+    "backfill_chunk_rows": 5000,   # Rows per id range; each range is one short write transaction
+    "backfill_pause_s": 0.05       # Sleep between chunks so live writers can take the lock
+}
+
+class Migration:
+    """One numbered schema change for a database"""
+
+    def __init__(self, database, version, name, func, chunked=False):
+        self.database = database
+        self.version = version
+        self.name = name
+        self.func = func
+        # Plain migrations run inside a single transaction; chunked ones commit
+        # their own batches and are only recorded once they run to completion
+        self.chunked = chunked
+
+MIGRATIONS = {database: [] for database in DATABASES}
+
+def migration(database, version, name, chunked=False):
+    """Register func(conn) as migration `version` of `database`"""
+    def register(func):
+        registered = MIGRATIONS[database]
+        if any(m.version == version for m in registered):
+            raise ValueError(f"Duplicate migration {database} v{version}")
+        registered.append(Migration(database, version, name, func, chunked))
+        registered.sort(key=lambda m: m.version)
+        return func
+    return register
+
+# --- Bookkeeping ------------------------------------------------------------
+
+def ensure_version_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INTEGER
+        )
+    ''')
+    # Resume point of chunked migrations; rows are removed once the migration is recorded.
+    # Version 0 holds background data jobs that sit outside the migration sequence
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_progress (
+            version INTEGER NOT NULL,
+            task TEXT NOT NULL,
+            position,
+            rows_done INTEGER DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (version, task)
+        )
+    ''')
+    conn.commit()
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute('SELECT version FROM schema_version')}
+
+def current_version(conn):
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+def get_progress(conn, version, task):
+    """(position, rows_done) saved by a chunked migration, or (None, 0)"""
+    row = conn.execute(
+        'SELECT position, rows_done FROM schema_progress WHERE version = ? AND task = ?', (version, task)
+    ).fetchone()
+    return (row[0], row[1]) if row else (None, 0)
+
+def save_progress(conn, version, task, position, rows_done):
+    """Record a resume point; call inside the transaction that did the work"""
+    conn.execute('''
+        INSERT INTO schema_progress (version, task, position, rows_done, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(version, task) DO UPDATE SET
+            position = excluded.position,
+            rows_done = excluded.rows_done,
+            updated_at = excluded.updated_at
+    ''', (version, task, position, rows_done))
+
+# --- Helpers for migration bodies ---------------------------------------------
+
+def table_exists(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+def column_names(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+def add_column(conn, table, column, definition):
+    """ALTER TABLE ADD COLUMN unless the column is already there"""
+    if column not in column_names(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        logger.info(f"Added column {table}.{column}")
+
+def visit_tables(conn):
+    """Base visits tables: pre-partitioning 'visits', visits_legacy and monthly partitions"""
+    return [row[0] for row in conn.execute('''
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND (name IN ('visits', 'visits_legacy') OR name GLOB 'visits_p[0-9]*')
+        ORDER BY name
+    ''')]
+
+def backfill_rows(conn, version, task, table, columns, derive, update_sql, where=None,
+                  chunk_rows=None, pause_s=None, on_chunk=None, should_stop=None, after_update=None):
+    """Rewrite rows of `table` in ascending id ranges, one short transaction per range
+
+    Each range reads `id, <columns>` (optionally filtered by `where`), maps every
+    row through derive(row) -> update parameters (or None to skip) and applies
+    them with one executemany(update_sql). The range end is saved with the same
+    commit, so an interrupted backfill resumes after the last committed range.
+
+    after_update(conn, changes) runs inside the range's transaction with the
+    [(row, params)] pairs just written, for dependent writes (e.g. rollups).
+    on_chunk(stats) is called after every range; should_stop() is checked before
+    each one. Returns the stats dict; stats['complete'] tells whether it finished.
+    """
+    chunk_rows = chunk_rows or MIGRATION_CONFIG["backfill_chunk_rows"]
+    pause_s = MIGRATION_CONFIG["backfill_pause_s"] if pause_s is None else pause_s
+    select_sql = f"SELECT id, {', '.join(columns)} FROM {table} WHERE id > ? AND id <= ?"
+    if where:
+        select_sql += f' AND ({where})'
+
+    max_id = conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0] or 0
+    stats = {'table': table, 'max_id': max_id, 'position': 0, 'rows_done': 0,
+             'rows_this_run': 0, 'chunks': 0, 'elapsed_s': 0.0, 'complete': False}
+    started = time.time()
+
+    while True:
+        if should_stop and should_stop():
+            break
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Read inside the write transaction so concurrent runners never redo a range
+            position, rows_done = get_progress(conn, version, task)
+            position = position or 0
+            if position >= max_id:
+                conn.rollback()
+                stats['complete'] = True
+                break
+            end_id = min(position + chunk_rows, max_id)
+            changes = [(row, params) for row in conn.execute(select_sql, (position, end_id)).fetchall()
+                       for params in (derive(row),) if params is not None]
+            if changes:
+                conn.executemany(update_sql, [params for _, params in changes])
+                if after_update:
+                    after_update(conn, changes)
+            save_progress(conn, version, task, end_id, rows_done + len(changes))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        stats.update(position=end_id, rows_done=rows_done + len(changes), chunks=stats['chunks'] + 1,
+                     elapsed_s=time.time() - started)
+        stats['rows_this_run'] += len(changes)
+        if on_chunk:
+            on_chunk(stats)
+        if pause_s:
+            time.sleep(pause_s)
+
+    stats['position'] = max(stats['position'], get_progress(conn, version, task)[0] or 0)
+    stats['elapsed_s'] = time.time() - started
+    return stats
+
+# --- Runner -------------------------------------------------------------------
+
+def database_path(database, db_path=None):
+    if database not in DATABASES:
+        raise KeyError(f"Unknown database '{database}' (expected one of {', '.join(DATABASES)})")
+    return str(db_path or DATABASES[database])
+
+def pending_migrations(conn, database):
+    applied = applied_versions(conn)
+    return [m for m in MIGRATIONS[database] if m.version not in applied]
+
+def migrate(database, db_path=None, target=None):
+    """Apply every pending migration of `database` up to `target`; returns the versions applied"""
+    path = database_path(database, db_path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    conn = db_pool.connect(path)
+    applied = []
+    try:
+        ensure_version_tables(conn)
+        for m in pending_migrations(conn, database):
+            if target is not None and m.version > target:
+                break
+            started = time.time()
+            logger.info(f"Applying {database} v{m.version}: {m.name}")
+
+            if m.chunked:
+                m.func(conn)
+                conn.commit()
+                conn.execute('BEGIN IMMEDIATE')
+            else:
+                conn.commit()
+                conn.execute('BEGIN IMMEDIATE')
+                if m.version in applied_versions(conn):
+                    conn.rollback()   # Another process applied it while we waited for the lock
+                    continue
+                try:
+                    m.func(conn)
+                except Exception:
+                    conn.rollback()
+                    raise
+
+            conn.execute(
+                'INSERT OR IGNORE INTO schema_version (version, name, duration_ms) VALUES (?, ?, ?)',
+                (m.version, m.name, int((time.time() - started) * 1000))
+            )
+            conn.execute('DELETE FROM schema_progress WHERE version = ?', (m.version,))
+            conn.commit()
+            applied.append(m.version)
+    finally:
+        conn.close()
+    return applied
+
+def status(database, db_path=None):
+    """Current version, applied history and pending migrations of a database"""
+    path = database_path(database, db_path)
+    info = {'database': database, 'path': path, 'exists': os.path.exists(path),
+            'version': 0, 'latest': max((m.version for m in MIGRATIONS[database]), default=0),
+            'applied': [], 'pending': [], 'in_progress': []}
+    if not info['exists']:
+        info['pending'] = [(m.version, m.name) for m in MIGRATIONS[database]]
+        return info
+
+    conn = db_pool.connect(path)
+    try:
+        ensure_version_tables(conn)
+        info['version'] = current_version(conn)
+        info['applied'] = conn.execute(
+            'SELECT version, name, applied_at, duration_ms FROM schema_version ORDER BY version'
+        ).fetchall()
+        info['pending'] = [(m.version, m.name) for m in pending_migrations(conn, database)]
+        info['in_progress'] = conn.execute(
+            'SELECT version, task, position, rows_done, updated_at FROM schema_progress ORDER BY version, task'
+        ).fetchall()
+    finally:
+        conn.close()
+    return info
+
+# --- site-analytics.db ----------------------------------------------------------
+
+@migration('analytics', 1, 'Enhanced visit columns')
+def analytics_visit_columns(conn):
+    for table in visit_tables(conn):
+        for column, definition in (('country_code', 'VARCHAR(2)'),
+                                   ('is_bot', 'BOOLEAN DEFAULT FALSE'),
+                                   ('referrer_domain', 'VARCHAR(100)'),
+                                   ('ip_hash', 'VARCHAR(64)'),
+                                   ('browser', 'VARCHAR(50)'),
+                                   ('os', 'VARCHAR(50)'),
+                                   ('device_type', 'VARCHAR(20)'),
+                                   ('sample_weight', 'INTEGER DEFAULT 1')):
+            add_column(conn, table, column, definition)
+
+@migration('analytics', 2, 'Rollup tables')
+def analytics_rollup_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS hourly_analytics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site VARCHAR(50) NOT NULL,
+            hour_timestamp DATETIME NOT NULL,
+            visit_count INTEGER DEFAULT 0,
+            unique_visitors INTEGER DEFAULT 0,
+            UNIQUE(site, hour_timestamp)
+        )
+    ''')
+    # HyperLogLog register blob backing unique_visitors (mergeable across hours)
+    add_column(conn, 'hourly_analytics', 'visitor_sketch', 'BLOB')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS page_popularity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site VARCHAR(50) NOT NULL,
+            page_path VARCHAR(500) NOT NULL,
+            visit_count INTEGER DEFAULT 1,
+            last_visited DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(site, page_path)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referrer_analytics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site VARCHAR(50) NOT NULL,
+            referrer_domain VARCHAR(100) NOT NULL,
+            visit_count INTEGER DEFAULT 1,
+            last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(site, referrer_domain)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS geographic_analytics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site VARCHAR(50) NOT NULL,
+            country_code VARCHAR(2) NOT NULL,
+            visit_count INTEGER DEFAULT 1,
+            last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(site, country_code)
+        )
+    ''')
+    # Hourly timing/engagement aggregates from the /collect endpoint
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS page_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site VARCHAR(50) NOT NULL,
+            hour_timestamp DATETIME NOT NULL,
+            page_path VARCHAR(500) NOT NULL,
+            event_type VARCHAR(20) NOT NULL,
+            event_name VARCHAR(50) NOT NULL,
+            event_count INTEGER DEFAULT 0,
+            value_sum REAL DEFAULT 0,
+            value_max REAL DEFAULT 0,
+            UNIQUE(site, hour_timestamp, page_path, event_type, event_name)
+        )
+    ''')
+
+@migration('analytics', 3, 'Daily breakdowns table')
+def analytics_daily_breakdowns(conn):
+    # Per-day browser/os/device_type/referrer_domain/hour counts kept by the ingest flush
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_breakdowns (
+            site VARCHAR(50) NOT NULL,
+            day DATE NOT NULL,
+            dimension VARCHAR(20) NOT NULL,
+            value VARCHAR(100) NOT NULL,
+            visit_count INTEGER DEFAULT 0,
+            PRIMARY KEY (site, dimension, day, value)
+        ) WITHOUT ROWID
+    ''')
+
+BREAKDOWN_BACKFILL_EXPRESSIONS = (
+    ('browser', 'browser'),
+    ('os', 'os'),
+    ('device_type', 'device_type'),
+    ('referrer_domain', 'referrer_domain'),
+    ('hour', "strftime('%H', timestamp)")
+)
+
+@migration('analytics', 4, 'Backfill daily breakdowns from the last 7 days of visits', chunked=True)
+def analytics_backfill_breakdowns(conn):
+    """One day per transaction, oldest first; only runs into an empty table"""
+    version, task = 4, 'daily_breakdowns'
+    position, rows_done = get_progress(conn, version, task)
+    if position is None:
+        empty = conn.execute('SELECT COUNT(*) FROM daily_breakdowns').fetchone()[0] == 0
+        if not empty or not visit_tables(conn):
+            return   # Live ingest already owns the table; backfilling would double count
+        first_day = (datetime.utcnow() - timedelta(days=6)).strftime('%Y-%m-%d')
+        position = (datetime.strptime(first_day, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        save_progress(conn, version, task, position, 0)
+        conn.commit()
+
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    while position < today:
+        day = (datetime.strptime(position, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        next_day = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for dimension, expression in BREAKDOWN_BACKFILL_EXPRESSIONS:
+                rows_done += conn.execute(f'''
+                    INSERT INTO daily_breakdowns (site, day, dimension, value, visit_count)
+                    SELECT site, ?, ?, {expression}, SUM(COALESCE(sample_weight, 1))
+                    FROM visits
+                    WHERE timestamp >= ? AND timestamp < ? AND {expression} IS NOT NULL
+                    GROUP BY site, {expression}
+                    ON CONFLICT(site, dimension, day, value) DO UPDATE SET
+                        visit_count = visit_count + excluded.visit_count
+                ''', (day, dimension, day, next_day)).rowcount
+            save_progress(conn, version, task, day, rows_done)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        position = day
+        time.sleep(MIGRATION_CONFIG["backfill_pause_s"])
+
+@migration('analytics', 5, 'Covering indexes for the read paths')
+def analytics_covering_indexes(conn):
+    # Verified by query-plan-audit.py
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_hourly_site_hour_count ON hourly_analytics(site, hour_timestamp, visit_count)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_hourly_hour_site_count ON hourly_analytics(hour_timestamp, site, visit_count)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_breakdowns_dimension_day_value ON daily_breakdowns(dimension, day, value, visit_count)')
+
+    tables = visit_tables(conn)
+    for table in tables:
+        if table.startswith('visits_p'):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_timestamp_site ON {table}(timestamp, site, sample_weight)')
+
+    # Indexes no query reads from; each one only adds work to every ingest flush
+    unused_indexes = [
+        'idx_hourly_site_hour',              # Duplicate of the UNIQUE(site, hour_timestamp) index
+        'idx_page_popularity_site',
+        'idx_referrer_site',
+        'idx_geo_site',
+        'idx_breakdowns_dimension_day'       # Superseded by idx_breakdowns_dimension_day_value
+    ]
+    for table in tables:
+        prefix = 'idx_visits' if table in ('visits', 'visits_legacy') else f'idx_{table}'
+        unused_indexes += [f'{prefix}_is_bot', f'{prefix}_country', f'{prefix}_referrer']
+        if table.startswith('visits_p'):
+            # Superseded by idx_<partition>_timestamp_site
+            unused_indexes += [f'idx_{table}_timestamp', f'idx_{table}_site_timestamp']
+    for index_name in unused_indexes:
+        conn.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+# --- service-monitoring.db --------------------------------------------------------
+
+@migration('monitoring', 1, 'Base monitoring schema')
+def monitoring_base_schema(conn):
+    # Service metrics table - response times, status codes, health
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS service_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service VARCHAR(50) NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            response_time_ms INTEGER,
+            status_code INTEGER,
+            is_healthy BOOLEAN,
+            endpoint VARCHAR(200),
+            error_message TEXT
+        )
+    ''')
+    # Service events table - state changes, downtime, alerts
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS service_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service VARCHAR(50) NOT NULL,
+            event_type VARCHAR(20) NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            details TEXT,
+            previous_state VARCHAR(20),
+            new_state VARCHAR(20)
+        )
+    ''')
+    # SSL certificate tracking
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ssl_certificates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service VARCHAR(50) NOT NULL,
+            domain VARCHAR(100) NOT NULL,
+            expiry_date DATE,
+            days_remaining INTEGER,
+            last_checked DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_valid BOOLEAN
+        )
+    ''')
+    # Alert history
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alert_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service VARCHAR(50) NOT NULL,
+            alert_type VARCHAR(30) NOT NULL,
+            message TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            acknowledged BOOLEAN DEFAULT FALSE,
+            resolved_at DATETIME
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_metrics_service_time ON service_metrics(service, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_service_time ON service_events(service, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_alerts_service_time ON alert_history(service, timestamp)')
+
+@migration('monitoring', 2, 'Covering indexes for the dashboard time-window reads')
+def monitoring_covering_indexes(conn):
+    # See query-plan-audit.py
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_metrics_time_service ON service_metrics(timestamp, service, response_time_ms)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_time_service ON service_events(timestamp, service, event_type)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ssl_service_checked ON ssl_certificates(service, last_checked, days_remaining)')
+    # Superseded by idx_ssl_service_checked
+    conn.execute('DROP INDEX IF EXISTS idx_ssl_service')
+
+@migration('monitoring', 3, 'Split HTTP probe timings on service_metrics')
+def monitoring_probe_timings(conn):
+    # response_time_ms stays the total; these break it into phases
+    add_column(conn, 'service_metrics', 'dns_ms', 'REAL')
+    add_column(conn, 'service_metrics', 'connect_ms', 'REAL')
+    add_column(conn, 'service_metrics', 'ttfb_ms', 'REAL')
+
+@migration('monitoring', 4, 'Minute and hour rollup tiers for service_metrics')
+def monitoring_metric_rollups(conn):
+    # Filled by metrics_rollup.compact(); raw rows are pruned once both tiers cover them
+    for table in ('service_metrics_1m', 'service_metrics_1h'):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket TEXT NOT NULL,
+                service VARCHAR(50) NOT NULL,
+                count INTEGER NOT NULL,
+                healthy_count INTEGER NOT NULL,
+                min_ms REAL,
+                max_ms REAL,
+                avg_ms REAL,
+                p50_ms REAL,
+                p95_ms REAL,
+                PRIMARY KEY (bucket, service)
+            ) WITHOUT ROWID
+        ''')
+    # Per tier: raw samples before rolled_until are fully rolled up
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metrics_rollup_state (
+            tier TEXT PRIMARY KEY,
+            rolled_until TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+@migration('monitoring', 5, 'Latency quantile sketches on the service_metrics rollups')
+def monitoring_latency_sketches(conn):
+    # metrics_rollup.DDSketch blobs; buckets rolled up before this stay without one
+    add_column(conn, 'service_metrics_1m', 'latency_sketch', 'BLOB')
+    add_column(conn, 'service_metrics_1h', 'latency_sketch', 'BLOB')
+
+# --- system-health.db -------------------------------------------------------------
+
+@migration('system_health', 1, 'Base system health schema')
+def system_health_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS system_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            cpu_percent REAL,
+            cpu_count INTEGER,
+            memory_total_gb REAL,
+            memory_used_gb REAL,
+            memory_percent REAL,
+            disk_total_gb REAL,
+            disk_used_gb REAL,
+            disk_percent REAL,
+            load_1min REAL,
+            load_5min REAL,
+            load_15min REAL,
+            network_bytes_sent INTEGER,
+            network_bytes_recv INTEGER,
+            uptime_seconds INTEGER,
+            process_count INTEGER,
+            temperature_celsius REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS process_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            service_name TEXT,
+            pid INTEGER,
+            cpu_percent REAL,
+            memory_mb REAL,
+            memory_percent REAL,
+            status TEXT,
+            threads INTEGER,
+            open_files INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS health_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            alert_type TEXT,
+            metric_name TEXT,
+            current_value REAL,
+            threshold_value REAL,
+            severity TEXT,
+            resolved BOOLEAN DEFAULT FALSE
+        )
+    ''')
+
+# --- maintenance-schedules.db -----------------------------------------------------
+
+@migration('maintenance', 1, 'Base maintenance schema')
+def maintenance_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_name TEXT NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            scheduled_start DATETIME NOT NULL,
+            scheduled_end DATETIME NOT NULL,
+            actual_start DATETIME,
+            actual_end DATETIME,
+            status TEXT DEFAULT 'scheduled',
+            created_by TEXT DEFAULT 'system',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            notification_sent BOOLEAN DEFAULT FALSE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            schedule_id INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            action TEXT NOT NULL,
+            details TEXT,
+            status TEXT,
+            FOREIGN KEY (schedule_id) REFERENCES maintenance_schedules (id)
+        )
+    ''')
+
+@migration('maintenance', 2, 'Status/start index for the scheduler polls')
+def maintenance_status_index(conn):
+    # Active and upcoming windows are looked up by status and ordered by start
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_schedules_status_start ON maintenance_schedules(status, scheduled_start)')
+
+# --- backup_history.db ------------------------------------------------------------
+
+@migration('backup', 1, 'Base backup history schema')
+def backup_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS backup_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            service_name TEXT NOT NULL,
+            backup_type TEXT NOT NULL,
+            backup_path TEXT NOT NULL,
+            size_mb REAL,
+            duration_seconds INTEGER,
+            status TEXT,
+            error_message TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS recovery_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            service_name TEXT NOT NULL,
+            backup_timestamp TEXT NOT NULL,
+            recovery_path TEXT NOT NULL,
+            status TEXT,
+            error_message TEXT
+        )
+    ''')
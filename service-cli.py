@@ -11,6 +11,8 @@ import subprocess
 import time
 from datetime import datetime
 import sqlite3
+import db_pool
+import metrics_rollup
 
 # Import existing monitoring functions
 sys.path.append('/root')
@@ -23,6 +25,7 @@ try:
     SERVICES_CONFIG = monitor_module.SERVICES_CONFIG
     MONITORING_DB = monitor_module.MONITORING_DB
     check_service_health = monitor_module.check_service_health
+    check_services_health = monitor_module.check_services_health
     start_service = monitor_module.start_service
     stop_service = monitor_module.stop_service
     enhanced_service_restart = monitor_module.enhanced_service_restart
@@ -43,14 +46,19 @@ except ImportError:
     def check_service_health(service_name, config):
         print(f"⚠️ Limited functionality - monitoring functions not available")
         return {"healthy": False, "port_listening": False, "process_running": False, "http_responding": False}
+    
+    def check_services_health(services):
+        return {service_name: check_service_health(service_name, config) for service_name, config in services.items()}
 
-def list_services():
+def list_services(results=None):
     """List all configured services with their status"""
     print("📋 Configured Services:")
     print("=" * 60)
     
+    # All services are checked concurrently
+    results = results or check_services_health(SERVICES_CONFIG)
     for service_name, config in SERVICES_CONFIG.items():
-        health = check_service_health(service_name, config)
+        health = results[service_name]
         status = "🟢 HEALTHY" if health['healthy'] else "🔴 UNHEALTHY"
         
         print(f"{service_name:15} | {status:12} | Port {config['port']:5} | {config['domain']}")
@@ -93,6 +101,10 @@ def service_status(service_name):
     print(f"Process Running: {'✅' if health['process_running'] else '❌'}")
     print(f"HTTP Responding: {'✅' if health['http_responding'] else '❌'}")
     print(f"Last Checked: {health['timestamp']}")
+    if health.get('checks'):
+        timings = [f"{name} {'timed out' if check['timed_out'] else str(check['latency_ms']) + 'ms'}"
+                   for name, check in health['checks'].items()]
+        print(f"Check Latency: {', '.join(timings)}")
     print()
     
     print("📈 Recent History (24h):")
@@ -221,8 +233,8 @@ def system_status():
     healthy_count = 0
     total_count = len(SERVICES_CONFIG)
     
-    for service_name, config in SERVICES_CONFIG.items():
-        health = check_service_health(service_name, config)
+    results = check_services_health(SERVICES_CONFIG)
+    for health in results.values():
         if health['healthy']:
             healthy_count += 1
     
@@ -230,7 +242,7 @@ def system_status():
     
     # Recent events summary
     try:
-        conn = sqlite3.connect(MONITORING_DB)
+        conn = db_pool.connect(MONITORING_DB)
         cursor = conn.cursor()
         
         # Count events in last 24 hours
@@ -252,7 +264,33 @@ def system_status():
         print(f"⚠️ Could not fetch event history: {e}")
     
     print("\n🔍 Individual Service Status:")
-    list_services()
+    list_services(results)
+
+def service_latency(service_name=None, hours=1):
+    """Show p50/p90/p99 response times per service, merged from the rollup sketches"""
+    if service_name and service_name not in SERVICES_CONFIG:
+        print(f"❌ Unknown service: {service_name}")
+        return
+    
+    try:
+        conn = db_pool.connect(MONITORING_DB)
+        percentiles = metrics_rollup.service_percentiles(conn, hours=hours)
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ Could not fetch latency data: {e}")
+        return
+    
+    print(f"⏱️ Response Time Percentiles (last {hours:g}h)")
+    print("=" * 60)
+    print(f"{'Service':15} | {'p50':>8} | {'p90':>8} | {'p99':>8} | {'Samples':>7} | Tier")
+    for name in ([service_name] if service_name else SERVICES_CONFIG):
+        stats = percentiles.get(name)
+        if not stats:
+            print(f"{name:15} | {'no data':>8}")
+            continue
+        print(f"{name:15} | {stats['p50']:6.0f}ms | {stats['p90']:6.0f}ms | {stats['p99']:6.0f}ms | "
+              f"{stats['count']:7} | {stats['tier']}")
+    print("=" * 60)
 
 def main():
     """Main CLI interface"""
@@ -284,6 +322,11 @@ def main():
     logs_parser.add_argument('service', help='Service name')
     logs_parser.add_argument('--lines', '-n', type=int, default=50, help='Number of lines to show')
     
+    # Latency command
+    latency_parser = subparsers.add_parser('latency', help='Show p50/p90/p99 response times')
+    latency_parser.add_argument('service', nargs='?', help='Service name (optional)')
+    latency_parser.add_argument('--hours', type=float, default=1, help='Window to report on (default: 1)')
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -314,6 +357,9 @@ def main():
     
     elif args.command == 'logs':
         service_logs(args.service, args.lines)
+    
+    elif args.command == 'latency':
+        service_latency(args.service, args.hours)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
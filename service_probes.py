@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Service Probes
+Cheap, shared probes for the monitors: one socket/process snapshot per cycle instead of a fork
+per check, a pooled keep-alive HTTP client with DNS/connect/TTFB timings, and a cached
+certificate expiry lookup
+"""
+
+import os
+import ssl
+import time
+import subprocess
+import socket
+import logging
+import threading
+import ipaddress
+import requests
+import urllib3
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+# Optional fallback when /proc is not readable (e.g. non-Linux hosts)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Optional: public API for decoding local PEM certificates
+try:
+    from cryptography import x509
+except ImportError:
+    x509 = None
+
+logger = logging.getLogger(__name__)
+
+PROC_NET_TCP = ('/proc/net/tcp', '/proc/net/tcp6')
+TCP_LISTEN = '0A'   # st column value for LISTEN in /proc/net/tcp
+
+def read_listening_ports(paths=PROC_NET_TCP):
+    """TCP ports in LISTEN state, parsed from /proc/net/tcp{,6}
+
+    Each row looks like `0: 00000000:1F90 00000000:0000 0A ...`; the port
+    is the hex suffix of local_address and st == 0A means LISTEN.
+    Returns None when neither file can be read.
+    """
+    ports = set()
+    readable = False
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                next(f, None)   # Header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == TCP_LISTEN:
+                        ports.add(int(fields[1].rsplit(':', 1)[1], 16))
+            readable = True
+        except OSError:
+            continue
+    return ports if readable else None
+
+def read_process_cmdlines(exclude_pid=None):
+    """{pid: command line} for every process, read from /proc/<pid>/cmdline
+
+    Kernel threads (empty cmdline) are skipped. Returns None when /proc
+    cannot be listed.
+    """
+    try:
+        pids = [int(name) for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return None
+
+    cmdlines = {}
+    for pid in pids:
+        if pid == exclude_pid:
+            continue
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                raw = f.read()
+        except OSError:
+            continue   # Exited between listdir and open, or not ours to read
+        if raw:
+            cmdlines[pid] = raw.rstrip(b'\0').replace(b'\0', b' ').decode('utf-8', 'replace')
+    return cmdlines
+
+def psutil_listening_ports():
+    return {
+        conn.laddr.port for conn in psutil.net_connections(kind='tcp')
+        if conn.status == psutil.CONN_LISTEN and conn.laddr
+    }
+
+def psutil_process_cmdlines(exclude_pid=None):
+    cmdlines = {}
+    for proc in psutil.process_iter(['pid', 'cmdline']):
+        if proc.info['pid'] != exclude_pid and proc.info['cmdline']:
+            cmdlines[proc.info['pid']] = ' '.join(proc.info['cmdline'])
+    return cmdlines
+
+class ProbeSnapshot:
+    """Listening TCP ports and process command lines captured at one instant
+
+    Taken once per monitoring cycle; every service's port and process
+    checks are answered from it, replacing a netstat and a pgrep per service.
+    """
+
+    def __init__(self, listening_ports, cmdlines, capture_ms=0.0, source='proc'):
+        self.listening_ports = frozenset(listening_ports)
+        self.cmdlines = cmdlines
+        self.capture_ms = capture_ms
+        self.source = source
+        self.taken_at = time.time()
+
+    @classmethod
+    def capture(cls):
+        start = time.monotonic()
+        own_pid = os.getpid()   # Like pgrep, never match the monitor itself
+
+        ports, cmdlines, source = read_listening_ports(), read_process_cmdlines(own_pid), 'proc'
+        if (ports is None or cmdlines is None) and psutil is not None:
+            source = 'psutil'
+            if ports is None:
+                ports = psutil_listening_ports()
+            if cmdlines is None:
+                cmdlines = psutil_process_cmdlines(own_pid)
+        if ports is None or cmdlines is None:
+            logger.warning("Could not read listening sockets or the process table; treating both as empty")
+
+        return cls(ports or (), cmdlines or {}, round((time.monotonic() - start) * 1000, 2), source)
+
+    def is_listening(self, port):
+        return int(port) in self.listening_ports
+
+    def find_processes(self, pattern):
+        """PIDs whose command line contains `pattern` (pgrep -f, as a plain substring)"""
+        return [pid for pid, cmdline in self.cmdlines.items() if pattern in cmdline]
+
+    def process_running(self, pattern):
+        return any(pattern in cmdline for cmdline in self.cmdlines.values())
+
+# --- HTTP probing -------------------------------------------------------------
+
+PROBE_CONFIG = {
+    "connect_timeout_s": 3,       # TCP (+TLS) connect timeout
+    "read_timeout_s": 10,         # Per-read timeout once connected
+    "pool_connections": 16,       # Distinct hosts kept in the pool
+    "pool_maxsize": 4,            # Keep-alive connections per host
+    "dns_ttl_s": 300              # Resolved addresses are reused for this long
+}
+
+_dns_cache = {}   # (host, port) -> [expires_at, [addresses]]
+_dns_lock = threading.Lock()
+_probe_timing = threading.local()
+
+def resolve_host(host, port):
+    """Addresses for host:port from a small TTL cache; IP literals pass straight through"""
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return [host]
+    except ValueError:
+        pass
+
+    now = time.monotonic()
+    with _dns_lock:
+        entry = _dns_cache.get((host, port))
+        if entry and entry[0] > now:
+            return list(entry[1])
+
+    start = time.monotonic()
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    finally:
+        timing = getattr(_probe_timing, 'current', None)
+        if timing is not None:
+            timing['dns_ms'] += (time.monotonic() - start) * 1000
+
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    with _dns_lock:
+        _dns_cache[(host, port)] = [now + PROBE_CONFIG['dns_ttl_s'], addresses]
+    return addresses
+
+def prefer_address(host, port, address):
+    """Move an address that just connected to the front of the cached list"""
+    with _dns_lock:
+        entry = _dns_cache.get((host, port))
+        if entry and address in entry[1] and entry[1][0] != address:
+            entry[1].remove(address)
+            entry[1].insert(0, address)
+
+class _TimedConnectionMixin:
+    """Resolves through the DNS cache and records DNS/connect time for the active probe"""
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = resolve_host(host, self.port) or [host]
+        except OSError:
+            addresses = [host]   # Let urllib3 raise its usual NameResolutionError
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                except Exception:
+                    if i == len(addresses) - 1:
+                        raise
+                    continue
+                prefer_address(host, self.port, address)
+                return sock
+        finally:
+            self._dns_host = host
+
+    def connect(self):
+        timing = getattr(_probe_timing, 'current', None)
+        if timing is None:
+            return super().connect()
+        dns_before = timing['dns_ms']
+        start = time.monotonic()
+        try:
+            super().connect()
+        finally:
+            # TCP connect plus TLS handshake, excluding any DNS time spent inside
+            timing['connect_ms'] += (time.monotonic() - start) * 1000 - (timing['dns_ms'] - dns_before)
+            timing['connections'] += 1
+
+class TimedHTTPConnection(_TimedConnectionMixin, urllib3.connection.HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(_TimedConnectionMixin, urllib3.connection.HTTPSConnection):
+    pass
+
+class TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """requests adapter whose pooled connections report DNS/connect timings"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+class ProbeClient:
+    """Shared keep-alive HTTP client for health probes and internal API reads
+
+    Pooled, kept-alive connections per host, so repeat probes skip DNS and
+    the TCP/TLS handshake. requests.Session is not thread-safe (cookie jar,
+    redirect state), so each thread gets its own session; all of them mount
+    one adapter, whose urllib3 pools are thread-safe and shared. probe()
+    splits each request into phases: dns_ms, connect_ms (TCP + TLS), ttfb_ms
+    (request sent to response headers) and total_ms (including the body).
+    """
+
+    def __init__(self, config=None):
+        self.config = config or PROBE_CONFIG
+        self.adapter = TimedHTTPAdapter(pool_connections=self.config['pool_connections'],
+                                        pool_maxsize=self.config['pool_maxsize'])
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """This thread's requests.Session"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def timeout(self, connect_timeout=None, read_timeout=None):
+        return (connect_timeout or self.config['connect_timeout_s'], read_timeout or self.config['read_timeout_s'])
+
+    def get(self, url, connect_timeout=None, read_timeout=None, **kwargs):
+        """Plain pooled GET (for JSON APIs); raises like requests.get"""
+        return self.session.get(url, timeout=self.timeout(connect_timeout, read_timeout), **kwargs)
+
+    def probe(self, url, method='GET', connect_timeout=None, read_timeout=None):
+        """Time one request; never raises
+
+        Returns a dict with status_code (None on failure), error, dns_ms,
+        connect_ms, ttfb_ms, total_ms and reused (no new connection opened).
+        """
+        timing = {'dns_ms': 0.0, 'connect_ms': 0.0, 'connections': 0}
+        _probe_timing.current = timing
+        status_code = error = None
+        start = time.monotonic()
+        headers_at = None
+        try:
+            response = self.session.request(method, url, timeout=self.timeout(connect_timeout, read_timeout), stream=True)
+            headers_at = time.monotonic()
+            status_code = response.status_code
+            # Read the body so the connection goes back to the pool for reuse
+            response.content
+            response.close()
+        except requests.RequestException as e:
+            error = str(e)
+        finally:
+            _probe_timing.current = None
+        end = time.monotonic()
+
+        dns_ms = round(timing['dns_ms'], 1)
+        connect_ms = round(timing['connect_ms'], 1)
+        ttfb_ms = None
+        if headers_at is not None:
+            ttfb_ms = round(max((headers_at - start) * 1000 - dns_ms - connect_ms, 0.0), 1)
+        return {
+            'url': url,
+            'method': method,
+            'status_code': status_code,
+            'error': error,
+            'dns_ms': dns_ms,
+            'connect_ms': connect_ms,
+            'ttfb_ms': ttfb_ms,
+            'total_ms': round((end - start) * 1000, 1),
+            'reused': timing['connections'] == 0 and error is None
+        }
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide ProbeClient (created on first use)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ProbeClient()
+        return _client
+
+# --- Certificate expiry -------------------------------------------------------
+
+CERT_CONFIG = {
+    "refresh_interval_s": 6 * 3600,                 # Re-check an unchanged certificate this often
+    "failure_retry_s": 300,                         # Retry a failed lookup no sooner than this
+    "local_cert_dirs": ["/etc/letsencrypt/live"],   # <dir>/<domain>/cert.pem (or fullchain.pem)
+    "handshake_timeout_s": 10                       # Used only when no local certificate exists
+}
+
+CERT_TIME_FORMAT = '%b %d %H:%M:%S %Y %Z'   # notAfter as reported by the ssl module
+
+def local_cert_path(domain, cert_dirs=None):
+    """Path of the domain's local certificate (leaf first), or None"""
+    for cert_dir in cert_dirs or CERT_CONFIG['local_cert_dirs']:
+        for filename in ('cert.pem', 'fullchain.pem'):
+            path = os.path.join(cert_dir, domain, filename)
+            if os.path.isfile(path):
+                return path
+    return None
+
+def file_signature(path):
+    """(mtime_ns, inode) of the file a path resolves to; certbot renewals repoint
+    the live/ symlinks at a new archive file, which changes both"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino)
+
+def read_pem_expiry(path):
+    """notAfter (naive UTC) of the first certificate in a PEM file
+
+    Uses cryptography when installed, otherwise `openssl x509 -enddate`.
+    Raises when neither can read it (callers then fall back to a handshake).
+    """
+    if x509 is not None:
+        with open(path, 'rb') as f:
+            cert = x509.load_pem_x509_certificate(f.read())
+        if hasattr(cert, 'not_valid_after_utc'):
+            return cert.not_valid_after_utc.replace(tzinfo=None)
+        return cert.not_valid_after
+    output = subprocess.run(['openssl', 'x509', '-enddate', '-noout', '-in', path],
+                            capture_output=True, text=True, timeout=10, check=True).stdout
+    # notAfter=Nov 26 02:13:25 2026 GMT
+    return datetime.strptime(output.strip().split('=', 1)[1], CERT_TIME_FORMAT)
+
+def fetch_remote_expiry(domain, timeout=10, port=443):
+    """notAfter (naive UTC) of the certificate the domain serves, via a TLS handshake"""
+    context = ssl.create_default_context()
+    with socket.create_connection((domain, port), timeout=timeout) as sock:
+        with context.wrap_socket(sock, server_hostname=domain) as ssock:
+            return datetime.strptime(ssock.getpeercert()['notAfter'], CERT_TIME_FORMAT)
+
+class CertExpiryCache:
+    """Certificate expiry per domain, looked up rarely instead of on every cycle
+
+    A domain's certificate is re-read when its entry is older than
+    refresh_interval_s, or at once when the local certificate file changes
+    (checked with a stat per lookup). Local PEM files under local_cert_dirs are
+    read directly; only domains without one fall back to a TLS handshake.
+    Days remaining are recomputed from the cached expiry on every lookup.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or CERT_CONFIG
+        self.entries = {}   # domain -> {'expiry', 'source', 'checked_at', 'signature', 'error'}
+        self.lock = threading.Lock()
+
+    def seed(self, domain, expiry, checked_at):
+        """Start from a previously stored result (checked_at is epoch seconds)"""
+        with self.lock:
+            self.entries.setdefault(domain, {'expiry': expiry, 'source': 'stored', 'checked_at': checked_at,
+                                             'signature': None, 'error': None})
+
+    def is_fresh(self, entry, path, now):
+        if path is not None and entry['signature'] != file_signature(path):
+            return False
+        max_age = self.config['failure_retry_s'] if entry['error'] else self.config['refresh_interval_s']
+        return now - entry['checked_at'] < max_age
+
+    def lookup(self, domain, timeout=None):
+        """Cached expiry for a domain
+
+        Returns a dict with expiry (naive UTC datetime or None), days_remaining,
+        source ('local', 'handshake' or 'stored'), refreshed (looked up just now)
+        and error. A failed refresh keeps the last known expiry.
+        """
+        now = time.time()
+        path = local_cert_path(domain, self.config['local_cert_dirs'])
+        with self.lock:
+            entry = self.entries.get(domain)
+        refreshed = entry is None or not self.is_fresh(entry, path, now)
+
+        if refreshed:
+            signature = file_signature(path) if path else None
+            try:
+                expiry = None
+                if path is not None:
+                    try:
+                        expiry, source = read_pem_expiry(path), 'local'
+                    except Exception as e:
+                        logger.warning(f"Could not read {path} ({e}); checking {domain} over TLS instead")
+                if expiry is None:
+                    expiry, source = fetch_remote_expiry(domain, timeout or self.config['handshake_timeout_s']), 'handshake'
+                entry = {'expiry': expiry, 'source': source, 'checked_at': now, 'signature': signature, 'error': None}
+            except Exception as e:
+                logger.error(f"Certificate check failed for {domain}: {e}")
+                previous = entry or {'expiry': None, 'source': None}
+                entry = {'expiry': previous['expiry'], 'source': previous['source'], 'checked_at': now,
+                         'signature': signature, 'error': str(e)}
+            with self.lock:
+                self.entries[domain] = entry
+
+        expiry = entry['expiry']
+        return {
+            'domain': domain,
+            'expiry': expiry,
+            'days_remaining': (expiry - datetime.utcnow()).days if expiry else None,
+            'source': entry['source'],
+            'refreshed': refreshed,
+            'error': entry['error']
+        }
+
+_cert_cache = None
+
+def get_cert_cache():
+    """Process-wide CertExpiryCache (created on first use)"""
+    global _cert_cache
+    with _client_lock:
+        if _cert_cache is None:
+            _cert_cache = CertExpiryCache()
+        return _cert_cache
@@ -43,6 +43,15 @@ ANALYTICS_ROUTE="    # Analytics Tracking Pixel
         add_header Pragma \"no-cache\";
         add_header Expires \"0\";
     }"
+COLLECT_ROUTE="    # Analytics batched events (sendBeacon)
+    location = /collect {
+        proxy_pass http://localhost:8081/collect;
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+        client_max_body_size 16k;
+    }"
 
 # Check if route already exists
 if grep -q "analytics-pixel.gif" "$NGINX_CONFIG"; then
@@ -53,6 +62,14 @@ else
     echo "✅ Added analytics route to nginx config"
 fi
 
+# Existing installs only have the pixel route; add /collect separately
+if grep -q "location = /collect" "$NGINX_CONFIG"; then
+    echo "⚠️  Analytics /collect route already exists in nginx config"
+else
+    sed -i '/# Web Services Monitoring Dashboard/i\\n'"$COLLECT_ROUTE"'\n' "$NGINX_CONFIG"
+    echo "✅ Added analytics /collect route to nginx config"
+fi
+
 # Test nginx configuration
 if nginx -t > /dev/null 2>&1; then
     echo "✅ Nginx configuration test passed"
@@ -80,6 +97,7 @@ echo ""
 echo "📋 Next steps:"
 echo "1. Add tracking snippets to each website"
 echo "2. Test tracking: curl https://conflost.com/analytics-pixel.gif?site=test"
+echo "   and: curl -i -X POST https://conflost.com/collect -d '{\"s\":\"test\",\"e\":[]}'"
 echo "3. View analytics in dashboard: https://conflost.com/monitor"
 echo ""
 echo "📁 Files created:"
@@ -90,4 +108,5 @@ echo ""
 echo "🔧 Service status:"
 echo "  • Analytics tracker: http://localhost:8081"
 echo "  • Pixel endpoint: https://conflost.com/analytics-pixel.gif"
+echo "  • Events endpoint: https://conflost.com/collect"
 echo "  • Analytics API: http://localhost:8081/analytics"
\ No newline at end of file
@@ -9,6 +9,8 @@ import sys
 import json
 import psutil
 import sqlite3
+import db_pool
+import schema_migrations
 import logging
 import subprocess
 from datetime import datetime, timedelta
@@ -48,70 +50,13 @@ class SystemHealthMonitor:
     def __init__(self):
         self.config = HEALTH_CONFIG
         self.db_path = self.config["database"]
+        self.cpu_primed = False   # psutil keeps the previous CPU sample after the first call
         self.init_database()
     
     def init_database(self):
         """Initialize system health database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Create system metrics table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS system_metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    cpu_percent REAL,
-                    cpu_count INTEGER,
-                    memory_total_gb REAL,
-                    memory_used_gb REAL,
-                    memory_percent REAL,
-                    disk_total_gb REAL,
-                    disk_used_gb REAL,
-                    disk_percent REAL,
-                    load_1min REAL,
-                    load_5min REAL,
-                    load_15min REAL,
-                    network_bytes_sent INTEGER,
-                    network_bytes_recv INTEGER,
-                    uptime_seconds INTEGER,
-                    process_count INTEGER,
-                    temperature_celsius REAL
-                )
-            ''')
-            
-            # Create process metrics table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS process_metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    service_name TEXT,
-                    pid INTEGER,
-                    cpu_percent REAL,
-                    memory_mb REAL,
-                    memory_percent REAL,
-                    status TEXT,
-                    threads INTEGER,
-                    open_files INTEGER
-                )
-            ''')
-            
-            # Create health alerts table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS health_alerts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    alert_type TEXT,
-                    metric_name TEXT,
-                    current_value REAL,
-                    threshold_value REAL,
-                    severity TEXT,
-                    resolved BOOLEAN DEFAULT FALSE
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            schema_migrations.migrate('system_health', self.db_path)
             logger.info("System health database initialized")
             
         except Exception as e:
@@ -120,7 +65,10 @@ class SystemHealthMonitor:
     def get_cpu_info(self) -> Dict:
         """Get CPU information and usage"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # A long-lived monitor (monitor-daemon.py) measures since its previous
+            # call instead of blocking for a one-second sample
+            cpu_percent = psutil.cpu_percent(interval=None if self.cpu_primed else 1)
+            self.cpu_primed = True
             cpu_count = psutil.cpu_count()
             load_avg = os.getloadavg()
             
@@ -393,7 +341,7 @@ class SystemHealthMonitor:
     def log_system_metrics(self, metrics: Dict):
         """Log system metrics to database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_pool.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -430,7 +378,7 @@ class SystemHealthMonitor:
     def log_process_metrics(self, processes: List[Dict]):
         """Log process metrics to database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_pool.connect(self.db_path)
             cursor = conn.cursor()
             
             for proc in processes:
@@ -459,7 +407,7 @@ class SystemHealthMonitor:
     def log_health_alerts(self, alerts: List[Dict]):
         """Log health alerts to database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_pool.connect(self.db_path)
             cursor = conn.cursor()
             
             for alert in alerts:
@@ -0,0 +1,62 @@
+import os
+import sys
+import sqlite3
+import importlib.util
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import db_pool
+
+def load_script(name, filename, **overrides):
+    """Import a hyphenated script as a fresh module, then override module-level settings"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for attribute, value in overrides.items():
+        setattr(module, attribute, value)
+    return module
+
+def create_legacy_visits(db_path, rows):
+    """A pre-partitioning visits table as the original tracker created it"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE visits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site VARCHAR(50) NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ip_address VARCHAR(45),
+            user_agent TEXT,
+            referer TEXT,
+            page_path TEXT,
+            country_code VARCHAR(2),
+            is_bot BOOLEAN DEFAULT FALSE
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO visits (site, timestamp, ip_address, user_agent, referer, page_path) VALUES (?, ?, ?, ?, ?, ?)',
+        rows
+    )
+    conn.commit()
+    conn.close()
+
+def make_visit(tracker, site='conflost', timestamp='2026-03-10 12:00:00', ip='203.0.113.7', **fields):
+    """A visit dict as record_visit() queues it"""
+    visit = {column: None for column in tracker.VISIT_COLUMNS}
+    visit.update(site=site, timestamp=timestamp, ip_address=ip, ip_hash=tracker.hash_ip(ip),
+                 page_path='/', is_bot=False, sample_weight=1)
+    visit.update(fields)
+    return visit
+
+@pytest.fixture
+def tracker(tmp_path):
+    """analytics-tracker.py bound to a scratch database (schema not yet initialised)"""
+    module = load_script('analytics_tracker', 'analytics-tracker.py', DB_PATH=str(tmp_path / 'analytics.db'))
+    module.ingest_queue.db_path = module.DB_PATH
+    module.ARCHIVE_CONFIG = dict(module.ARCHIVE_CONFIG, directory=str(tmp_path / 'archive'))
+    module.BACKFILL_CONFIG = dict(module.BACKFILL_CONFIG, pause_s=0)
+    module.enhanced_backfill.config = module.BACKFILL_CONFIG
+    yield module
+    db_pool.close_all()
@@ -0,0 +1,72 @@
+import io
+import json
+
+import pytest
+
+HUMAN_UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+BOT_UA = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+
+@pytest.fixture
+def client(tracker):
+    return tracker.app.test_client()
+
+def post(client, payload, user_agent=HUMAN_UA, **kwargs):
+    data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    return client.post('/collect', data=data, content_type='text/plain',
+                       headers={'User-Agent': user_agent}, **kwargs)
+
+def pending_events(tracker):
+    return tracker.ingest_queue.rollups.pending.events
+
+def test_page_views_are_queued_and_metrics_aggregated(tracker, client):
+    response = post(client, {'s': 'conflost', 'e': [
+        {'t': 'pv', 'p': '/docs', 'r': 'https://news.example.com/item'},
+        {'t': 'tm', 'p': '/docs', 'n': 'load', 'v': 800},
+        {'t': 'tm', 'p': '/docs', 'n': 'load', 'v': 1200},
+        {'t': 'en', 'p': '/docs', 'n': 'scroll_pct', 'v': 75},
+    ]})
+    assert response.status_code == 204
+    assert response.headers['Access-Control-Allow-Origin'] == '*'
+
+    queued = tracker.ingest_queue._drain()
+    assert [(v['site'], v['page_path'], v['referrer_domain']) for v in queued] == \
+           [('conflost', '/docs', 'news.example.com')]
+    events = {key[2:]: value for key, value in pending_events(tracker).items()}
+    assert events[('/docs', 'timing', 'load')] == [2, 2000.0, 1200.0]
+    assert events[('/docs', 'engagement', 'scroll_pct')] == [1, 75.0, 75.0]
+
+@pytest.mark.parametrize('body', [b'not json', b'{"s": "x", "e": {"t": "pv"}}', b'[1, 2]'])
+def test_malformed_batches_are_rejected(client, body):
+    assert post(client, body).status_code == 400
+
+def test_bad_events_are_skipped_and_values_clamped(tracker, client):
+    response = post(client, {'s': 'conflost', 'e': [
+        'not an event',
+        {'t': 'xx', 'p': '/', 'v': 1},
+        {'t': 'tm', 'p': '/', 'n': 'load', 'v': 'slow'},
+        {'t': 'tm', 'p': '/', 'n': 'ttfb', 'v': -5},
+        {'t': 'tm', 'p': '/', 'n': 'load', 'v': 10 ** 12},
+    ]})
+    assert response.status_code == 204
+    max_value = float(tracker.COLLECT_CONFIG['max_value'])
+    events = {key[4]: value for key, value in pending_events(tracker).items()}
+    assert events == {'ttfb': [1, 0.0, 0.0], 'load': [1, max_value, max_value]}
+
+def test_events_beyond_the_limit_are_ignored(tracker, client):
+    limit = tracker.COLLECT_CONFIG['max_events']
+    post(client, {'s': 'conflost', 'e': [{'t': 'tm', 'p': '/', 'n': 'load', 'v': 1}] * (limit + 10)})
+    [(count, _, _)] = pending_events(tracker).values()
+    assert count == limit
+
+def test_bots_are_not_recorded(tracker, client):
+    assert post(client, {'s': 'conflost', 'e': [{'t': 'pv', 'p': '/'}]}, user_agent=BOT_UA).status_code == 204
+    assert tracker.ingest_queue._drain() == []
+
+def test_oversized_bodies_get_413(tracker, client):
+    limit = tracker.COLLECT_CONFIG['max_body_bytes']
+    body = json.dumps({'s': 'conflost', 'e': [], 'pad': 'x' * limit}).encode()
+    assert post(client, body).status_code == 413
+    # Chunked: no Content-Length to check, so the read itself must be bounded
+    chunked = client.post('/collect', headers={'User-Agent': HUMAN_UA, 'Transfer-Encoding': 'chunked'},
+                          environ_overrides={'wsgi.input': io.BytesIO(body), 'wsgi.input_terminated': True})
+    assert chunked.status_code == 413
@@ -0,0 +1,78 @@
+import pytest
+
+from conftest import make_visit
+
+@pytest.fixture
+def ingest(tracker):
+    tracker.init_database()
+    return tracker.ingest_queue
+
+def query(tracker, sql, *params):
+    conn = tracker.db_pool.connect(tracker.DB_PATH)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+def visits(tracker, count, **fields):
+    return [make_visit(tracker, ip=f'198.51.100.{i}', **fields) for i in range(count)]
+
+def test_rollup_counters_merge_like_one_pass(tracker):
+    batch = visits(tracker, 30, browser='chrome') + visits(tracker, 10, timestamp='2026-03-10 13:05:00', page_path='/about')
+    whole = tracker.RollupCounters()
+    for visit in batch:
+        whole.add(visit)
+    first, second = tracker.RollupCounters(), tracker.RollupCounters()
+    for visit in batch[:17]:
+        first.add(visit)
+    for visit in batch[17:]:
+        second.add(visit)
+    first.merge(second)
+
+    assert first.visits == whole.visits == 40
+    assert first.hourly == whole.hourly
+    assert first.pages == whole.pages
+    assert first.breakdowns == whole.breakdowns
+    assert {key: sketch.registers for key, sketch in first.sketches.items()} == \
+           {key: sketch.registers for key, sketch in whole.sketches.items()}
+
+def test_rollups_are_held_until_a_merge(tracker, ingest):
+    assert ingest.flush_batch(visits(tracker, 5))
+    assert ingest.rollups.pending.visits == 5
+    assert query(tracker, 'SELECT COUNT(*) FROM hourly_analytics') == [(0,)]
+
+    assert ingest.flush_batch(visits(tracker, 3), force_rollups=True)
+    assert query(tracker, 'SELECT COUNT(*) FROM visits') == [(8,)]
+    assert query(tracker, 'SELECT visit_count, unique_visitors FROM hourly_analytics') == [(8, 5)]
+    assert ingest.rollups.pending.visits == 0
+
+def test_failed_rollup_write_still_commits_the_visits(tracker, ingest):
+    ingest.flush_batch(visits(tracker, 4))
+    conn = tracker.db_pool.connect(tracker.DB_PATH)
+    conn.execute('DROP TABLE hourly_analytics')
+    conn.commit()
+    conn.close()
+
+    assert ingest.flush_batch(visits(tracker, 6), force_rollups=True)
+    assert query(tracker, 'SELECT COUNT(*) FROM visits') == [(10,)]
+    # Earlier counts were restored and the new batch added, ready for the next merge
+    assert ingest.rollups.pending.visits == 10
+    assert ingest.get_stats()['flush_errors'] == 1
+
+def test_failing_insert_is_retried_then_dropped(tracker, ingest):
+    bad = visits(tracker, 3, site=None)   # site is NOT NULL
+    assert not ingest.flush_batch(bad)
+    while ingest.retry:
+        batch, attempts = ingest.retry.popleft()
+        ingest.flush_batch(batch, attempts=attempts)
+
+    stats = ingest.get_stats()
+    assert stats['retried_batches'] == ingest.max_flush_attempts - 1
+    assert stats['dropped'] == 3
+    assert query(tracker, 'SELECT COUNT(*) FROM visits') == [(0,)]
+
+def test_stop_without_writer_flushes_the_queue(tracker, ingest):
+    for visit in visits(tracker, 7):
+        assert ingest.submit(visit)
+    ingest.stop()
+    assert query(tracker, 'SELECT COUNT(*) FROM visits') == [(7,)]
@@ -0,0 +1,123 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import db_pool
+import metrics_rollup
+import schema_migrations
+from metrics_rollup import DDSketch
+
+def sketch_of(values):
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+def exact_quantile(sorted_values, q):
+    return sorted_values[int(q * (len(sorted_values) - 1))]
+
+DISTRIBUTIONS = {
+    'uniform': lambda rng: rng.uniform(5, 500),
+    'lognormal': lambda rng: rng.lognormvariate(4, 1),
+    'long_tail': lambda rng: rng.paretovariate(1.5) * 20,
+}
+
+@pytest.mark.parametrize('name', sorted(DISTRIBUTIONS))
+def test_quantiles_are_within_relative_accuracy(name):
+    rng = random.Random(name)
+    values = [DISTRIBUTIONS[name](rng) for _ in range(5000)]
+    sketch = sketch_of(values)
+    values.sort()
+    for q in (0.0, 0.5, 0.9, 0.95, 0.99, 1.0):
+        exact = exact_quantile(values, q)
+        assert math.isclose(sketch.quantile(q), exact, rel_tol=DDSketch.RELATIVE_ACCURACY * 1.0001)
+
+def test_merge_matches_one_sketch_over_all_values():
+    rng = random.Random(7)
+    first = [rng.uniform(1, 100) for _ in range(300)]
+    second = [rng.uniform(50, 2000) for _ in range(700)]
+    merged = sketch_of(first).merge(sketch_of(second))
+    whole = sketch_of(first + second)
+    assert merged.buckets == whole.buckets
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+
+def test_blob_round_trip():
+    sketch = sketch_of([0, 0.5, 12.5, 12.6, 480.0, 9000.0])
+    restored = DDSketch.from_blob(sketch.to_blob())
+    assert restored.buckets == sketch.buckets
+    assert (restored.zero_count, restored.count, restored.min, restored.max) == (1, 6, 0, 9000.0)
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+
+def test_empty_and_zero_values():
+    assert DDSketch().quantile(0.5) is None
+    assert DDSketch.from_blob(None).count == 0
+    sketch = sketch_of([0, 0, 0, 100])
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == 100
+
+NOW = datetime(2026, 3, 10, 12, 0, 0)
+
+@pytest.fixture
+def monitoring_db(tmp_path):
+    """Three hours of one-per-minute probes for two services, with known latencies"""
+    db_path = str(tmp_path / 'monitoring.db')
+    schema_migrations.migrate('monitoring', db_path)
+    conn = db_pool.connect(db_path)
+    start = NOW - timedelta(hours=3)
+    rows = []
+    for minute in range(180):
+        timestamp = (start + timedelta(minutes=minute)).strftime(metrics_rollup.TIME_FORMAT)
+        rows.append(('web', timestamp, float(10 + minute % 60), 1))
+        rows.append(('api', timestamp, 200.0, minute % 4 != 0))
+    conn.executemany('INSERT INTO service_metrics (service, timestamp, response_time_ms, is_healthy) '
+                     'VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    yield db_path
+    db_pool.close_all()
+
+@pytest.fixture
+def config():
+    return dict(metrics_rollup.RETENTION_CONFIG, pause_s=0)
+
+def test_compact_fills_both_tiers_and_resumes(monitoring_db, config):
+    stats = metrics_rollup.compact(monitoring_db, NOW, config)
+    # Buckets that ended at least settle_s ago: 178 minutes and 2 full hours, per service
+    assert stats['1m'] == 2 * 178
+    assert stats['1h'] == 2 * 2
+    assert stats['raw_pruned'] == 0   # Still inside raw retention
+
+    again = metrics_rollup.compact(monitoring_db, NOW, config)
+    assert (again['1m'], again['1h']) == (0, 0)
+
+    conn = db_pool.connect(monitoring_db)
+    row = conn.execute('SELECT count, healthy_count, min_ms, max_ms, latency_sketch FROM service_metrics_1h '
+                       'WHERE service = ? AND bucket = ?', ('api', '2026-03-10 09:00:00')).fetchone()
+    conn.close()
+    assert row[:4] == (60, 45, 200.0, 200.0)
+    assert DDSketch.from_blob(row[4]).count == 60
+
+def test_reads_from_a_tier_match_raw_rows(monitoring_db, config):
+    conn = db_pool.connect(monitoring_db)
+    raw_latency = metrics_rollup.service_latency(conn, hours=2, now=NOW, config=config)
+    raw_percentiles = metrics_rollup.service_percentiles(conn, hours=2, now=NOW, config=config)
+    conn.close()
+    assert raw_latency['web']['tier'] == 'raw'
+
+    metrics_rollup.compact(monitoring_db, NOW, config)
+    conn = db_pool.connect(monitoring_db)
+    latency = metrics_rollup.service_latency(conn, hours=2, now=NOW, config=config)
+    percentiles = metrics_rollup.service_percentiles(conn, hours=2, now=NOW, config=config)
+    conn.close()
+
+    assert latency['web']['tier'] == percentiles['web']['tier'] == '1m'
+    for service in ('web', 'api'):
+        for key in ('count', 'min_ms', 'max_ms'):
+            assert latency[service][key] == raw_latency[service][key]
+        assert latency[service]['avg_response_time'] == pytest.approx(raw_latency[service]['avg_response_time'])
+        assert percentiles[service]['count'] == raw_percentiles[service]['count']
+        for key in ('p50', 'p90', 'p99'):
+            assert percentiles[service][key] == pytest.approx(raw_percentiles[service][key],
+                                                              rel=DDSketch.RELATIVE_ACCURACY)
@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+import db_pool
+import schema_migrations
+
+from conftest import create_legacy_visits
+
+@pytest.fixture
+def db_path(tmp_path):
+    yield str(tmp_path / 'migrations.db')
+    db_pool.close_all()
+
+def latest(database):
+    return max(m.version for m in schema_migrations.MIGRATIONS[database])
+
+@pytest.mark.parametrize('database', sorted(schema_migrations.DATABASES))
+def test_migrate_applies_every_version_once(db_path, database):
+    applied = schema_migrations.migrate(database, db_path)
+    assert applied == [m.version for m in schema_migrations.MIGRATIONS[database]]
+    assert schema_migrations.migrate(database, db_path) == []
+
+    info = schema_migrations.status(database, db_path)
+    assert info['version'] == latest(database)
+    assert info['pending'] == []
+
+def test_migrate_stops_at_target(db_path):
+    assert schema_migrations.migrate('monitoring', db_path, target=2) == [1, 2]
+    assert [version for version, _ in schema_migrations.status('monitoring', db_path)['pending']] == \
+           list(range(3, latest('monitoring') + 1))
+
+def test_analytics_migrations_upgrade_a_legacy_visits_table(db_path):
+    create_legacy_visits(db_path, [('conflost', '2024-01-05 10:00:00', '203.0.113.7', '', '', '/')])
+    schema_migrations.migrate('analytics', db_path)
+    conn = sqlite3.connect(db_path)
+    columns = schema_migrations.column_names(conn, 'visits')
+    conn.close()
+    assert {'browser', 'os', 'device_type', 'referrer_domain', 'ip_hash', 'sample_weight'} <= columns
+
+@pytest.fixture
+def numbers(db_path):
+    conn = db_pool.connect(db_path)
+    schema_migrations.ensure_version_tables(conn)
+    conn.execute('CREATE TABLE numbers (id INTEGER PRIMARY KEY, value INTEGER)')
+    conn.executemany('INSERT INTO numbers (value) VALUES (?)', [(0,)] * 95)
+    conn.commit()
+    yield conn
+    conn.close()
+
+def run_backfill(conn, **kwargs):
+    return schema_migrations.backfill_rows(
+        conn, 0, 'increment', 'numbers', ('value',),
+        lambda row: (row[1] + 1, row[0]),
+        'UPDATE numbers SET value = ? WHERE id = ?',
+        chunk_rows=10, pause_s=0, **kwargs
+    )
+
+def test_backfill_rows_resumes_after_an_interruption(numbers):
+    chunks = []
+    first = run_backfill(numbers, on_chunk=lambda stats: chunks.append(stats['position']),
+                         should_stop=lambda: len(chunks) >= 3)
+    assert not first['complete']
+    assert first['position'] == 30
+    assert schema_migrations.get_progress(numbers, 0, 'increment') == (30, 30)
+
+    second = run_backfill(numbers)
+    assert second['complete']
+    assert second['rows_this_run'] == 65
+    # Every row was rewritten exactly once across both runs
+    assert numbers.execute('SELECT MIN(value), MAX(value) FROM numbers').fetchone() == (1, 1)
+
+    assert run_backfill(numbers)['rows_this_run'] == 0
+
+def test_backfill_rows_skips_rows_derive_leaves_alone(numbers):
+    result = schema_migrations.backfill_rows(
+        numbers, 0, 'even', 'numbers', ('value',),
+        lambda row: (1, row[0]) if row[0] % 2 == 0 else None,
+        'UPDATE numbers SET value = ? WHERE id = ?',
+        chunk_rows=10, pause_s=0
+    )
+    assert result['complete']
+    assert result['rows_done'] == 47
+    assert numbers.execute('SELECT SUM(value) FROM numbers').fetchone() == (47,)
@@ -0,0 +1,180 @@
+import os
+import shutil
+import threading
+import subprocess
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import service_probes
+from service_probes import CertExpiryCache, ProbeClient, ProbeSnapshot
+
+TCP_HEADER = '  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n'
+
+def tcp_row(slot, local, remote, state):
+    return f'   {slot}: {local} {remote} {state} 00000000:00000000 00:00000000 00000000  1000        0 12345 1\n'
+
+@pytest.fixture
+def proc_net(tmp_path):
+    tcp = tmp_path / 'tcp'
+    tcp.write_text(TCP_HEADER
+                   + tcp_row(0, '00000000:1F90', '00000000:0000', '0A')    # 0.0.0.0:8080 LISTEN
+                   + tcp_row(1, '0100007F:0CEA', '00000000:0000', '0A')    # 127.0.0.1:3306 LISTEN
+                   + tcp_row(2, '0100007F:1F90', '0100007F:D431', '01'))   # ESTABLISHED
+    tcp6 = tmp_path / 'tcp6'
+    tcp6.write_text(TCP_HEADER
+                    + tcp_row(0, '00000000000000000000000000000000:0050', '00000000000000000000000000000000:0000', '0A')
+                    + tcp_row(1, '00000000000000000000000001000000:A1B2', '00000000000000000000000001000000:0050', '06'))
+    return str(tcp), str(tcp6)
+
+def test_listening_ports_are_parsed_from_proc(proc_net):
+    assert service_probes.read_listening_ports(proc_net) == {8080, 3306, 80}
+
+def test_a_missing_proc_file_is_skipped(proc_net, tmp_path):
+    assert service_probes.read_listening_ports((proc_net[0], str(tmp_path / 'missing'))) == {8080, 3306}
+    assert service_probes.read_listening_ports((str(tmp_path / 'missing'),)) is None
+
+def test_snapshot_answers_port_and_process_checks():
+    snapshot = ProbeSnapshot({80, 8080}, {
+        101: 'nginx: master process /usr/sbin/nginx',
+        202: '/usr/bin/python3 /opt/analytics/analytics-tracker.py',
+        303: 'python3 web-status-dashboard.py --port 8090',
+    })
+    assert snapshot.is_listening(80) and snapshot.is_listening('8080')
+    assert not snapshot.is_listening(443)
+    assert snapshot.find_processes('python3') == [202, 303]
+    assert snapshot.process_running('analytics-tracker.py')
+    assert not snapshot.process_running('monitor-daemon.py')
+
+def test_capture_reads_this_host():
+    snapshot = ProbeSnapshot.capture()
+    assert snapshot.source in ('proc', 'psutil')
+    assert os.getpid() not in snapshot.cmdlines
+
+# --- Certificate expiry -------------------------------------------------------
+
+requires_openssl = pytest.mark.skipif(shutil.which('openssl') is None, reason='openssl CLI not available')
+
+def write_cert(path, days):
+    """Self-signed certificate valid for `days`, swapped in with a rename like a certbot renewal"""
+    scratch = f'{path}.new'
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+                    '-nodes', '-keyout', os.devnull, '-out', scratch, '-days', str(days), '-subj', '/CN=test'],
+                   check=True, capture_output=True)
+    os.replace(scratch, path)
+
+@pytest.fixture
+def cert_dir(tmp_path):
+    domain_dir = tmp_path / 'example.test'
+    domain_dir.mkdir()
+    return domain_dir
+
+@pytest.fixture
+def cache(cert_dir):
+    return CertExpiryCache(dict(service_probes.CERT_CONFIG, local_cert_dirs=[str(cert_dir.parent)]))
+
+@pytest.fixture
+def no_handshakes(monkeypatch):
+    def refuse(domain, timeout=10, port=443):
+        raise OSError(f'no network in tests ({domain})')
+    monkeypatch.setattr(service_probes, 'fetch_remote_expiry', refuse)
+
+@requires_openssl
+def test_local_certificate_is_read_once_then_cached(cache, cert_dir, no_handshakes):
+    write_cert(cert_dir / 'cert.pem', 30)
+    first = cache.lookup('example.test')
+    assert (first['source'], first['refreshed'], first['error']) == ('local', True, None)
+    assert first['days_remaining'] in (29, 30)
+
+    second = cache.lookup('example.test')
+    assert not second['refreshed']
+    assert second['expiry'] == first['expiry']
+
+@requires_openssl
+def test_a_renewed_certificate_is_picked_up_at_once(cache, cert_dir, no_handshakes):
+    write_cert(cert_dir / 'cert.pem', 30)
+    cache.lookup('example.test')
+    write_cert(cert_dir / 'cert.pem', 90)
+    renewed = cache.lookup('example.test')
+    assert renewed['refreshed']
+    assert renewed['days_remaining'] in (89, 90)
+
+@requires_openssl
+def test_a_failed_refresh_keeps_the_last_expiry(cache, cert_dir, no_handshakes):
+    write_cert(cert_dir / 'cert.pem', 30)
+    known = cache.lookup('example.test')['expiry']
+    (cert_dir / 'garbage').write_text('not a certificate\n')
+    os.replace(cert_dir / 'garbage', cert_dir / 'cert.pem')
+
+    failed = cache.lookup('example.test')
+    assert failed['refreshed']
+    assert failed['expiry'] == known
+    assert 'no network' in failed['error']
+    # Not retried until failure_retry_s has passed
+    assert not cache.lookup('example.test')['refreshed']
+
+def test_seeded_entries_are_served_until_stale(cache, no_handshakes):
+    expiry = datetime.utcnow() + timedelta(days=12, hours=1)
+    cache.seed('stored.test', expiry, checked_at=service_probes.time.time())
+    stored = cache.lookup('stored.test')
+    assert (stored['source'], stored['refreshed'], stored['days_remaining']) == ('stored', False, 12)
+
+    cache.seed('old.test', expiry, checked_at=0)
+    stale = cache.lookup('old.test')
+    assert stale['refreshed'] and stale['error']
+    assert stale['expiry'] == expiry
+
+# --- HTTP probing -------------------------------------------------------------
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # Keep-alive, so the pool can reuse connections
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+def test_probe_reuses_pooled_connections(server_url):
+    client = ProbeClient()
+    first = client.probe(server_url)
+    assert (first['status_code'], first['error'], first['reused']) == (200, None, False)
+    second = client.probe(server_url)
+    assert second['status_code'] == 200 and second['reused']
+    assert second['connect_ms'] == 0.0
+
+def test_each_thread_gets_its_own_session(server_url):
+    client = ProbeClient()
+    sessions, results = [], []
+    def worker():
+        sessions.append(client.session)
+        results.append(client.probe(server_url)['status_code'])
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(session) for session in sessions}) == 4
+    assert {id(session.get_adapter(server_url)) for session in sessions} == {id(client.adapter)}
+    assert results == [200] * 4
+
+def test_probe_reports_connection_errors():
+    result = ProbeClient().probe('http://127.0.0.1:9/', connect_timeout=0.5, read_timeout=0.5)
+    assert result['status_code'] is None
+    assert result['error']
+    assert not result['reused']
@@ -0,0 +1,50 @@
+import os
+import time
+import threading
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from conftest import create_legacy_visits
+
+CHROME = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+@pytest.fixture
+def legacy_tracker(tracker):
+    create_legacy_visits(tracker.DB_PATH, [
+        ('conflost', '2024-01-05 10:00:00', '203.0.113.7', CHROME, 'https://news.example.com/a', '/'),
+        ('conflost', '2024-01-06 11:00:00', '203.0.113.8', CHROME, '', '/about'),
+    ])
+    tracker.init_database()
+    return tracker
+
+def archived_browsers(tracker):
+    table = tracker.query_archive(columns=['browser'])
+    return table.column('browser').to_pylist()
+
+def test_legacy_archive_waits_for_enhanced_backfill(legacy_tracker):
+    tracker = legacy_tracker
+    assert tracker.archive_closed_partitions() is None
+    assert not tracker.is_archived(tracker.LEGACY_VISITS_TABLE)
+
+    assert tracker.enhanced_backfill.run(threading.Event())
+    assert tracker.LEGACY_VISITS_TABLE in tracker.archive_closed_partitions()
+    assert archived_browsers(tracker) == ['chrome', 'chrome']
+
+def test_archive_older_than_backfill_is_rewritten(legacy_tracker):
+    tracker = legacy_tracker
+    # An archive taken before the backfill (as older releases did) holds NULL browsers
+    conn = tracker.db_pool.connect(tracker.DB_PATH)
+    tracker.archive_partition(conn.cursor(), tracker.LEGACY_VISITS_TABLE)
+    conn.close()
+    stale = time.time() - 3600
+    os.utime(tracker.archive_path(tracker.LEGACY_VISITS_TABLE), (stale, stale))
+    assert archived_browsers(tracker) == [None, None]
+
+    assert tracker.enhanced_backfill.run(threading.Event())
+    assert tracker.LEGACY_VISITS_TABLE in tracker.archive_closed_partitions()
+    assert archived_browsers(tracker) == ['chrome', 'chrome']
+
+    # Nothing changed since, so the next pass leaves it alone
+    assert tracker.archive_closed_partitions() == []
@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+from conftest import create_legacy_visits, make_visit
+
+@pytest.fixture
+def cursor(tracker):
+    tracker.init_database()
+    conn = tracker.db_pool.connect(tracker.DB_PATH)
+    yield conn.cursor()
+    conn.commit()
+    conn.close()
+
+def test_partition_names_and_bounds(tracker):
+    assert tracker.partition_for_timestamp('2026-03-10 12:00:00') == 'visits_p202603'
+    assert tracker.partition_bounds('visits_p202603') == ('2026-03-01 00:00:00', '2026-04-01 00:00:00')
+    assert tracker.partition_bounds('visits_p202612') == ('2026-12-01 00:00:00', '2027-01-01 00:00:00')
+
+def test_visits_are_routed_to_their_month(tracker, cursor):
+    tracker.insert_visits(cursor, [
+        make_visit(tracker, timestamp='2026-01-31 23:59:59'),
+        make_visit(tracker, timestamp='2026-02-01 00:00:00'),
+        make_visit(tracker, timestamp='2026-02-14 08:00:00'),
+    ])
+    assert cursor.execute('SELECT COUNT(*) FROM visits_p202601').fetchone() == (1,)
+    assert cursor.execute('SELECT COUNT(*) FROM visits_p202602').fetchone() == (2,)
+    assert cursor.execute('SELECT COUNT(*) FROM visits').fetchone() == (3,)
+
+def test_ids_are_unique_across_partitions(tracker, cursor):
+    for month in ('01', '02', '01', '03', '02'):
+        tracker.insert_visits(cursor, [make_visit(tracker, timestamp=f'2026-{month}-15 10:00:00')] * 3)
+    ids = [row[0] for row in cursor.execute('SELECT id FROM visits')]
+    assert len(ids) == 15
+    assert len(set(ids)) == 15
+
+def test_legacy_table_keeps_its_ids_below_new_partitions(tracker):
+    create_legacy_visits(tracker.DB_PATH, [('conflost', '2024-01-05 10:00:00', '203.0.113.7', '', '', '/')] * 4)
+    tracker.init_database()
+    conn = tracker.db_pool.connect(tracker.DB_PATH)
+    cursor = conn.cursor()
+    assert tracker.table_exists(cursor, tracker.LEGACY_VISITS_TABLE)
+    tracker.insert_visits(cursor, [make_visit(tracker, timestamp='2026-03-01 00:00:00')])
+    conn.commit()
+    ids = sorted(row[0] for row in cursor.execute('SELECT id FROM visits'))
+    conn.close()
+    assert ids == [1, 2, 3, 4, 5]
+
+def test_visits_source_only_reads_overlapping_partitions(tracker, cursor):
+    for timestamp in ('2026-01-15 10:00:00', '2026-02-15 10:00:00', '2026-03-15 10:00:00'):
+        tracker.insert_visits(cursor, [make_visit(tracker, timestamp=timestamp)])
+    source = tracker.visits_source(cursor, since='2026-02-20 00:00:00', until='2026-03-20 00:00:00')
+    assert 'visits_p202601' not in source
+    assert 'visits_p202602' in source and 'visits_p202603' in source
+    count = cursor.execute(f'SELECT COUNT(*) FROM {source} AS v WHERE v.timestamp >= ?',
+                           ('2026-02-20 00:00:00',)).fetchone()
+    assert count == (1,)
+
+def test_visits_view_is_read_only(tracker, cursor):
+    with pytest.raises(sqlite3.OperationalError):
+        cursor.execute("INSERT INTO visits (site) VALUES ('conflost')")
@@ -9,11 +9,14 @@ import sys
 import json
 import time
 import subprocess
-import requests
 import logging
 import sqlite3
-import ssl
-import socket
+import db_pool
+import schema_migrations
+import service_probes
+import metrics_rollup
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
 from pathlib import Path
 import calendar
@@ -32,16 +35,32 @@ logger = logging.getLogger(__name__)
 # Monitoring database
 MONITORING_DB = '/var/log/service-monitoring.db'
 
-def log_service_metric(service, response_time_ms, status_code, is_healthy, endpoint=None, error_message=None):
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def ensure_monitoring_schema():
+    """Apply pending monitoring DB migrations once per process"""
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            try:
+                schema_migrations.migrate('monitoring', MONITORING_DB)
+            except Exception as e:
+                logger.error(f"Failed to migrate monitoring database: {e}")
+            _schema_ready = True
+
+def log_service_metric(service, response_time_ms, status_code, is_healthy, endpoint=None, error_message=None,
+                       dns_ms=None, connect_ms=None, ttfb_ms=None):
     """Log service performance metrics to database"""
     try:
-        conn = sqlite3.connect(MONITORING_DB)
+        ensure_monitoring_schema()
+        conn = db_pool.connect(MONITORING_DB)
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO service_metrics 
-            (service, response_time_ms, status_code, is_healthy, endpoint, error_message)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (service, response_time_ms, status_code, is_healthy, endpoint, error_message))
+            (service, response_time_ms, status_code, is_healthy, endpoint, error_message, dns_ms, connect_ms, ttfb_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (service, response_time_ms, status_code, is_healthy, endpoint, error_message, dns_ms, connect_ms, ttfb_ms))
         conn.commit()
         conn.close()
     except Exception as e:
@@ -50,7 +69,7 @@ def log_service_metric(service, response_time_ms, status_code, is_healthy, endpo
 def log_service_event(service, event_type, details, previous_state=None, new_state=None):
     """Log service state change events"""
     try:
-        conn = sqlite3.connect(MONITORING_DB)
+        conn = db_pool.connect(MONITORING_DB)
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO service_events 
@@ -63,31 +82,69 @@ def log_service_event(service, event_type, details, previous_state=None, new_sta
     except Exception as e:
         logger.error(f"Failed to log event for {service}: {e}")
 
-def check_ssl_certificate(domain):
-    """Check SSL certificate expiry for domain"""
+_cert_cache_lock = threading.Lock()
+_cert_cache_seeded = False
+
+def seed_cert_cache(cache):
+    """Prime the expiry cache from the latest stored check per domain, so a fresh
+    process does not redo every handshake that is still within the refresh interval"""
     try:
-        context = ssl.create_default_context()
-        with socket.create_connection((domain, 443), timeout=10) as sock:
-            with context.wrap_socket(sock, server_hostname=domain) as ssock:
-                cert = ssock.getpeercert()
-                expiry_date = datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z')
-                days_remaining = (expiry_date - datetime.now()).days
-                
-                # Log SSL certificate info
-                conn = sqlite3.connect(MONITORING_DB)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO ssl_certificates 
-                    (service, domain, expiry_date, days_remaining, is_valid)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (domain.replace('.com', ''), domain, expiry_date.date(), days_remaining, days_remaining > 0))
-                conn.commit()
-                conn.close()
-                
-                return days_remaining, expiry_date
+        conn = db_pool.connect(MONITORING_DB)
+        rows = conn.execute('''
+            SELECT domain, expiry_date, MAX(last_checked)
+            FROM ssl_certificates
+            WHERE expiry_date IS NOT NULL
+            GROUP BY domain
+        ''').fetchall()
+        conn.close()
     except Exception as e:
-        logger.error(f"SSL check failed for {domain}: {e}")
+        logger.debug(f"Could not seed certificate cache: {e}")
+        return
+    for domain, expiry_date, last_checked in rows:
+        try:
+            expiry = datetime.strptime(str(expiry_date)[:10], '%Y-%m-%d')
+            checked_at = calendar.timegm(time.strptime(last_checked, '%Y-%m-%d %H:%M:%S'))
+        except (TypeError, ValueError):
+            continue
+        cache.seed(domain, expiry, checked_at)
+
+def check_ssl_certificate(domain, timeout=10):
+    """Check SSL certificate expiry for domain
+    
+    Answered from service_probes' expiry cache: the certificate is only re-read
+    every few hours, or when its file under /etc/letsencrypt changes, and a row
+    is stored in ssl_certificates only when it was actually re-read.
+    """
+    global _cert_cache_seeded
+    cache = service_probes.get_cert_cache()
+    with _cert_cache_lock:
+        if not _cert_cache_seeded:
+            seed_cert_cache(cache)
+            _cert_cache_seeded = True
+    
+    result = cache.lookup(domain, timeout=timeout)
+    if result['expiry'] is None:
         return None, None
+    
+    if result['refreshed'] and result['error'] is None:
+        try:
+            # Log SSL certificate info
+            conn = db_pool.connect(MONITORING_DB)
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO ssl_certificates 
+                (service, domain, expiry_date, days_remaining, is_valid)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (domain.replace('.com', ''), domain, result['expiry'].date(), result['days_remaining'],
+                  result['days_remaining'] > 0))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Failed to store SSL check for {domain}: {e}")
+        logger.info(f"SSL certificate for {domain} re-read ({result['source']}): "
+                    f"{result['days_remaining']} days remaining")
+    
+    return result['days_remaining'], result['expiry']
 
 # Configuration for all web services
 SERVICES_CONFIG = {
@@ -147,12 +204,30 @@ SERVICES_CONFIG = {
         "script": "server.js",
         "port": 80,  # Served directly by nginx
         "url": "https://aipromptimizer.com",  # Check the actual domain
+        "probe_method": "HEAD",  # Static page; headers are enough to prove nginx is serving it
         "domain": "aipromptimizer.com",
         "process_name": "nginx", 
         "working_dir": "/var/aipromptimizer.com"
     }
 }
 
+# Concurrent health-check engine: every check of every service runs at once
+CHECK_CONFIG = {
+    "max_workers": 32,             # Enough for all checks of all services in one wave
+    "cycle_deadline_s": 20,        # Checks still running after this count as timed out
+    "timeouts_s": {                # Per-check timeouts, enforced inside each check
+        "http_connect": 3,
+        "http_read": 10,
+        "ssl": 10
+    },
+    "slow_check_ms": 2000          # Checks slower than this are named in the cycle summary
+}
+
+# HTTP probes go through service_probes' shared keep-alive client. Per service,
+# SERVICES_CONFIG may set "probe_method" (GET/HEAD, default GET) and
+# "health_path" (a lightweight endpoint probed instead of "url").
+HEALTHY_STATUS_CODES = (200, 301, 302, 403, 404)   # Include 404 as valid
+
 # Monthly restart prompt configuration
 RESTART_PROMPT_CONFIG = {
     "config_file": "/root/.monthly-restart-config.json",
@@ -330,56 +405,46 @@ def restart_all_services():
     
     logger.info("Monthly restart cycle completed")
 
-def check_port_listening(port):
-    """Check if a port is listening"""
+def check_port_listening(port, snapshot=None):
+    """Check if a TCP port is listening (from a socket snapshot; a fresh one if none given)"""
     try:
-        result = subprocess.run(['netstat', '-tlnp'], capture_output=True, text=True)
-        return f":{port}" in result.stdout and "LISTEN" in result.stdout
+        snapshot = snapshot or service_probes.ProbeSnapshot.capture()
+        return snapshot.is_listening(port)
     except Exception as e:
         logger.error(f"Error checking port {port}: {e}")
         return False
 
-def check_process_running(service_name, config):
-    """Check if the service process is running"""
+def check_process_running(service_name, config, snapshot=None):
+    """Check if the service process is running (from a process-table snapshot)"""
     try:
-        script_name = config['script']
-        result = subprocess.run(['pgrep', '-f', script_name], capture_output=True, text=True)
-        return len(result.stdout.strip()) > 0
+        snapshot = snapshot or service_probes.ProbeSnapshot.capture()
+        return snapshot.process_running(config['script'])
     except Exception as e:
         logger.error(f"Error checking process for {service_name}: {e}")
         return False
 
-def check_http_response(url, timeout=10, service_name=None):
+def probe_url(config):
+    """URL to probe for a service: its health endpoint if configured, else its main URL"""
+    if config.get('health_path'):
+        return config['url'].rstrip('/') + '/' + config['health_path'].lstrip('/')
+    return config['url']
+
+def probe_http(url, timeout=10, service_name=None, method='GET', connect_timeout=None):
+    """Probe a URL over the shared keep-alive client and log the metric; returns the probe result"""
+    result = service_probes.get_client().probe(url, method=method, connect_timeout=connect_timeout, read_timeout=timeout)
+    # Accept various response codes that indicate the service is running
+    result['healthy'] = result['status_code'] in HEALTHY_STATUS_CODES
+    if result['error']:
+        logger.debug(f"HTTP check failed for {url}: {result['error']}")
+    
+    if service_name:
+        log_service_metric(service_name, int(result['total_ms']), result['status_code'], result['healthy'], url,
+                           result['error'], result['dns_ms'], result['connect_ms'], result['ttfb_ms'])
+    return result
+
+def check_http_response(url, timeout=10, service_name=None, method='GET', connect_timeout=None):
     """Check if service responds to HTTP requests and track metrics"""
-    start_time = time.time()
-    response_time_ms = None
-    status_code = None
-    is_healthy = False
-    error_message = None
-    
-    try:
-        response = requests.get(url, timeout=timeout)
-        response_time_ms = int((time.time() - start_time) * 1000)
-        status_code = response.status_code
-        # Accept various response codes that indicate the service is running
-        is_healthy = response.status_code in [200, 301, 302, 403, 404]  # Include 404 as valid
-        
-        # Log metrics to database
-        if service_name:
-            log_service_metric(service_name, response_time_ms, status_code, is_healthy, url)
-            
-        return is_healthy
-        
-    except Exception as e:
-        response_time_ms = int((time.time() - start_time) * 1000) if start_time else None
-        error_message = str(e)
-        logger.debug(f"HTTP check failed for {url}: {e}")
-        
-        # Log failed attempt
-        if service_name:
-            log_service_metric(service_name, response_time_ms, status_code, False, url, error_message)
-            
-        return False
+    return probe_http(url, timeout, service_name, method, connect_timeout)['healthy']
 
 def install_dependencies(service_name, config):
     """Install required dependencies for a service"""
@@ -483,26 +548,105 @@ def stop_service(service_name, config):
         logger.error(f"Error stopping {service_name}: {e}")
         return False
 
-def check_service_health(service_name, config):
-    """Comprehensive health check for a service"""
-    port = config['port']
-    url = config['url']
-    
-    # Check 1: Port listening
-    port_ok = check_port_listening(port)
+_check_executor = None
+_check_executor_lock = threading.Lock()
+
+def get_check_executor():
+    """Shared thread pool for health checks (created on first use, reused across cycles)"""
+    global _check_executor
+    with _check_executor_lock:
+        if _check_executor is None:
+            _check_executor = ThreadPoolExecutor(max_workers=CHECK_CONFIG['max_workers'],
+                                                 thread_name_prefix='health-check')
+        return _check_executor
+
+def build_checks(service_name, config):
+    """(check name, callable) pairs for one service's network checks; each enforces its own timeout"""
+    timeouts = CHECK_CONFIG['timeouts_s']
+    checks = [
+        ('http', lambda: probe_http(probe_url(config), timeout=timeouts['http_read'], service_name=service_name,
+                                    method=config.get('probe_method', 'GET'), connect_timeout=timeouts['http_connect']))
+    ]
+    if 'domain' in config:
+        checks.append(('ssl', lambda: check_ssl_certificate(config['domain'], timeout=timeouts['ssl'])[0]))
+    return checks
+
+def _timed_call(func):
+    """Run a check and return (result, latency in ms)"""
+    start = time.monotonic()
+    result = func()
+    return result, round((time.monotonic() - start) * 1000, 1)
+
+def check_services_health(services, deadline_s=None):
+    """Health-check several services concurrently under one global deadline
+    
+    Network checks of all services are submitted to the shared pool together,
+    so a slow service no longer delays the others. A check that has not
+    finished by the deadline is reported as timed out (and failed). Port and
+    process checks are answered from one socket/process snapshot taken for
+    the whole cycle. Returns {service_name: health_status} in the order of `services`.
+    """
+    executor = get_check_executor()
+    started = time.monotonic()
+    deadline = started + (deadline_s or CHECK_CONFIG['cycle_deadline_s'])
+    
+    submitted = [
+        (service_name, check_name, executor.submit(_timed_call, func))
+        for service_name, config in services.items()
+        for check_name, func in build_checks(service_name, config)
+    ]
     
-    # Check 2: Process running
-    process_ok = check_process_running(service_name, config)
+    # One read of /proc/net/tcp{,6} and the process table while the network checks run
+    snapshot = service_probes.ProbeSnapshot.capture()
+    outcomes = {}
+    for service_name, config in services.items():
+        outcomes[service_name] = {
+            'port': {'value': snapshot.is_listening(config['port']), 'latency_ms': snapshot.capture_ms, 'timed_out': False},
+            'process': {'value': snapshot.process_running(config['script']), 'latency_ms': snapshot.capture_ms, 'timed_out': False}
+        }
     
-    # Check 3: HTTP response
-    http_ok = check_http_response(url, service_name=service_name)
+    for service_name, check_name, future in submitted:
+        try:
+            value, latency_ms = future.result(timeout=max(deadline - time.monotonic(), 0))
+            outcomes[service_name][check_name] = {'value': value, 'latency_ms': latency_ms, 'timed_out': False}
+        except FuturesTimeoutError:
+            future.cancel()
+            outcomes[service_name][check_name] = {'value': None, 'latency_ms': None, 'timed_out': True}
+            logger.warning(f"{check_name} check for {service_name} missed the {deadline - started:.0f}s cycle deadline")
+        except Exception as e:
+            outcomes[service_name][check_name] = {'value': None, 'latency_ms': None, 'timed_out': False}
+            logger.error(f"{check_name} check for {service_name} raised: {e}")
     
-    # Check SSL certificate if domain configured
-    ssl_days_remaining = None
-    if 'domain' in config:
-        ssl_days_remaining, _ = check_ssl_certificate(config['domain'])
-        if ssl_days_remaining is not None and ssl_days_remaining < 30:
-            logger.warning(f"SSL certificate for {config['domain']} expires in {ssl_days_remaining} days")
+    return {
+        service_name: build_health_status(service_name, services[service_name], outcomes[service_name])
+        for service_name in services
+    }
+
+def build_health_status(service_name, config, outcome):
+    """Combine per-check outcomes into the health status dict"""
+    port_ok = bool(outcome['port']['value'])
+    process_ok = bool(outcome['process']['value'])
+    http_probe = outcome['http']['value'] or {}
+    http_ok = bool(http_probe.get('healthy'))
+    
+    ssl_days_remaining = outcome['ssl']['value'] if 'ssl' in outcome else None
+    if ssl_days_remaining is not None and ssl_days_remaining < 30:
+        logger.warning(f"SSL certificate for {config['domain']} expires in {ssl_days_remaining} days")
+    
+    # Per-check latency is kept with the status (web-services-status.json)
+    checks = {}
+    for check_name, result in outcome.items():
+        # The SSL check returns days remaining; any answer means the check itself worked
+        if check_name == 'ssl':
+            ok = result['value'] is not None
+        elif check_name == 'http':
+            ok = http_ok
+        else:
+            ok = bool(result['value'])
+        checks[check_name] = {'ok': ok, 'latency_ms': result['latency_ms'], 'timed_out': result['timed_out']}
+    if http_probe:
+        checks['http'].update({phase: http_probe[phase] for phase in ('dns_ms', 'connect_ms', 'ttfb_ms', 'total_ms')},
+                              status_code=http_probe['status_code'], reused=http_probe['reused'])
     
     health_status = {
         'service': service_name,
@@ -511,15 +655,20 @@ def check_service_health(service_name, config):
         'http_responding': http_ok,
         'healthy': port_ok and process_ok and http_ok,
         'ssl_days_remaining': ssl_days_remaining,
+        'checks': checks,
         'timestamp': datetime.now().isoformat()
     }
     
     return health_status
 
+def check_service_health(service_name, config):
+    """Comprehensive health check for a service (its checks run concurrently)"""
+    return check_services_health({service_name: config})[service_name]
+
 def get_service_failure_history(service_name, hours=24):
     """Get recent failure history for a service"""
     try:
-        conn = sqlite3.connect(MONITORING_DB)
+        conn = db_pool.connect(MONITORING_DB)
         cursor = conn.cursor()
         since = datetime.now() - timedelta(hours=hours)
         
@@ -609,27 +758,48 @@ def enhanced_service_restart(service_name, config):
     logger.error(f"❌ {service_name} restart failed - service did not start")
     return False
 
-def monitor_services(restart_failed=True):
-    """Enhanced monitoring with intelligent restart logic"""
+def log_check_cycle(results, elapsed_ms):
+    """One summary line per cycle naming any slow or timed-out checks"""
+    slow = []
+    for service_name, health in results.items():
+        for check_name, check in health['checks'].items():
+            if check['timed_out']:
+                slow.append(f"{service_name}/{check_name} timed out")
+            elif check['latency_ms'] is not None and check['latency_ms'] >= CHECK_CONFIG['slow_check_ms']:
+                slow.append(f"{service_name}/{check_name} {check['latency_ms']:.0f}ms")
+    summary = f"Checked {len(results)} services in {elapsed_ms:.0f}ms"
+    if slow:
+        summary += f" (slow: {', '.join(slow)})"
+    logger.info(summary)
+
+def monitor_services(restart_failed=True, previous_status=None, send_alerts=True):
+    """Enhanced monitoring with intelligent restart logic
+    
+    previous_status: last cycle's results when the caller keeps them in memory
+    (monitor-daemon.py); read from the status file otherwise.
+    send_alerts: run intelligent alerting after the cycle (the daemon schedules it separately).
+    """
     logger.info("🔍 Starting enhanced service monitoring cycle")
+    ensure_monitoring_schema()
     
     # Load previous status for comparison
     status_file = "/var/log/web-services-status.json"
-    previous_status = {}
-    if os.path.exists(status_file):
-        try:
-            with open(status_file, 'r') as f:
-                previous_status = json.load(f)
-        except:
-            pass
-    
-    results = {}
+    if previous_status is None:
+        previous_status = {}
+        if os.path.exists(status_file):
+            try:
+                with open(status_file, 'r') as f:
+                    previous_status = json.load(f)
+            except:
+                pass
+    
+    # Check every service concurrently, then handle state changes and restarts in order
+    cycle_start = time.monotonic()
+    results = check_services_health(SERVICES_CONFIG)
+    log_check_cycle(results, (time.monotonic() - cycle_start) * 1000)
     
     for service_name, config in SERVICES_CONFIG.items():
-        logger.info(f"Checking {service_name}...")
-        
-        health = check_service_health(service_name, config)
-        results[service_name] = health
+        health = results[service_name]
         
         # Check for status changes and log events
         previous_health = previous_status.get(service_name, {}).get('healthy', None)
@@ -668,13 +838,14 @@ def monitor_services(restart_failed=True):
                     log_service_event(service_name, 'restart_skipped', f"Restart skipped: {reason}")
                         
     # Check and send intelligent alerts
-    try:
-        sys.path.append('/root')
-        from intelligent_alerting import IntelligentAlertManager
-        alerter = IntelligentAlertManager()
-        alerter.check_and_send_alerts()
-    except Exception as e:
-        logger.debug(f"Intelligent alerting failed: {e}")
+    if send_alerts:
+        try:
+            sys.path.append('/root')
+            from intelligent_alerting import IntelligentAlertManager
+            alerter = IntelligentAlertManager()
+            alerter.check_and_send_alerts()
+        except Exception as e:
+            logger.debug(f"Intelligent alerting failed: {e}")
                         
     # Save results to status file
     status_file = "/var/log/web-services-status.json"
@@ -748,6 +919,11 @@ def main():
                 
         elif command == "restart-all":
             restart_all_services()
+        
+        elif command == "compact-metrics":
+            # For cron setups; monitor-daemon.py runs this on its own schedule
+            stats = metrics_rollup.compact(MONITORING_DB)
+            print(f"Rolled up {stats['1m']} minute and {stats['1h']} hour buckets, pruned {stats['raw_pruned']} raw rows")
                 
         elif command == "setup-systemd":
             setup_systemd_services()
@@ -772,7 +948,7 @@ def main():
                 print(f"No restart prompt needed (reason: {reason})")
                 
         else:
-            print("Usage: web-services-monitor.py [check|restart-all|restart-<service>|setup-systemd|install-deps|restart|prompt-check]")
+            print("Usage: web-services-monitor.py [check|restart-all|restart-<service>|compact-metrics|setup-systemd|install-deps|restart|prompt-check]")
     else:
         # Default: monitor and restart failed services
         monitor_services(restart_failed=True)
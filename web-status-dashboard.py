@@ -7,7 +7,9 @@ Provides a simple HTML dashboard showing status of all web services
 import json
 import os
 import logging
-import requests
+import db_pool
+import metrics_rollup
+import service_probes
 from datetime import datetime
 from flask import Flask, render_template_string, request, session, redirect, url_for, jsonify
 from functools import wraps
@@ -28,6 +30,12 @@ logger = logging.getLogger(__name__)
 
 DASHBOARD_PASSCODE = "0219"
 
+MONITORING_DB = '/var/log/service-monitoring.db'
+
+# Analytics tracker API, read over the shared keep-alive client
+ANALYTICS_API = 'http://localhost:8083'
+ANALYTICS_TIMEOUT_S = 2   # Connect and read limit, as with the old requests.get(timeout=2)
+
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -280,6 +288,9 @@ DASHBOARD_HTML = """
                             {% if monitoring.services[service_name].avg_response_time %}
                             Avg Response: {{ monitoring.services[service_name].avg_response_time }}ms | 
                             {% endif %}
+                            {% if monitoring.services[service_name].p50 is defined %}
+                            p50/p90/p99: {{ monitoring.services[service_name].p50 }}/{{ monitoring.services[service_name].p90 }}/{{ monitoring.services[service_name].p99 }}ms | 
+                            {% endif %}
                             {% if monitoring.services[service_name].ssl_days_remaining %}
                             SSL: {{ monitoring.services[service_name].ssl_days_remaining }} days
                             {% endif %}
@@ -363,7 +374,7 @@ def logout():
 def get_analytics_data():
     """Fetch analytics data from analytics tracker"""
     try:
-        response = requests.get('http://localhost:8083/analytics', timeout=2)
+        response = service_probes.get_client().get(f'{ANALYTICS_API}/analytics', connect_timeout=ANALYTICS_TIMEOUT_S, read_timeout=ANALYTICS_TIMEOUT_S)
         if response.status_code == 200:
             analytics_data = response.json().get('analytics', {})
             logger.info(f"Analytics data fetched: {len(analytics_data)} sites tracked")
@@ -377,7 +388,7 @@ def get_analytics_data():
 def get_enhanced_analytics_data():
     """Fetch enhanced analytics summary data"""
     try:
-        response = requests.get('http://localhost:8083/analytics/summary', timeout=2)
+        response = service_probes.get_client().get(f'{ANALYTICS_API}/analytics/summary', connect_timeout=ANALYTICS_TIMEOUT_S, read_timeout=ANALYTICS_TIMEOUT_S)
         if response.status_code == 200:
             enhanced_data = response.json()
             logger.info(f"Enhanced analytics data fetched")
@@ -392,39 +403,32 @@ def get_enhanced_analytics_data():
 def get_monitoring_data():
     """Fetch enhanced monitoring data from monitoring database"""
     import sqlite3
-    monitoring_db = '/var/log/service-monitoring.db'
+    monitoring_db = MONITORING_DB
     data = {}
     
     try:
-        conn = sqlite3.connect(monitoring_db)
+        conn = db_pool.connect(monitoring_db)
         cursor = conn.cursor()
         
-        # Get latest metrics for each service
-        cursor.execute('''
-            SELECT service, 
-                   AVG(response_time_ms) as avg_response_time,
-                   MAX(timestamp) as last_check
-            FROM service_metrics 
-            WHERE timestamp > datetime('now', '-1 hour')
-            GROUP BY service
-        ''')
-        
-        for row in cursor.fetchall():
-            service, avg_response, last_check = row
+        # Latest hour per service, from the minute rollups plus the raw tail
+        for service, latency in metrics_rollup.service_latency(conn, hours=1).items():
+            avg_response = latency['avg_response_time']
             data[service] = {
                 'avg_response_time': int(avg_response) if avg_response else None,
-                'last_check': last_check
+                'last_check': latency['last_check']
             }
         
-        # Get SSL certificate data
+        # Tail latency over the same hour, merged from the per-minute sketches
+        for service, percentiles in metrics_rollup.service_percentiles(conn, hours=1).items():
+            data.setdefault(service, {}).update(
+                {key: int(round(percentiles[key])) for key in ('p50', 'p90', 'p99')})
+        
+        # Get SSL certificate data (latest check per service; SQLite returns the
+        # days_remaining of the MAX(last_checked) row, read from idx_ssl_service_checked)
         cursor.execute('''
-            SELECT service, days_remaining, last_checked
+            SELECT service, days_remaining, MAX(last_checked) as last_checked
             FROM ssl_certificates
-            WHERE last_checked = (
-                SELECT MAX(last_checked) 
-                FROM ssl_certificates s2 
-                WHERE s2.service = ssl_certificates.service
-            )
+            GROUP BY service
         ''')
         
         for row in cursor.fetchall():
@@ -455,6 +459,22 @@ def get_monitoring_data():
         logger.error(f"Could not fetch monitoring data: {e}")
         return {'services': {}, 'recent_events': []}
 
+@app.route('/monitor/api/latency')
+@require_auth
+def latency_api():
+    """Per-service response times and p50/p90/p99 over ?hours=N, read from the coarsest rollup tier that covers it"""
+    hours = min(max(request.args.get('hours', 1, type=float), 0.1), 24 * 400)
+    try:
+        conn = db_pool.connect(MONITORING_DB)
+        services = metrics_rollup.service_latency(conn, hours=hours)
+        for service, percentiles in metrics_rollup.service_percentiles(conn, hours=hours).items():
+            services.setdefault(service, {}).update({key: percentiles[key] for key in ('p50', 'p90', 'p99')})
+        conn.close()
+    except Exception as e:
+        logger.error(f"Could not fetch latency data: {e}")
+        return jsonify({'error': 'latency data unavailable'}), 500
+    return jsonify({'hours': hours, 'services': services})
+
 @app.route('/monitor/charts')
 @require_auth  
 def charts():
@@ -484,7 +504,8 @@ def site_analytics(site_name):
     
     # Get site-specific enhanced analytics
     try:
-        response = requests.get(f'http://localhost:8083/analytics/enhanced/{site_name}', timeout=2)
+        response = service_probes.get_client().get(f'{ANALYTICS_API}/analytics/enhanced/{site_name}',
+                                                   connect_timeout=ANALYTICS_TIMEOUT_S, read_timeout=ANALYTICS_TIMEOUT_S)
         if response.status_code == 200:
             site_data = response.json()
         else: